@@ -0,0 +1,158 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from decouple import config
+
+from metrics import registry
+
+# Blocking engines (SQLite) run their calls on this pool instead of the event loop, in-memory engines their calls that scale with the table
+storage_workers = ThreadPoolExecutor(max_workers=config("STORAGE_WORKERS", default=8, cast=int), thread_name_prefix="storage")
+
+
+class _AsyncEngine:
+    """
+    Runs calls into a sync engine inline, or on an executor when the engine blocks on I/O.
+
+    write_executor, if given, takes the writes of an engine whose reads are
+    in memory but whose writes block on I/O (the shared file's lock).
+    """
+
+    def __init__(self, engine, executor=None, write_executor=None):
+        self.engine = engine
+        self.executor = executor
+        self.write_executor = write_executor or executor
+
+    async def _call(self, executor, function, *args, **kwargs):
+        with registry.phase("store"):
+            if executor is None:
+                # In-memory calls finish in microseconds; a thread hop would cost more than it saves
+                return function(*args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args, **kwargs))
+
+    async def _run(self, function, *args, **kwargs):
+        return await self._call(self.executor, function, *args, **kwargs)
+
+    async def _run_in_worker(self, function, *args, **kwargs):
+        # For calls whose cost grows with the table: never inline, even for in-memory engines
+        return await self._call(self.executor or storage_workers, function, *args, **kwargs)
+
+    async def _run_write(self, function, *args, **kwargs):
+        return await self._call(self.write_executor, function, *args, **kwargs)
+
+
+class AsyncPostStore(_AsyncEngine):
+    """
+    AsyncPostStore: Async interface over a post store engine.
+
+    Every PostStore operation is available as a coroutine, so async handlers
+    never block the event loop on storage. Blocking engines are called on an
+    executor. The in-memory engine answers lookups inline and runs pages,
+    bulk writes and whole-table writes on storage_workers. A single-post
+    write to it runs inline only while the write lock is free; if a write on
+    a worker thread holds it, the call waits for the lock on a worker too.
+    Writes still go through the wrapped ObservedPostStore, so listeners see
+    every change.
+    """
+
+    async def _run_write(self, function, *args, **kwargs):
+        lock = getattr(self.engine, "write_lock", None)
+        if self.write_executor is None and lock is not None and lock.acquire(blocking=False):
+            try:
+                with registry.phase("store"):
+                    return function(*args, **kwargs)
+            finally:
+                lock.release()
+        return await self._call(self.write_executor or storage_workers, function, *args, **kwargs)
+
+    async def count(self):
+        return await self._run(len, self.engine)
+
+    async def exists(self, post_id):
+        return await self._run(self.engine.__contains__, post_id)
+
+    async def any(self):
+        return await self._run(bool, self.engine)
+
+    async def get(self, post_id):
+        return await self._run(self.engine.get, post_id)
+
+    async def latest(self):
+        return await self._run(self.engine.latest)
+
+    async def page(self, offset, limit, category=None, published=None):
+        return await self._run_in_worker(self.engine.page, offset, limit, category=category, published=published)
+
+    async def page_after(self, post_id, limit, category=None, published=None):
+        return await self._run_in_worker(self.engine.page_after, post_id, limit, category=category, published=published)
+
+    async def insert(self, post):
+        return await self._run_write(self.engine.insert, post)
+
+    async def insert_many(self, posts):
+        return await self._run_in_worker(self.engine.insert_many, posts)
+
+    async def replace(self, post_id, post):
+        return await self._run_write(self.engine.replace, post_id, post)
+
+    async def replace_many(self, posts):
+        return await self._run_in_worker(self.engine.replace_many, posts)
+
+    async def update(self, post_id, fields, versions=None):
+        return await self._run_write(self.engine.update, post_id, fields, versions=versions)
+
+    async def update_where(self, fields, category=None, published=None, generations=None):
+        return await self._run_in_worker(self.engine.update_where, fields, category=category, published=published, generations=generations)
+
+    async def update_all(self, fields):
+        return await self._run_in_worker(self.engine.update_all, fields)
+
+    async def delete(self, post_id):
+        return await self._run_write(self.engine.delete, post_id)
+
+    async def delete_many(self, post_ids):
+        return await self._run_in_worker(self.engine.delete_many, post_ids)
+
+    async def clear(self):
+        return await self._run_in_worker(self.engine.clear)
+
+    @asynccontextmanager
+    async def snapshot(self):
+        """Yield an AsyncPostStore reading from one snapshot of the engine."""
+        context = self.engine.snapshot()
+        view = await self._run(context.__enter__)
+        try:
+            yield AsyncPostStore(view, self.executor)
+        finally:
+            await self._run(context.__exit__, None, None, None)
+
+
+class AsyncUserStore(_AsyncEngine):
+    """AsyncUserStore: Async interface over a user store engine."""
+
+    async def add(self, user):
+        return await self._run_write(self.engine.add, user)
+
+    async def get(self, email):
+        return await self._run(self.engine.get, email)
+
+
+class AsyncIdAllocator(_AsyncEngine):
+    """AsyncIdAllocator: Async interface over a post id allocator."""
+
+    async def next_id(self):
+        # Reserving a block of ids may take the shared file's lock
+        return await self._run_write(self.engine.next_id)
+
+    async def next_ids(self, count):
+        # One executor round trip for a whole bulk request
+        return await self._run_write(lambda: [self.engine.next_id() for _ in range(count)])
+
+
+def async_storage(storage):
+    """Return (posts, users, post_ids) async views of a Storage opened by open_storage()."""
+    executor = None if storage.backend in ("memory", "shared") else storage_workers
+    # Shared writes take the file lock and first replay what other workers wrote
+    write_executor = storage_workers if storage.backend == "shared" else None
+    return AsyncPostStore(storage.posts, executor, write_executor), AsyncUserStore(storage.users, executor, write_executor), AsyncIdAllocator(storage.post_ids, executor, write_executor)
@@ -0,0 +1,73 @@
+"""
+Compare throughput of sync (threadpool) and async handlers over the same post store.
+
+Both routes read one page of posts. --latency adds a simulated storage round
+trip: the sync route blocks its threadpool thread for it, the async route
+awaits it, which is what a network database does to each path.
+
+    python benchmark_async.py --requests 2000 --concurrency 200 --latency 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from async_store import AsyncPostStore
+from post_events import ObservedPostStore
+from post_store import PostStore
+
+
+def build_app(posts, latency):
+    app = FastAPI()
+    posts_async = AsyncPostStore(posts)
+
+    @app.get("/sync/posts")
+    def sync_posts():
+        if latency:
+            time.sleep(latency)
+        return {"data": posts.page(0, 10)}
+
+    @app.get("/async/posts")
+    async def async_posts():
+        if latency:
+            await asyncio.sleep(latency)
+        return {"data": await posts_async.page(0, 10)}
+
+    return app
+
+
+async def run(app, path, requests, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    remaining = iter(range(requests))
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def worker():
+            for _ in remaining:
+                response = await client.get(path)
+                response.raise_for_status()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated storage latency in milliseconds")
+    args = parser.parse_args()
+
+    posts = ObservedPostStore(PostStore({"title": f"Post {i}", "content": "Content", "category": "Fun", "published": True, "id": i} for i in range(1, args.posts + 1)))
+    app = build_app(posts, args.latency / 1000)
+    results = {}
+    for name in ("sync", "async"):
+        elapsed = asyncio.run(run(app, f"/{name}/posts", args.requests, args.concurrency))
+        results[name] = {"seconds": round(elapsed, 3), "requests_per_second": round(args.requests / elapsed, 1)}
+    print(json.dumps({"settings": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
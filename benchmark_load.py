@@ -0,0 +1,185 @@
+"""
+Load and latency benchmark for the API endpoints.
+
+For every seed size the post table is emptied and refilled through the bulk
+endpoint, then each endpoint is driven by concurrent async clients. Reports
+throughput and p50/p95/p99 latency per endpoint as JSON, and with --baseline
+also the p95 change against an earlier run.
+
+The app runs in process by default. Pass --url to drive a local uvicorn
+server instead; the run deletes every post on that server, so only point it
+at a throwaway instance.
+
+    python benchmark_load.py --sizes 10000,100000 --requests 2000 --concurrency 50 --output run.json
+    python benchmark_load.py --url http://127.0.0.1:8000 --baseline run.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+import httpx
+
+BULK_BATCH = 10000
+WORDS = ["career", "vacation", "surfing", "launch", "hiring", "python", "startup", "conference", "promotion", "mentoring"]
+CATEGORIES = ["Career", "Fun", "Lifestyle", "Tech", "News"]
+USER = {"fullname": "Benchmark User", "email": "benchmark@example.com", "password": "benchmark-password"}
+
+
+def make_post(rng):
+    words = rng.sample(WORDS, 3)
+    return {"title": " ".join(words[:2]).title(), "content": "Post about " + " and ".join(words), "category": rng.choice(CATEGORIES), "published": rng.random() < 0.9}
+
+
+# Each endpoint maps a benchmark context to (method, path, JSON body)
+ENDPOINTS = {
+    "list_page": lambda context: ("GET", f"/linkedinposts?page={context.rng.randint(1, context.pages)}&page_size=10", None),
+    "list_hot_page": lambda context: ("GET", "/linkedinposts?page=1&page_size=50", None),
+    "list_cursor": lambda context: ("GET", "/linkedinposts?limit=50", None),
+    "list_filtered": lambda context: ("GET", f"/linkedinposts?category={context.rng.choice(CATEGORIES)}&published=true&limit=20", None),
+    "get_by_id": lambda context: ("GET", f"/linkedinposts/{context.rng.choice(context.post_ids)}", None),
+    "latest": lambda context: ("GET", "/linkedinposts/latest", None),
+    "search": lambda context: ("GET", f"/linkedinposts/search?q={context.rng.choice(WORDS)}&limit=10", None),
+    "login": lambda context: ("POST", "/user/login", {"email": USER["email"], "password": USER["password"]}),
+    "create": lambda context: ("POST", "/linkedinposts", make_post(context.rng)),
+    "update": lambda context: ("PUT", f"/linkedinposts/{context.rng.choice(context.post_ids)}", make_post(context.rng)),
+    "patch": lambda context: ("PATCH", f"/linkedinposts/{context.rng.choice(context.post_ids)}", {"published": context.rng.random() < 0.5}),
+}
+
+
+class Context:
+    def __init__(self, rng, post_ids):
+        self.rng = rng
+        self.post_ids = post_ids
+        self.pages = max(1, len(post_ids) // 10)
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+async def authenticate(client):
+    await client.post("/user/signup", json=USER)
+    response = await client.post("/user/login", json={"email": USER["email"], "password": USER["password"]})
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+
+async def seed(client, size, rng):
+    response = await client.delete("/linkedinposts")
+    if response.status_code not in (200, 404):
+        response.raise_for_status()
+    post_ids = []
+    for start in range(0, size, BULK_BATCH):
+        batch = [make_post(rng) for _ in range(min(BULK_BATCH, size - start))]
+        response = await client.post("/linkedinposts/bulk", json=batch)
+        response.raise_for_status()
+        post_ids.extend(result["id"] for result in response.json()["results"])
+    return post_ids
+
+
+async def drive(client, name, context, requests, concurrency):
+    endpoint = ENDPOINTS[name]
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, path, body = endpoint(context)
+            started = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400 or "error" in response.text[:20]:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    milliseconds = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        "endpoint": name,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": milliseconds(percentile(latencies, 0.50)),
+        "p95_ms": milliseconds(percentile(latencies, 0.95)),
+        "p99_ms": milliseconds(percentile(latencies, 0.99)),
+        "max_ms": milliseconds(latencies[-1] if latencies else None),
+    }
+
+
+def open_client(url, concurrency):
+    if url:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        return httpx.AsyncClient(base_url=url, limits=limits, timeout=60)
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    results = []
+    async with open_client(args.url, args.concurrency) as client:
+        await authenticate(client)
+        for size in args.sizes:
+            started = time.perf_counter()
+            post_ids = await seed(client, size, rng)
+            seed_seconds = round(time.perf_counter() - started, 3)
+            context = Context(rng, post_ids)
+            for name in args.endpoints:
+                # A short warm-up fills caches and connection pools before measuring
+                await drive(client, name, context, min(args.requests, 50), min(args.concurrency, 10))
+                result = await drive(client, name, context, args.requests, args.concurrency)
+                results.append({"size": size, "seed_seconds": seed_seconds, **result})
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = {(result["size"], result["endpoint"]): result for result in json.load(file)["results"]}
+    for result in results:
+        previous = baseline.get((result["size"], result["endpoint"]))
+        if previous and previous["p95_ms"] and result["p95_ms"] is not None:
+            result["p95_change_percent"] = round(100 * (result["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"], 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000", help="comma separated seed sizes, e.g. 10000,1000000")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma separated subset of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint and size")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent clients")
+    parser.add_argument("--url", default=None, help="base URL of a running server (default: in process)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, for reproducible runs")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="earlier JSON report to compare p95 latency against")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    args.endpoints = args.endpoints.split(",")
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run(args))
+    if args.baseline:
+        compare(results, args.baseline)
+    settings = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    report = json.dumps({"settings": settings, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
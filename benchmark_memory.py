@@ -0,0 +1,48 @@
+"""
+Measure memory per stored post for plain dicts versus PostRecords.
+
+Each post gets its own title, content and category strings, as posts parsed
+from separate requests do, and allocations are counted with tracemalloc.
+
+    python benchmark_memory.py --posts 200000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from post_record import PostRecord
+
+CATEGORIES = ["Career", "Fun", "Work", "News", "Tech"]
+
+
+def make_posts(count):
+    for post_id in range(1, count + 1):
+        # Fresh strings per post, like request parsing produces
+        category = "".join(CATEGORIES[post_id % len(CATEGORIES)])
+        yield {"title": f"Post {post_id}", "content": f"Content of post {post_id}", "category": category, "published": True, "id": post_id}
+
+
+def measure(count, convert):
+    gc.collect()
+    tracemalloc.start()
+    table = {post["id"]: convert(post) for post in make_posts(count)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del table
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=200000)
+    args = parser.parse_args()
+    results = {
+        "dict": round(measure(args.posts, lambda post: post), 1),
+        "PostRecord": round(measure(args.posts, PostRecord.from_post), 1),
+    }
+    print(json.dumps({"settings": vars(args), "bytes_per_post": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
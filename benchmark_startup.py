@@ -0,0 +1,146 @@
+"""
+Cold-start benchmark for the API.
+
+Each run starts a fresh Python process, so nothing is warm from an earlier
+run. Reports the median time to import main, the time from spawning a
+uvicorn server to its first response and the time of the first
+/openapi.json request, plus the import tree of main (the heaviest direct
+imports and the modules with the most time of their own). With --baseline
+the medians are compared against an earlier report.
+
+    python benchmark_startup.py --runs 5 --output startup.json
+    OPENAPI_CACHE_PATH=openapi.cache.json python benchmark_startup.py --baseline startup.json
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_MAIN = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def time_import():
+    output = subprocess.run([sys.executable, "-c", IMPORT_MAIN], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def import_tree(top):
+    """Return the heaviest direct imports of main and the modules with the most self time, in milliseconds."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], capture_output=True, text=True, check=True).stderr
+    group = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), len(match.group(3)), match.group(4)
+        # Nested imports are listed before the module that imported them
+        group.append((name, indent, self_us, cumulative_us))
+        if indent == 1 and name == "main":
+            break
+        if indent == 1:
+            group = []
+    direct = sorted((entry for entry in group if entry[1] == 3), key=lambda entry: entry[3], reverse=True)
+    own = sorted(group, key=lambda entry: entry[2], reverse=True)
+    return {
+        "main_ms": round(group[-1][3] / 1000, 1) if group else None,
+        "direct_imports_ms": {name: round(cumulative / 1000, 1) for name, _, _, cumulative in direct[:top]},
+        "self_time_ms": {name: round(self_time / 1000, 1) for name, _, self_time, _ in own[:top]},
+    }
+
+
+def request(port, path, timeout=1.0):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def time_server(path):
+    """Start uvicorn and return (seconds to its first response on path, seconds of the first /openapi.json)."""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"])
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+            try:
+                request(port, path)
+                break
+            except OSError:
+                time.sleep(0.005)
+        first_response = time.perf_counter() - started
+        started = time.perf_counter()
+        request(port, "/openapi.json", timeout=30)
+        return first_response, time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def median_ms(values):
+    return round(statistics.median(values) * 1000, 1)
+
+
+def run(args):
+    imports = [time_import() for _ in range(args.runs)]
+    servers = [time_server(args.path) for _ in range(args.runs)]
+    return {
+        "import_main_ms": median_ms(imports),
+        "first_response_ms": median_ms([first for first, _ in servers]),
+        "first_openapi_ms": median_ms([openapi for _, openapi in servers]),
+        "import_tree": import_tree(args.top),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)["results"]
+    results["change_percent"] = {
+        name: round(100 * (results[name] - baseline[name]) / baseline[name], 1)
+        for name in ("import_main_ms", "first_response_ms", "first_openapi_ms")
+        if baseline.get(name)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to take the median of")
+    parser.add_argument("--path", default="/linkedinposts", help="path polled for the first response (any status counts)")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the import tree")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=None, help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.baseline:
+        compare(results, args.baseline)
+    settings = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    settings["environment"] = {key: os.environ[key] for key in ("STORAGE_BACKEND", "OPENAPI_CACHE_PATH", "FAST_JSON") if key in os.environ}
+    report = json.dumps({"settings": settings, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import json
+
+from fastapi import HTTPException, Request, status
+from pydantic import TypeAdapter, ValidationError
+
+from metrics import registry
+
+# Upper bound on the number of items accepted by one bulk request
+MAX_BULK_ITEMS = 10000
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
+
+async def read_bulk_items(request: Request):
+    """
+    Dependency that reads the raw items of a bulk request.
+
+    The body is either a JSON array or, when sent with an NDJSON content type,
+    one JSON document per line.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if content_type in NDJSON_MEDIA_TYPES:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid bulk body. Send a JSON array or NDJSON.")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid bulk body. Send a JSON array or NDJSON.")
+    if not items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bulk body must contain at least one item.")
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Bulk body must contain at most {MAX_BULK_ITEMS} items.")
+    return items
+
+
+class BulkValidator:
+    """
+    BulkValidator: Validates a whole batch of items against one type.
+
+    The batch goes through pydantic-core in a single call. Only when that
+    call fails are the items revalidated one by one, so valid items are kept
+    and each invalid one gets its own errors.
+    """
+
+    def __init__(self, item_type):
+        self._list_adapter = TypeAdapter(list[item_type])
+        self._item_adapter = TypeAdapter(item_type)
+
+    def validate(self, items):
+        """Return (values, errors): values[i] is None and errors[i] is set for an invalid item."""
+        with registry.phase("validate"):
+            return self._validate(items)
+
+    def _validate(self, items):
+        try:
+            return self._list_adapter.validate_python(items), {}
+        except ValidationError:
+            pass
+        values = []
+        errors = {}
+        for index, item in enumerate(items):
+            try:
+                values.append(self._item_adapter.validate_python(item))
+            except ValidationError as item_error:
+                values.append(None)
+                errors[index] = [
+                    {"type": error["type"], "loc": list(error["loc"]), "msg": error["msg"]}
+                    for error in item_error.errors(include_url=False, include_input=False)
+                ]
+        return values, errors
+
+
+def bulk_response(results):
+    """Build the compact bulk response: one {"status", ...} entry per item, in request order."""
+    succeeded = sum(1 for result in results if result["status"] < 400)
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from collections import deque
+
+from post_record import PostRecord, encode_json
+
+
+class FeedGap(Exception):
+    """Raised when a subscriber asks for events the ring buffer no longer holds."""
+
+    def __init__(self, head):
+        super().__init__(f"Change feed resumed past its buffer; current sequence is {head}")
+        self.head = head
+
+
+class ChangeEvent:
+    """
+    ChangeEvent: One post write as sent to change feed subscribers.
+
+    Attributes:
+    - seq (int): The sequence number of the event, increasing by one per write.
+    - op (str): "insert", "replace", "update", "update_where", "delete", "update_all" or "clear".
+    - data (bytes): The event as JSON, encoded on first read and then shared by every subscriber.
+    """
+    __slots__ = ("seq", "op", "_body", "_data")
+
+    def __init__(self, seq, op, body):
+        self.seq = seq
+        self.op = op
+        self._body = body
+        self._data = None
+
+    @property
+    def data(self):
+        # Encoding stays out of the write lock; racing readers produce the same bytes
+        if self._data is None:
+            self._data = encode_json({"seq": self.seq, **self._body})
+        return self._data
+
+    def sse(self):
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (self.seq, self.op.encode(), self.data)
+
+
+class ChangeFeed:
+    """
+    ChangeFeed: Bounded ring buffer of sequenced post changes with async subscribers.
+
+    As a PostChange listener it runs under the store's write lock, so events
+    are numbered in write order. Each write is appended to the ring and is
+    encoded once, by the first subscriber to read it. Subscribers read the
+    ring from the last sequence number they saw, so none holds a queue of its
+    own and a slow one costs nothing until it reads. Waiting subscribers are
+    woken by one callback per event loop, however many of them there are and
+    however many writes arrived in between. A subscriber that falls further
+    behind than the ring holds gets FeedGap and has to reload its state.
+    """
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self.seq = 0
+        self._events = deque(maxlen=size)
+        self._lock = threading.Lock()
+        # Event loop -> (asyncio.Event its subscribers wait on, wake-up already scheduled)
+        self._signals = {}
+
+    def publish(self, change):
+        """PostChange listener."""
+        if change.kind in ("insert", "replace"):
+            # An immutable record, since the event is encoded later
+            body = {"op": change.kind, "id": change.post_id, "post": PostRecord.from_post(change.after)}
+        elif change.kind == "update":
+            body = {"op": "update", "id": change.post_id, "fields": dict(change.fields)}
+        elif change.kind == "update_where":
+            body = {"op": "update_where", "fields": dict(change.fields), "where": dict(change.where)}
+        elif change.kind == "delete":
+            body = {"op": "delete", "id": change.post_id}
+        elif change.kind == "update_all":
+            body = {"op": "update_all", "fields": dict(change.after)}
+        else:
+            body = {"op": "clear"}
+        with self._lock:
+            self.seq += 1
+            self._events.append(ChangeEvent(self.seq, change.kind, body))
+            wake = [loop for loop, (signal, scheduled) in self._signals.items() if not scheduled]
+            for loop in wake:
+                self._signals[loop] = (self._signals[loop][0], True)
+        for loop in wake:
+            try:
+                loop.call_soon_threadsafe(self._wake, loop)
+            except RuntimeError:
+                # The loop was closed; forget its subscribers
+                with self._lock:
+                    self._signals.pop(loop, None)
+
+    def _wake(self, loop):
+        with self._lock:
+            signal, _ = self._signals[loop]
+            self._signals[loop] = (asyncio.Event(), False)
+        signal.set()
+
+    def since(self, seq: int):
+        """Return the buffered events after seq; raises FeedGap if some of them were already dropped."""
+        with self._lock:
+            if seq > self.seq or (self._events and seq < self._events[0].seq - 1) or (not self._events and seq < self.seq):
+                raise FeedGap(self.seq)
+            skip = len(self._events) - (self.seq - seq)
+            return [self._events[index] for index in range(skip, len(self._events))]
+
+    async def wait(self, seq: int, timeout: float = None):
+        """Wait until an event after seq is published; returns False on timeout."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.seq > seq:
+                return True
+            if loop not in self._signals:
+                self._signals[loop] = (asyncio.Event(), False)
+            signal = self._signals[loop][0]
+        try:
+            await asyncio.wait_for(signal.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def subscribe(self, seq: int = None, heartbeat: float = None):
+        """
+        Yield lists of events after seq, forever.
+
+        Starts at the current sequence number when seq is None. After a
+        FeedGap it yields the FeedGap itself and carries on from the current
+        sequence number. With heartbeat, yields an empty list whenever that
+        many seconds pass without events.
+        """
+        if seq is None:
+            seq = self.seq
+        while True:
+            try:
+                events = self.since(seq)
+            except FeedGap as gap:
+                yield gap
+                seq = gap.head
+                continue
+            if events:
+                seq = events[-1].seq
+                yield events
+            elif not await self.wait(seq, heartbeat):
+                yield []
@@ -0,0 +1,207 @@
+import fcntl
+import os
+import threading
+import time
+
+from decouple import config
+
+# Custom epoch for Snowflake ids (2024-01-01 UTC) in milliseconds
+SNOWFLAKE_EPOCH_MS = 1704067200000
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class SequenceAllocator:
+    """
+    SequenceAllocator: Hands out monotonically increasing integer ids.
+
+    Safe to share between threads of one process.
+    """
+
+    def __init__(self, start: int = 1):
+        self._lock = threading.Lock()
+        self._next = start
+
+    def next_id(self):
+        with self._lock:
+            post_id = self._next
+            self._next += 1
+            return post_id
+
+    def advance_past(self, post_id: int):
+        """Make sure ids handed out from now on are greater than post_id."""
+        with self._lock:
+            if post_id >= self._next:
+                self._next = post_id + 1
+
+
+class FileSequenceAllocator:
+    """
+    FileSequenceAllocator: Integer sequence shared by several worker processes.
+
+    The high-water mark lives in a small file guarded by an exclusive flock.
+    Each process reserves a block of block_size ids per lock round trip and
+    hands them out locally, so ids are unique across processes and increasing
+    within each process.
+    """
+
+    def __init__(self, path: str, block_size: int = 100):
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+
+    def next_id(self):
+        with self._lock:
+            if self._next >= self._limit:
+                self._next, self._limit = self._reserve(self.block_size)
+            post_id = self._next
+            self._next += 1
+            return post_id
+
+    def advance_past(self, post_id: int):
+        """Make sure ids handed out from now on, by any process, are greater than post_id."""
+        with self._lock:
+            self._update_high_water_mark(lambda current: max(current, post_id + 1))
+            if self._next <= post_id:
+                self._next = self._limit = 0
+
+    def _reserve(self, count):
+        start = self._update_high_water_mark(lambda current: current + count)
+        return start - count, start
+
+    def _update_high_water_mark(self, update):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.read(fd, 32).strip()
+            current = int(raw) if raw else 1
+            new_value = update(current)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(new_value).encode())
+            os.fsync(fd)
+            return new_value
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class SnowflakeAllocator:
+    """
+    SnowflakeAllocator: Time-ordered 64-bit ids.
+
+    Layout (most to least significant): 41 bits of milliseconds since
+    SNOWFLAKE_EPOCH_MS, 10 bits of worker id and 12 bits of per-millisecond
+    sequence. Ids from one worker are strictly increasing; ids from different
+    workers are unique as long as every process gets its own worker id.
+
+    The worker id is either given, or claimed with claim(): every worker id
+    has a lock file in a directory shared by the processes of one host, and
+    a process takes the first one no other live process holds. A forked child
+    inherits its parent's lock, so it claims a worker id of its own before
+    handing out its first id.
+    """
+
+    def __init__(self, worker_id: int):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker id must be between 0 and {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        # Set by claim(): lock file directory, the process holding the claim and its lock file
+        self._directory = None
+        self._pid = None
+        self._slot_fd = None
+
+    @classmethod
+    def claim(cls, directory: str):
+        """Build an allocator whose worker id is claimed through the lock files in directory."""
+        allocator = cls(0)
+        allocator._directory = directory
+        allocator._claim()
+        return allocator
+
+    def _claim(self):
+        os.makedirs(self._directory, exist_ok=True)
+        for worker_id in range(MAX_WORKER_ID + 1):
+            fd = os.open(os.path.join(self._directory, f"worker-{worker_id}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            # The lock is held, and the worker id taken, until this process exits
+            self.worker_id = worker_id
+            self._pid = os.getpid()
+            self._slot_fd = fd
+            return
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} Snowflake worker ids in {self._directory} are taken")
+
+    def next_id(self):
+        with self._lock:
+            if self._pid is not None and self._pid != os.getpid():
+                # Forked: the inherited lock is still the parent's claim. Closing our
+                # copy keeps the parent's lock, but stops it outliving the parent.
+                os.close(self._slot_fd)
+                self._claim()
+            now_ms = self._now_ms()
+            if now_ms < self._last_ms:
+                # Clock stepped backwards, keep issuing from the last timestamp.
+                now_ms = self._last_ms
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond, wait for the next one.
+                    while now_ms <= self._last_ms:
+                        now_ms = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return ((now_ms - SNOWFLAKE_EPOCH_MS) << (WORKER_ID_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def advance_past(self, post_id: int):
+        """Make sure ids handed out from now on are greater than post_id."""
+        with self._lock:
+            post_ms = (post_id >> (WORKER_ID_BITS + SEQUENCE_BITS)) + SNOWFLAKE_EPOCH_MS
+            if post_ms > self._last_ms:
+                self._last_ms = post_ms
+                self._sequence = MAX_SEQUENCE
+            elif post_ms == self._last_ms:
+                self._sequence = MAX_SEQUENCE
+
+    @staticmethod
+    def timestamp_ms(post_id: int):
+        """Return the creation time, in Unix milliseconds, encoded in a Snowflake id."""
+        return (post_id >> (WORKER_ID_BITS + SEQUENCE_BITS)) + SNOWFLAKE_EPOCH_MS
+
+    @staticmethod
+    def _now_ms():
+        return time.time_ns() // 1_000_000
+
+
+def make_allocator(kind: str = None):
+    """
+    Build the id allocator selected by the ID_ALLOCATOR setting.
+
+    - "sequence" (default): in-process integer sequence.
+    - "file": integer sequence shared between processes through ID_SEQUENCE_FILE.
+    - "snowflake": time-ordered 64-bit ids. The worker id comes from
+      SNOWFLAKE_WORKER_ID, or is claimed through lock files in
+      SNOWFLAKE_WORKER_DIR when that is not set.
+    """
+    kind = kind or config("ID_ALLOCATOR", default="sequence")
+    if kind == "sequence":
+        return SequenceAllocator()
+    if kind == "file":
+        return FileSequenceAllocator(config("ID_SEQUENCE_FILE", default="post_ids.seq"))
+    if kind == "snowflake":
+        worker_id = config("SNOWFLAKE_WORKER_ID", default=None)
+        if worker_id is not None:
+            return SnowflakeAllocator(int(worker_id))
+        return SnowflakeAllocator.claim(config("SNOWFLAKE_WORKER_DIR", default="snowflake_workers"))
+    raise ValueError(f"Unknown id allocator: {kind}")
@@ -1,22 +1,45 @@
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from decouple import config
 from jwt_handler import decodeJWT
+from token_cache import VerifiedTokenCache
+from metrics import registry
+
+# Tokens that already passed signature verification, shared by every jwtBearer
+verified_tokens = VerifiedTokenCache(maxsize=config("TOKEN_CACHE_SIZE", default=10000, cast=int))
+
+def token_cache_series():
+    # Read at every /metrics scrape from the counters the cache keeps anyway
+    stats = verified_tokens.stats()
+    series = {(f"token_cache_{name}_total", ()): stats[name] for name in ("hits", "misses", "evictions")}
+    series[("token_cache_size", ())] = stats["size"]
+    return series
+
+registry.add_collector(token_cache_series)
+
 class jwtBearer(HTTPBearer):
     def __init__(self, auto_Error : bool = True):
         super(jwtBearer, self).__init__(auto_error=auto_Error)
-    
+
     async def __call__(self, request : Request):
         credentials : HTTPAuthorizationCredentials = await super(jwtBearer, self).__call__(request)
         if credentials:
             if not credentials.scheme == "Bearer":
-                raise HTTPException(status_code=403, details="Invalid or Expired Token!")
+                raise HTTPException(status_code=403, detail="Invalid or Expired Token!")
+            with registry.phase("auth"):
+                payload = self.verify_jwt(credentials.credentials)
+            if not payload:
+                raise HTTPException(status_code=403, detail="Invalid or Expired Token!")
+            request.state.jwt_payload = payload
             return credentials.credentials
         else:
-            raise HTTPException(status_code=403, details="Invalid or Expired Token!")
+            raise HTTPException(status_code=403, detail="Invalid or Expired Token!")
 
     def verify_jwt(self, jwttoken : str):
-        isTokenValid : bool = False
-        payload = decodeJWT(jwttoken)
-        if payload:
-            isTokenValid = True
-        return isTokenValid
\ No newline at end of file
+        # Fast path: the token was verified before and has not expired yet
+        payload = verified_tokens.get(jwttoken)
+        if payload is None:
+            payload = decodeJWT(jwttoken)
+            if payload:
+                verified_tokens.put(jwttoken, payload, payload['expiry'])
+        return payload
@@ -20,9 +20,10 @@ def signJWT(userID: str):
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return token_response(token)
 
+# Function returns the payload of a valid, unexpired token and None otherwise
 def decodeJWT(token: str):
     try:
-        decode_token = jwt.decode(token, JWT_SECRET, algorithm=JWT_ALGORITHM)
-        return decode_token if decode_token['expires'] >= time.time() else None
-    except:
-        return {}
+        decode_token = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        return decode_token if decode_token['expiry'] >= time.time() else None
+    except (jwt.PyJWTError, KeyError, TypeError):
+        return None
@@ -1,12 +1,37 @@
-from fastapi import FastAPI, HTTPException, status, Depends, Body
+from fastapi import FastAPI, HTTPException, status, Depends, Body, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field, EmailStr
-from random import randrange
+from typing import Optional
 from jwt_handler import signJWT
 from jwt_bearer import jwtBearer
-
+from storage import open_storage
+from post_events import PreconditionFailed
+from async_store import async_storage, storage_workers
+from bulk import BulkValidator, bulk_response, read_bulk_items
+from search_index import SearchIndex
+from change_feed import ChangeFeed, FeedGap
+from response_cache import ResponseCache
+from post_record import PostJSONResponse
+from metrics import MetricsMiddleware, registry as metrics
+from openapi_cache import cache_openapi
+from profiling import SamplingProfiler, SlowRequestMiddleware
+from rate_limit import MemoryTokenBuckets, RateLimiter, SQLiteTokenBuckets
+from decouple import config, Csv
+from user_registry import UserRecord, DUMMY_PASSWORD_HASH, normalize_email, hash_password_async, verify_password_async
+
+import asyncio
+import base64
 import math
+from collections import deque
 
 app = FastAPI()
+# Reuse the OpenAPI schema written by an earlier start instead of generating it on the first /docs hit
+openapi_cache_path = config("OPENAPI_CACHE_PATH", default="")
+if openapi_cache_path:
+    cache_openapi(app, openapi_cache_path)
+# Per-route request counts and latency histograms, served at /metrics
+app.add_middleware(MetricsMiddleware)
 
 class LinkedInPost(BaseModel):
     """
@@ -23,6 +48,33 @@ class LinkedInPost(BaseModel):
     category: str
     published: bool = True
 
+class LinkedInPostWithId(LinkedInPost):
+    """
+    LinkedInPostWithId: A LinkedIn post together with the ID it is stored under.
+
+    Attributes:
+    - id (int): The ID of the post.
+    """
+    id: int
+
+class LinkedInPostPatch(BaseModel):
+    """
+    LinkedInPostPatch: A partial update to LinkedIn posts.
+
+    Only the fields present in the request body are changed; the fields left
+    out keep their values. Fields cannot be set to null.
+
+    Attributes:
+    - title (str): The new title of the post.
+    - content (str): The new content of the post.
+    - category (str): The new category of the post.
+    - published (bool): The new published flag of the post.
+    """
+    title: str = Field(default=None)
+    content: str = Field(default=None)
+    category: str = Field(default=None)
+    published: bool = Field(default=None)
+
 class User(BaseModel):
     fullname: str = Field(default=None)
     email: EmailStr = Field(default=None)
@@ -33,31 +85,119 @@ class UserLogin(BaseModel):
     password: str = Field(default=None)
 
 # Sample initial data
-linkedin_posts = [
+seed_posts = [
     {"title": "New Job Post", "content": "I got a new job", "id": 1},
     {"title": "Open To Work Post", "content": "I am available on the job market", "id": 2}
 ]
 
-users = []
+# Posts, users and the post id allocator come from the engine chosen by STORAGE_BACKEND.
+# Post ids come from a collision-free, increasing sequence so they double as a sort key.
+storage = open_storage(seed_posts=seed_posts)
+linkedin_posts = storage.posts
+users = storage.users
+post_ids = storage.post_ids
+
+# Async views of the same engines for the async handlers; blocking engines run on a storage thread pool
+posts_async, users_async, post_ids_async = async_storage(storage)
+# Write-ahead log of the memory engine, set when POST_LOG_DIR is configured
+post_log = storage.post_log
+# With the shared engine, every request first picks up the writes of the other workers
+if storage.shared is not None:
+    from shared_store import SharedStoreMiddleware
+    app.add_middleware(SharedStoreMiddleware, shared=storage.shared, executor=storage_workers)
+
+# Full-text index over post titles and contents, kept up to date by every store write
+search_index = SearchIndex()
+search_index.rebuild(linkedin_posts)
+linkedin_posts.add_listener(search_index.apply)
+
+# Encoded read responses with ETags, dropped precisely by the writes that make them stale.
+# Off by default for SQLite, since other workers' writes to it go unseen; the shared engine replays them.
+# Concurrent identical misses share one build and encoding unless SINGLE_FLIGHT is off.
+response_cache = ResponseCache(linkedin_posts, maxsize=config("RESPONSE_CACHE_SIZE", default=1024, cast=int), enabled=config("RESPONSE_CACHE", default=storage.backend != "sqlite", cast=bool), coalesce=config("SINGLE_FLIGHT", default=True, cast=bool))
+linkedin_posts.add_listener(response_cache.apply)
+
+# Sequenced post changes for /linkedinposts/changes subscribers, instead of polling the listings
+change_feed = ChangeFeed(size=config("CHANGE_FEED_SIZE", default=10000, cast=int))
+linkedin_posts.add_listener(change_feed.publish)
+change_feed_heartbeat = config("CHANGE_FEED_HEARTBEAT_SECONDS", default=15, cast=float)
+
+# Opt-in profiling: a runtime sampling profiler and a log of requests slower than SLOW_REQUEST_MS
+profiler = SamplingProfiler(interval=config("PROFILER_INTERVAL_MS", default=5, cast=float) / 1000)
+if config("PROFILER", default=False, cast=bool):
+    profiler.start()
+slow_requests = deque(maxlen=100)
+slow_request_ms = config("SLOW_REQUEST_MS", default=0, cast=float)
+app.add_middleware(SlowRequestMiddleware, threshold=slow_request_ms / 1000 if slow_request_ms else None, store_size=lambda: len(linkedin_posts), recent=slow_requests)
+# Token-bucket rate limits per route group, keyed by client IP and user. RATE_LIMIT_SQLITE_PATH shares them between workers.
+rate_limit_path = config("RATE_LIMIT_SQLITE_PATH", default="")
+rate_limiter = RateLimiter(
+    SQLiteTokenBuckets(rate_limit_path) if rate_limit_path else MemoryTokenBuckets(),
+    limits={
+        "auth": config("RATE_LIMIT_AUTH", default="30/60"),
+        "read": config("RATE_LIMIT_READ", default="1200/60"),
+        "write": config("RATE_LIMIT_WRITE", default="120/60"),
+        "bulk": config("RATE_LIMIT_BULK", default="10/60"),
+    },
+    enabled=config("RATE_LIMIT", default=False, cast=bool),
+    executor=storage_workers if rate_limit_path else None,
+)
+# Users (by email) allowed to call the /admin endpoints
+admin_users = set(config("ADMIN_USERS", default="", cast=Csv(post_process=lambda emails: [normalize_email(email) for email in emails])))
+
+# Batch validators for the bulk endpoints
+new_posts_validator = BulkValidator(LinkedInPost)
+updated_posts_validator = BulkValidator(LinkedInPostWithId)
+post_ids_validator = BulkValidator(int)
 
 # Utility functions
-def find_linkedin_post(post_id):
-    for post in linkedin_posts:
-        if post["id"] == post_id:
-            return post
+async def find_linkedin_post(post_id):
+    return await posts_async.get(post_id)
 
-def find_index_of_linkedin_post(post_id):
-    for index, post in enumerate(linkedin_posts):
-        if post['id'] == post_id:
-            return index
-
-def paginate_posts(page: int = 1, page_size: int = 10):
+async def paginate_posts(page: int = 1, page_size: int = 10, category: Optional[str] = None, published: Optional[bool] = None, posts=posts_async):
     start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-    return linkedin_posts[start_index:end_index]
-
-@app.post("/user/signup", tags=["user"])
-def user_signup(user : User = Body(default=None)):
+    return await posts.page(start_index, page_size, category=category, published=published)
+
+def patch_fields(post: LinkedInPostPatch):
+    fields = post.dict(exclude_unset=True)
+    if not fields:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Error: No fields to update")
+    return fields
+
+def check_if_match(request: Request, post_id=None):
+    """Return the versions If-Match accepts for post_id (every post if None), or answer 412 at once when it names none of them."""
+    versions = response_cache.if_match_versions(request, post_id)
+    if versions is not None and not versions:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Error: If-Match does not name a current ETag of this resource")
+    return versions
+
+async def wait_for_post_log():
+    # Acknowledge a write only once the log holding it is on disk
+    if post_log is not None:
+        await post_log.wait_flushed()
+
+def encode_cursor(post_id):
+    return base64.urlsafe_b64encode(f"id:{post_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        decoded = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, post_id = decoded.split(":", 1)
+        if prefix != "id":
+            raise ValueError(cursor)
+        return int(post_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+async def paginate_posts_after(cursor: Optional[str] = None, limit: int = 10, category: Optional[str] = None, published: Optional[bool] = None, posts=posts_async):
+    after_id = decode_cursor(cursor) if cursor else None
+    # Fetch one extra post to find out whether another page follows
+    posts = await posts.page_after(after_id, limit + 1, category=category, published=published)
+    next_cursor = encode_cursor(posts[limit - 1]["id"]) if len(posts) > limit else None
+    return posts[:limit], next_cursor
+
+@app.post("/user/signup", dependencies=[Depends(rate_limiter.limit("auth"))], tags=["user"])
+async def user_signup(user : User = Body(default=None)):
     """
     Signup new user
     Parameters:
@@ -65,17 +205,26 @@ def user_signup(user : User = Body(default=None)):
     Returns:
     access_token (json): The bearer token for authorization
     """
-    users.append(user)
-    return signJWT(user.email)
-
-def check_user(data: UserLogin):
-    for user in users:
-        if user.email == data.email and user.password == data.password:
-            return True
+    if user is None or not user.email or not user.password:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Email and password are required.")
+    password_hash = await hash_password_async(user.password)
+    try:
+        await users_async.add(UserRecord(user.fullname, normalize_email(user.email), password_hash))
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A user with this email already exists.")
+    return signJWT(normalize_email(user.email))
+
+async def check_user(data: UserLogin):
+    if data is None or not data.email or not data.password:
         return False
-
-@app.post("/user/login", tags=["user"])
-def user_login(user: UserLogin = Body(default=None)):
+    user = await users_async.get(data.email)
+    # Unknown emails are checked against a dummy hash so they take as long as a wrong password
+    password_hash = user.password if user else DUMMY_PASSWORD_HASH
+    password_matches = await verify_password_async(data.password, password_hash)
+    return user is not None and password_matches
+
+@app.post("/user/login", dependencies=[Depends(rate_limiter.limit("auth"))], tags=["user"])
+async def user_login(user: UserLogin = Body(default=None)):
     """
     Login and authenticate user
     Parameters:
@@ -83,36 +232,57 @@ def user_login(user: UserLogin = Body(default=None)):
     Returns:
     access_token (json): The bearer token for authorization
     """
-    if check_user(user):
-        return signJWT(user.email)
+    if await check_user(user):
+        return signJWT(normalize_email(user.email))
     else:
         return {
             "error": "Invalid login details!"
         }
 
 # Get all posts with pagination
-@app.get("/linkedinposts", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_200_OK)
-def get_all_posts(page: int = 1, page_size: int = 10):
+@app.get("/linkedinposts", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("read"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def get_all_posts(request: Request, page: int = 1, page_size: int = 10, after: Optional[str] = None, limit: Optional[int] = None, category: Optional[str] = None, published: Optional[bool] = None):
     """
     Retrieve all LinkedIn posts with pagination.
 
+    Passing after or limit switches to cursor pagination: the response carries
+    a next_cursor to send back as after, and every page costs the same no
+    matter how deep it is.
+
     Parameters:
     - page (int): The page number to retrieve (default 1).
     - page_size (int): The number of posts per page (default 10).
+    - after (str): Cursor returned as next_cursor by the previous page (cursor mode).
+    - limit (int): The number of posts per page in cursor mode (default page_size).
+    - category (str): Only list posts in this category (optional).
+    - published (bool): Only list posts with this published flag (optional).
 
     Returns:
     - data (list): List of LinkedIn post details.
+    - next_cursor (str): Cursor for the following page, null on the last page (cursor mode only).
     """
+    if after is not None or limit is not None:
+        limit = page_size if limit is None else limit
+        if (limit < 1):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid limit. Must be integer greater than 0.')
+        key = ("posts", "cursor", after, limit, category, published)
+        return await response_cache.respond_async(request, key, response_cache.table_etag(), lambda: get_posts_by_cursor(after, limit, category, published))
     if (page < 1):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid page number. Must be integer greater than 0.')
     if (page_size < 1):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid page size. Must be integer greater than 0.')
-    # Check if there are any posts available
-    if len(linkedin_posts) == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
-    
-    # Paginate the posts
-    paginated_posts = paginate_posts(page, page_size)
+    key = ("posts", "page", page, page_size, category, published)
+    return await response_cache.respond_async(request, key, response_cache.table_etag(), lambda: get_posts_by_page(page, page_size, category, published))
+
+async def get_posts_by_page(page: int, page_size: int, category: Optional[str] = None, published: Optional[bool] = None):
+    # Read from one snapshot, so a concurrent update_all or clear cannot change the table between the checks
+    async with posts_async.snapshot() as posts:
+        # Check if there are any posts available
+        if not await posts.any():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
+
+        # Paginate the posts
+        paginated_posts = await paginate_posts(page, page_size, category, published, posts)
     
     # If no posts found for the given page, raise 404
     if not paginated_posts:
@@ -120,23 +290,259 @@ def get_all_posts(page: int = 1, page_size: int = 10):
     
     return {"data": paginated_posts}
 
+async def stream_posts(category: Optional[str] = None, published: Optional[bool] = None, batch_size: int = 1000):
+    # Walk one snapshot in keyset batches, so only one batch is held in memory at a time;
+    # writes made while the export runs do not show up in it
+    async with posts_async.snapshot() as posts:
+        after_id = None
+        while True:
+            batch = await posts.page_after(after_id, batch_size, category=category, published=published)
+            if not batch:
+                return
+            after_id = batch[-1]["id"]
+            yield b"".join(post.json_bytes() + b"\n" for post in batch)
+
+async def get_posts_by_cursor(after: Optional[str], limit: int, category: Optional[str] = None, published: Optional[bool] = None):
+    async with posts_async.snapshot() as snapshot:
+        if not await snapshot.any():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
+        posts, next_cursor = await paginate_posts_after(after, limit, category, published, snapshot)
+    if not posts:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
+    return {"data": posts, "next_cursor": next_cursor}
+
 # Get the latest post
-@app.get("/linkedinposts/latest", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_200_OK)
-def get_latest_post():
+@app.get("/linkedinposts/latest", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("read"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def get_latest_post(request: Request):
     """
     Retrieve the latest LinkedIn post.
 
     Returns:
     - post_detail (dict): Details of the latest post.
     """
-    if len(linkedin_posts) == 0:
+    if not await posts_async.any():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
+    return await response_cache.respond_async(request, ("latest",), response_cache.table_etag(), get_latest_post_detail)
+
+async def get_latest_post_detail():
+    post = await posts_async.latest()
+    if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
-    post = linkedin_posts[-1]
     return {"post_detail": post}
 
+# Export all posts as NDJSON
+@app.get("/linkedinposts/export", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("read"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def export_posts(category: Optional[str] = None, published: Optional[bool] = None):
+    """
+    Stream every LinkedIn post as NDJSON, one post per line.
+
+    Posts are read and sent in batches, so memory use does not grow with the table.
+
+    Parameters:
+    - category (str): Only export posts in this category (optional).
+    - published (bool): Only export posts with this published flag (optional).
+
+    Returns:
+    - NDJSON stream of LinkedIn post details.
+    """
+    return StreamingResponse(stream_posts(category, published), media_type="application/x-ndjson")
+
+# Stream post changes
+@app.get("/linkedinposts/changes", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("read"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def stream_changes(request: Request, since: Optional[int] = None):
+    """
+    Stream every post write as Server-Sent Events.
+
+    Each event has the write's sequence number as its id, the operation as its
+    event type and JSON data holding seq, op, id and the post (or the fields of
+    an update_all). Reconnecting clients resume after the Last-Event-ID header
+    or the since parameter. A "reset" event means events were missed: reload
+    the posts and continue from the seq it carries. The same stream is served
+    over WebSocket at this path, with the token in the token parameter.
+
+    Parameters:
+    - since (int): Send the events after this sequence number (optional, default: only new events).
+
+    Returns:
+    - text/event-stream of post changes.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id is not None:
+        since = int(last_event_id) if last_event_id.isdigit() else None
+    seq = check_change_feed_position(since)
+    return StreamingResponse(sse_changes(seq), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/linkedinposts/changes")
+async def websocket_changes(websocket: WebSocket, since: Optional[int] = None, token: Optional[str] = None):
+    authorization = websocket.headers.get("authorization", "")
+    if token is None and authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+    if not token or not jwtBearer().verify_jwt(token):
+        await websocket.close(code=1008, reason="Invalid or Expired Token!")
+        return
+    try:
+        seq = check_change_feed_position(since)
+    except HTTPException as error:
+        await websocket.close(code=1008, reason=error.detail)
+        return
+    await websocket.accept()
+    sender = asyncio.ensure_future(send_changes(websocket, seq))
+    try:
+        # Nothing is expected from the client; reading only notices when it leaves
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+
+def check_change_feed_position(since):
+    if since is None:
+        return change_feed.seq
+    if since < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid since. Must be integer greater than or equal to 0.')
+    try:
+        change_feed.since(since)
+    except FeedGap as gap:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=f"Error: Changes since {since} are no longer available. Reload the posts and resume from {gap.head}.")
+    return since
+
+async def sse_changes(seq):
+    yield b"retry: 3000\n\n"
+    async for events in change_feed.subscribe(seq, heartbeat=change_feed_heartbeat):
+        if isinstance(events, FeedGap):
+            yield b"event: reset\ndata: {\"seq\": %d}\n\n" % events.head
+        elif events:
+            yield b"".join(event.sse() for event in events)
+        else:
+            yield b": keepalive\n\n"
+
+async def send_changes(websocket, seq):
+    try:
+        async for events in change_feed.subscribe(seq):
+            if isinstance(events, FeedGap):
+                await websocket.send_text(f'{{"seq": {events.head}, "op": "reset"}}')
+            else:
+                for event in events:
+                    await websocket.send_text(event.data.decode())
+    except (WebSocketDisconnect, RuntimeError):
+        # The client left; websocket_changes notices and returns
+        pass
+
+# Search posts
+@app.get("/linkedinposts/search", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("read"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def search_posts(q: str, limit: int = 10):
+    """
+    Search LinkedIn posts by the words in their title and content.
+
+    Parameters:
+    - q (str): The search words. End a word with * to match it as a prefix (surf* matches surfing).
+    - limit (int): The maximum number of posts to return (default 10).
+
+    Returns:
+    - data (list): List of matching LinkedIn post details, best match first.
+    """
+    if (limit < 1):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid limit. Must be integer greater than 0.')
+    if not q.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid query. Must contain at least one word.')
+    # Scoring grows with the index, and bulk writes may hold the index lock meanwhile
+    matches = await asyncio.get_running_loop().run_in_executor(storage_workers, search_index.search, q, limit)
+    async with posts_async.snapshot() as snapshot:
+        posts = [await snapshot.get(post_id) for post_id, score in matches]
+    posts = [post for post in posts if post is not None]
+    if not posts:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
+    return PostJSONResponse({"data": posts})
+
+# Create posts in bulk
+@app.post("/linkedinposts/bulk", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("bulk"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def create_posts_bulk(items: list = Depends(read_bulk_items)):
+    """
+    Create many LinkedIn posts in one request.
+
+    Parameters:
+    - items (list): JSON array, or NDJSON with one post per line, of LinkedInPost details.
+
+    Returns:
+    - succeeded (int): The number of posts created.
+    - failed (int): The number of items rejected.
+    - results (list): Per item, in request order, the status and the new post ID or the validation errors.
+    """
+    # Validating thousands of items is CPU work, so it stays off the event loop
+    posts, errors = await run_in_threadpool(new_posts_validator.validate, items)
+    results = []
+    new_posts = []
+    new_ids = iter(await post_ids_async.next_ids(sum(post is not None for post in posts)))
+    for index, post in enumerate(posts):
+        if post is None:
+            results.append({"status": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": errors[index]})
+            continue
+        post_dict = post.dict()
+        post_dict["id"] = next(new_ids)
+        new_posts.append(post_dict)
+        results.append({"status": status.HTTP_201_CREATED, "id": post_dict["id"]})
+    if new_posts:
+        await posts_async.insert_many(new_posts)
+        await wait_for_post_log()
+    return PostJSONResponse(bulk_response(results))
+
+# Update posts in bulk
+@app.put("/linkedinposts/bulk", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("bulk"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def update_posts_bulk(items: list = Depends(read_bulk_items)):
+    """
+    Update many LinkedIn posts by their IDs in one request.
+
+    Parameters:
+    - items (list): JSON array, or NDJSON with one post per line, of LinkedInPostWithId details.
+
+    Returns:
+    - succeeded (int): The number of posts updated.
+    - failed (int): The number of items rejected or not found.
+    - results (list): Per item, in request order, the status and the post ID or the validation errors.
+    """
+    posts, errors = await run_in_threadpool(updated_posts_validator.validate, items)
+    post_dicts = [post.dict() for post in posts if post is not None]
+    found = iter(await posts_async.replace_many(post_dicts))
+    await wait_for_post_log()
+    results = []
+    for index, post in enumerate(posts):
+        if post is None:
+            results.append({"status": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": errors[index]})
+        elif next(found):
+            results.append({"status": status.HTTP_200_OK, "id": post.id})
+        else:
+            results.append({"status": status.HTTP_404_NOT_FOUND, "id": post.id})
+    return PostJSONResponse(bulk_response(results))
+
+# Delete posts in bulk
+@app.delete("/linkedinposts/bulk", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("bulk"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def delete_posts_bulk(items: list = Depends(read_bulk_items)):
+    """
+    Delete many LinkedIn posts by their IDs in one request.
+
+    Parameters:
+    - items (list): JSON array, or NDJSON with one ID per line, of post IDs.
+
+    Returns:
+    - succeeded (int): The number of posts deleted.
+    - failed (int): The number of items rejected or not found.
+    - results (list): Per item, in request order, the status and the post ID or the validation errors.
+    """
+    ids, errors = await run_in_threadpool(post_ids_validator.validate, items)
+    found = iter(await posts_async.delete_many([post_id for post_id in ids if post_id is not None]))
+    await wait_for_post_log()
+    results = []
+    for index, post_id in enumerate(ids):
+        if post_id is None:
+            results.append({"status": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": errors[index]})
+        elif next(found):
+            results.append({"status": status.HTTP_200_OK, "id": post_id})
+        else:
+            results.append({"status": status.HTTP_404_NOT_FOUND, "id": post_id})
+    return PostJSONResponse(bulk_response(results))
+
 # Get post by ID
-@app.get("/linkedinposts/{id}", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_200_OK)
-def get_post_by_id(id: int):
+@app.get("/linkedinposts/{id}", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("read"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def get_post_by_id(request: Request, id: int):
     """
     Retrieve a LinkedIn post by its ID.
 
@@ -146,18 +552,23 @@ def get_post_by_id(id: int):
     Returns:
     - post_detail (dict): Details of the requested post.
     """
-    if len(linkedin_posts) == 0:
+    if not await posts_async.any():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
     if id < 0 or math.isnan(id):
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"ID {id} is invalid. ID must be a number greater than -1.")
-    post = find_linkedin_post(id)
+    # Take the ETag before reading the post, so a concurrent write can only make the tag older than the body
+    etag = response_cache.post_etag(id)
+    return await response_cache.respond_async(request, ("post", id), etag, lambda: get_post_detail(id), post_id=id)
+
+async def get_post_detail(post_id):
+    post = await find_linkedin_post(post_id)
     if not post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with ID {id} not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with ID {post_id} not found")
     return {"post_detail": post}
 
 # Create a new post
-@app.post("/linkedinposts", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_201_CREATED)
-def create_post(post: LinkedInPost):
+@app.post("/linkedinposts", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("write"))], tags=["posts"], status_code=status.HTTP_201_CREATED)
+async def create_post(post: LinkedInPost):
     """
     Create a new LinkedIn post.
 
@@ -168,13 +579,14 @@ def create_post(post: LinkedInPost):
     - data (dict): Details of the created post.
     """
     post_dict = post.dict()
-    post_dict["id"] = randrange(0, 1000000)
-    linkedin_posts.append(post_dict)
+    post_dict["id"] = await post_ids_async.next_id()
+    await posts_async.insert(post_dict)
+    await wait_for_post_log()
     return {"data": post_dict}
 
 # Update a post by ID
-@app.put("/linkedinposts/{id}", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_200_OK)
-def update_post_by_id(id: int, post: LinkedInPost):
+@app.put("/linkedinposts/{id}", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("write"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def update_post_by_id(id: int, post: LinkedInPost):
     """
     Update a LinkedIn post by its ID.
 
@@ -186,19 +598,73 @@ def update_post_by_id(id: int, post: LinkedInPost):
     - message (str): A message indicating the success of the update.
     - post_details (dict): Details of the updated post.
     """
-    if len(linkedin_posts) == 0:
+    if not await posts_async.any():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
-    indx = find_index_of_linkedin_post(id)
-    if indx is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with ID {id} does not exist")
     post_dict = post.dict()
     post_dict['id'] = id
-    linkedin_posts[indx] = post_dict
+    try:
+        await posts_async.replace(id, post_dict)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with ID {id} does not exist")
+    await wait_for_post_log()
     return {"message": f"Post with ID {id} successfully updated", "post_details": post_dict}
 
+# Change some fields of a post by ID
+@app.patch("/linkedinposts/{id}", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("write"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def patch_post_by_id(request: Request, id: int, post: LinkedInPostPatch):
+    """
+    Change some fields of a LinkedIn post by its ID.
+
+    Parameters:
+    - id (int): The ID of the post to update.
+    - post (LinkedInPostPatch): The fields to change; fields left out keep their values.
+    - If-Match (header, optional): The ETag of GET /linkedinposts/{id}; the update fails with 412 if the post changed since.
+
+    Returns:
+    - message (str): A message indicating the success of the update.
+    - post_details (dict): Details of the updated post.
+    """
+    fields = patch_fields(post)
+    versions = check_if_match(request, id)
+    try:
+        updated = await posts_async.update(id, fields, versions=versions)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with ID {id} does not exist")
+    except PreconditionFailed:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=f"Error: Post with ID {id} has changed since the If-Match ETag was issued")
+    await wait_for_post_log()
+    return PostJSONResponse({"message": f"Post with ID {id} successfully updated", "post_details": updated})
+
+# Change some fields of every post matching the filters
+@app.patch("/linkedinposts", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("bulk"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def patch_posts(request: Request, post: LinkedInPostPatch, category: Optional[str] = None, published: Optional[bool] = None):
+    """
+    Change some fields of every LinkedIn post matching the filters.
+
+    Parameters:
+    - post (LinkedInPostPatch): The fields to change; fields left out keep their values.
+    - category (str): Only update posts in this category (optional).
+    - published (bool): Only update posts with this published flag (optional).
+    - If-Match (header, optional): The ETag of GET /linkedinposts; the update fails with 412 if any post changed since.
+
+    Returns:
+    - message (str): A message indicating the success of the update.
+    - matched (int): The number of posts matching the filters.
+    - updated (int): The number of posts that changed; posts already holding the values are left alone.
+    - Updated Posts (list): Details of the posts that changed.
+    """
+    fields = patch_fields(post)
+    generations = check_if_match(request)
+    try:
+        matched, updated_posts = await posts_async.update_where(fields, category=category, published=published, generations=generations)
+    except PreconditionFailed:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Error: The posts have changed since the If-Match ETag was issued")
+    await wait_for_post_log()
+    return PostJSONResponse({"message": "Matching posts successfully updated", "matched": matched, "updated": len(updated_posts), "Updated Posts": updated_posts})
+
 # Update all posts
-@app.put("/linkedinposts", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_200_OK)
-def update_all_posts(post: LinkedInPost):
+@app.put("/linkedinposts", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("bulk"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def update_all_posts(post: LinkedInPost):
     """
     Update all LinkedIn posts with the same details.
 
@@ -209,19 +675,15 @@ def update_all_posts(post: LinkedInPost):
     - message (str): A message indicating the success of the update.
     - Updated Posts (list): Details of all updated posts.
     """
-    if len(linkedin_posts) == 0:
+    if not await posts_async.any():
      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
-    post_dict = post.dict()
-    for post in linkedin_posts:
-        post['title'] = post_dict['title']
-        post['content'] = post_dict['content']
-        post['category'] = post_dict['category']
-        post['published'] = post_dict['published']
-    return {"message": "All posts successfully updated", "Updated Posts": linkedin_posts}
+    updated_posts = await posts_async.update_all(post.dict())
+    await wait_for_post_log()
+    return PostJSONResponse({"message": "All posts successfully updated", "Updated Posts": updated_posts})
 
 # Delete a post by ID
-@app.delete("/linkedinposts/{id}", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_200_OK)
-def delete_post(id: int):
+@app.delete("/linkedinposts/{id}", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("write"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def delete_post(id: int):
     """
     Delete a LinkedIn post by its ID.
 
@@ -231,24 +693,92 @@ def delete_post(id: int):
     Returns:
     - message (str): A message indicating the success of the deletion.
     """
-    if len(linkedin_posts) == 0:
+    if not await posts_async.any():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
-    indx = find_index_of_linkedin_post(id)
-    if indx is None:
+    try:
+        await posts_async.delete(id)
+    except KeyError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Post with ID {id} does not exist")
-    linkedin_posts.pop(indx)
+    await wait_for_post_log()
     return {"message": f"Post with ID {id} successfully deleted"}
 
 # Delete all posts
-@app.delete("/linkedinposts", dependencies=[Depends(jwtBearer())], tags=["posts"], status_code=status.HTTP_200_OK)
-def delete_all_posts():
+@app.delete("/linkedinposts", dependencies=[Depends(jwtBearer()), Depends(rate_limiter.limit("bulk"))], tags=["posts"], status_code=status.HTTP_200_OK)
+async def delete_all_posts():
     """
     Delete all LinkedIn posts.
 
     Returns:
     - message (str): A message indicating the success of the deletion.
     """
-    if len(linkedin_posts) == 0:
+    if not await posts_async.any():
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Error: No posts found")
-    linkedin_posts.clear()
-    return {"message": "All posts deleted"}
\ No newline at end of file
+    await posts_async.clear()
+    await wait_for_post_log()
+    return {"message": "All posts deleted"}
+
+# Metrics for Prometheus
+@app.get("/metrics", tags=["metrics"], response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Report request counts, in-flight requests, latency histograms per route and phase timings.
+
+    Returns:
+    - Prometheus text exposition format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_admin(request: Request):
+    if request.state.jwt_payload.get("userID") not in admin_users:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required.")
+
+# Start the sampling profiler
+@app.post("/admin/profiler/start", dependencies=[Depends(jwtBearer()), Depends(require_admin)], tags=["admin"])
+async def start_profiler(interval_ms: Optional[float] = None):
+    """
+    Start sampling every thread's stack.
+
+    Parameters:
+    - interval_ms (float): Milliseconds between samples (default PROFILER_INTERVAL_MS).
+
+    Returns:
+    - running (bool): Whether the profiler is running.
+    """
+    if interval_ms is not None and interval_ms <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid interval. Must be greater than 0.')
+    profiler.start(interval_ms / 1000 if interval_ms else None)
+    return {"running": profiler.running}
+
+# Stop the sampling profiler
+@app.post("/admin/profiler/stop", dependencies=[Depends(jwtBearer()), Depends(require_admin)], tags=["admin"], response_class=PlainTextResponse)
+async def stop_profiler():
+    """
+    Stop the profiler and return what it recorded.
+
+    Returns:
+    - Collapsed stacks, one "frame;frame;... count" line per stack, for flamegraph.pl or speedscope.
+    """
+    profiler.stop()
+    return PlainTextResponse(profiler.collapsed())
+
+# Read the sampling profiler
+@app.get("/admin/profiler", dependencies=[Depends(jwtBearer()), Depends(require_admin)], tags=["admin"], response_class=PlainTextResponse)
+async def get_profile():
+    """
+    Return the stacks recorded so far, without stopping the profiler.
+
+    Returns:
+    - Collapsed stacks, one "frame;frame;... count" line per stack, for flamegraph.pl or speedscope.
+    """
+    return PlainTextResponse(profiler.collapsed())
+
+# Recent slow requests
+@app.get("/admin/slow-requests", dependencies=[Depends(jwtBearer()), Depends(require_admin)], tags=["admin"])
+async def get_slow_requests():
+    """
+    List the most recent requests slower than SLOW_REQUEST_MS.
+
+    Returns:
+    - data (list): Route, parameters, status, duration, store size and per-phase timings of each slow request.
+    """
+    return {"threshold_ms": slow_request_ms or None, "data": list(slow_requests)}
@@ -0,0 +1,218 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from decouple import config
+
+METRICS_ENABLED = config("METRICS", default=True, cast=bool)
+# Upper bounds in seconds, as in the Prometheus client libraries
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phase totals of the current request, set only while slow requests are being captured
+request_phases = ContextVar("request_phases", default=None)
+
+HELP = {
+    "http_requests_total": ("counter", "HTTP requests by method, route and status code."),
+    "http_requests_in_flight": ("gauge", "HTTP requests being served."),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by method and route."),
+    "single_flight_requests_total": ("counter", "Read builds started (leader) or joined while in flight (follower), by endpoint."),
+    "rate_limited_total": ("counter", "Requests rejected by the rate limiter, by route group."),
+    "phase_duration_seconds": ("histogram", "Time spent in named phases of request handling (auth, validate, store, encode)."),
+    "token_cache_hits_total": ("counter", "Bearer tokens found in the verified token cache."),
+    "token_cache_misses_total": ("counter", "Bearer tokens not in the verified token cache, or expired there."),
+    "token_cache_evictions_total": ("counter", "Verified tokens dropped for expiry or to stay within TOKEN_CACHE_SIZE."),
+    "token_cache_size": ("gauge", "Verified tokens held in the cache."),
+}
+
+
+class _Shard:
+    """Metric values recorded by one thread."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """
+    MetricsRegistry: Counters, gauges and latency histograms with Prometheus text output.
+
+    Every thread records into its own shard, so recording takes no lock and
+    threads never contend; only a scrape walks all shards and adds them up.
+    Series are keyed by metric name plus a tuple of (label, value) pairs.
+    Components that already count for themselves register a collector,
+    which is read at scrape time instead.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._collectors = []
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def add(self, name, labels=(), amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, seconds):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (not cumulative), then +Inf, sum
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, seconds)] += 1
+        histogram[-1] += seconds
+
+    def add_collector(self, collector):
+        """Register a callable returning {(name, labels): value}, read at every scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def phase(self, name):
+        """Context manager timing one phase of a request into phase_duration_seconds."""
+        return _PhaseTimer(self, name)
+
+    def collect(self):
+        """Return (counters, histograms) summed over every thread."""
+        counters = {}
+        histograms = {}
+        with self._lock:
+            shards = list(self._shards)
+            collectors = list(self._collectors)
+        for shard in shards:
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, values in list(shard.histograms.items()):
+                total = histograms.get(key)
+                histograms[key] = list(values) if total is None else [a + b for a, b in zip(total, values)]
+        for collector in collectors:
+            for key, value in collector().items():
+                counters[key] = counters.get(key, 0) + value
+        return counters, histograms
+
+    def render(self):
+        """Render every series in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, description) in HELP.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (series, labels), values in sorted(histograms.items()):
+                    if series == name:
+                        lines.extend(self._render_histogram(name, labels, values))
+            else:
+                for (series, labels), value in sorted(counters.items()):
+                    if series == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _render_histogram(self, name, labels, values):
+        cumulative = 0
+        for bound, count in zip(self.buckets, values):
+            cumulative += count
+            yield f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}"
+        count = cumulative + values[len(self.buckets)]
+        yield f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}"
+        yield f"{name}_sum{_labels(labels)} {_number(values[-1])}"
+        yield f"{name}_count{_labels(labels)} {count}"
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+
+class _PhaseTimer:
+    __slots__ = ("registry", "labels", "started")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.labels = (("phase", name),)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        if METRICS_ENABLED:
+            self.registry.observe("phase_duration_seconds", self.labels, elapsed)
+        phases = request_phases.get()
+        if phases is not None:
+            name = self.labels[0][1]
+            phases[name] = phases.get(name, 0.0) + elapsed
+        return False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in labels) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    MetricsMiddleware: ASGI middleware recording every HTTP request.
+
+    Counts requests by method, route template and status code, keeps the
+    in-flight gauge, and observes the latency histogram per method and route.
+    Routes are labelled by their template (/linkedinposts/{id}), so the
+    number of series stays bounded.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        registry = self.registry
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        registry.add("http_requests_in_flight")
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.add("http_requests_in_flight", amount=-1)
+            route = scope.get("route")
+            path = getattr(route, "path", "<unmatched>")
+            method = scope["method"]
+            registry.add("http_requests_total", (("method", method), ("route", path), ("status", str(status_code))))
+            registry.observe("http_request_duration_seconds", (("method", method), ("route", path)), elapsed)
@@ -0,0 +1,84 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import fastapi
+import pydantic
+from fastapi import FastAPI
+
+
+def source_key(app: FastAPI):
+    """
+    Hash the FastAPI and Pydantic versions and the source of every module defining a route or one of its dependencies.
+
+    A dependency's signature adds parameters and bodies to the schema, so a
+    change to one (a rate limiter, a bulk body reader) yields a new key too.
+    """
+    digest = hashlib.sha256(f"{fastapi.__version__} {pydantic.VERSION}".encode())
+    modules = set()
+    for route in app.routes:
+        if hasattr(route, "dependant"):
+            _dependency_modules(route.dependant, modules)
+        elif hasattr(route, "endpoint"):
+            modules.add(route.endpoint.__module__)
+    modules = sorted(name for name in modules if getattr(sys.modules.get(name), "__file__", None))
+    for name in modules:
+        path = inspect.getsourcefile(sys.modules[name])
+        digest.update(name.encode())
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def _dependency_modules(dependant, modules):
+    call = dependant.call
+    if call is not None:
+        # Callable instances like jwtBearer() report their class's module
+        modules.add(getattr(call, "__module__", None) or type(call).__module__)
+    for dependency in dependant.dependencies:
+        _dependency_modules(dependency, modules)
+
+
+def cache_openapi(app: FastAPI, path: str):
+    """
+    Make app load its OpenAPI schema from path instead of generating it.
+
+    FastAPI builds the schema on the first /openapi.json or /docs request.
+    With the cache, that first request reads the schema written by an earlier
+    process built from the same sources, and otherwise builds it as usual and
+    writes it to path for the next process.
+    """
+
+    def openapi():
+        if app.openapi_schema is None:
+            key = source_key(app)
+            schema = _load(path, key)
+            if schema is None:
+                schema = FastAPI.openapi(app)
+                _store(path, key, schema)
+            app.openapi_schema = schema
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+def _load(path, key):
+    try:
+        with open(path, "rb") as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return cached["schema"] if cached.get("key") == key else None
+
+
+def _store(path, key, schema):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "w") as file:
+            json.dump({"key": key, "schema": schema}, file)
+        os.replace(temporary, path)
+    except OSError:
+        # A read-only deployment just generates the schema in every process
+        pass
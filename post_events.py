@@ -0,0 +1,186 @@
+import threading
+from typing import Any, NamedTuple, Optional
+
+
+class PostChange(NamedTuple):
+    """
+    PostChange: One write applied to the post store.
+
+    Attributes:
+    - kind (str): "insert", "replace", "update", "update_where", "delete", "update_all" or "clear".
+    - post_id (int): The ID of the post written, None for update_where, update_all and clear.
+    - before (dict): The post before the write, None for insert, update_where, update_all and clear.
+    - after (dict): The post after the write, the posts that changed for update_where, or the new fields for update_all.
+    - fields (dict): For update, only the fields the write changed; for update_where, the fields set.
+    - where (dict): For update_where, the category and published filters (None for no filter).
+    """
+    kind: str
+    post_id: Optional[int]
+    before: Any
+    after: Any
+    fields: Any = None
+    where: Any = None
+
+
+class PreconditionFailed(Exception):
+    """Raised when a conditional write finds the post or table at another version than the caller expected."""
+
+
+def changed_fields(post, fields):
+    """Return the items of fields whose value differs from post's."""
+    return {name: value for name, value in fields.items() if post.get(name) != value}
+
+
+class ObservedPostStore:
+    """
+    ObservedPostStore: Wraps a post store engine and reports every write.
+
+    Writes are serialized by one lock and each successful write is handed to
+    the registered listeners as a PostChange before the lock is released, so
+    listeners (search index, caches, logs) see writes in the order the store
+    applied them. Reads go straight to the wrapped engine.
+
+    Every write also bumps the store generation, and each written post
+    records the generation it was last written at as its version. Versions
+    only ever grow, so (generation, version) pairs are safe to use as ETags.
+    update and update_where can be made conditional on them: the check runs
+    under the write lock, so no other write slips in between.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.listeners = []
+        self.write_lock = threading.RLock()
+        self.generation = 0
+        self._post_versions = {}
+        # Generation of the last update_all or clear, which changed every post at once
+        self._reset_generation = 0
+
+    def version(self, post_id):
+        return max(self._post_versions.get(post_id, 0), self._reset_generation)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, change: PostChange):
+        self.generation += 1
+        if change.post_id is not None:
+            self._post_versions[change.post_id] = self.generation
+        elif change.kind == "update_where":
+            versions = self._post_versions
+            for post in change.after:
+                versions[post["id"]] = self.generation
+        else:
+            self._post_versions.clear()
+            self._reset_generation = self.generation
+        for listener in self.listeners:
+            listener(change)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __bool__(self):
+        return bool(self.store)
+
+    def __contains__(self, post_id):
+        return post_id in self.store
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def insert(self, post):
+        with self.write_lock:
+            self.store.insert(post)
+            self._notify(PostChange("insert", post["id"], None, post))
+        return post
+
+    def insert_many(self, posts):
+        with self.write_lock:
+            self.store.insert_many(posts)
+            for post in posts:
+                self._notify(PostChange("insert", post["id"], None, post))
+        return posts
+
+    def replace(self, post_id, post):
+        with self.write_lock:
+            before = self.store.get(post_id)
+            self.store.replace(post_id, post)
+            self._notify(PostChange("replace", post_id, before, post))
+        return post
+
+    def replace_many(self, posts):
+        with self.write_lock:
+            befores = [self.store.get(post["id"]) for post in posts]
+            found = self.store.replace_many(posts)
+            for post, before, exists in zip(posts, befores, found):
+                if exists:
+                    self._notify(PostChange("replace", post["id"], before, post))
+        return found
+
+    def update(self, post_id, fields, versions=None):
+        """
+        Change only the given fields of a post and return the post.
+
+        Fields that already hold the given value are left out, and a call that
+        changes nothing writes nothing. With versions, the post must still be
+        at one of them, or PreconditionFailed is raised and nothing is written.
+        """
+        with self.write_lock:
+            before = self.store.get(post_id)
+            if before is None:
+                raise KeyError(f"Post with ID {post_id} does not exist")
+            if versions is not None and self.version(post_id) not in versions:
+                raise PreconditionFailed(f"Post with ID {post_id} has changed")
+            changed = changed_fields(before, fields)
+            if not changed:
+                return before
+            post = self.store.update(post_id, changed)
+            self._notify(PostChange("update", post_id, before, post, changed))
+        return post
+
+    def update_where(self, fields, category=None, published=None, generations=None):
+        """
+        Change the given fields of every post matching the filters in one write.
+
+        Posts already holding the values are left alone, and listeners get a
+        single update_where change for the whole write, or none if no post
+        changed. With generations, the table must still be at one of them, or
+        PreconditionFailed is raised. Returns the number of matching posts and
+        the posts that changed.
+        """
+        with self.write_lock:
+            if generations is not None and self.generation not in generations:
+                raise PreconditionFailed("The posts have changed")
+            matched, posts = self.store.update_where(fields, category=category, published=published)
+            if posts:
+                self._notify(PostChange("update_where", None, None, posts, fields, {"category": category, "published": published}))
+        return matched, posts
+
+    def update_all(self, fields):
+        with self.write_lock:
+            updated_posts = self.store.update_all(fields)
+            self._notify(PostChange("update_all", None, None, fields))
+        return updated_posts
+
+    def delete(self, post_id):
+        with self.write_lock:
+            post = self.store.delete(post_id)
+            self._notify(PostChange("delete", post_id, post, None))
+        return post
+
+    def delete_many(self, post_ids):
+        with self.write_lock:
+            befores = [self.store.get(post_id) for post_id in post_ids]
+            found = self.store.delete_many(post_ids)
+            for post_id, before, exists in zip(post_ids, befores, found):
+                if exists:
+                    self._notify(PostChange("delete", post_id, before, None))
+        return found
+
+    def clear(self):
+        with self.write_lock:
+            self.store.clear()
+            self._notify(PostChange("clear", None, None, None))
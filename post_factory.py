@@ -0,0 +1,3 @@
+def make_post(post_id, title="Post", content="Content", category="Fun", published=True):
+    """Build a post dict for the tests; every field but the id has a default."""
+    return {"title": title, "content": content, "category": category, "published": published, "id": post_id}
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from post_record import PostRecord, encode_json
+from post_store import PostStore
+
+try:
+    import orjson
+except ImportError:  # Optional: recovery just parses more slowly without it
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+SNAPSHOT_PATTERN = re.compile(r"snapshot-(\d+)\.ndjson$")
+SEGMENT_PATTERN = re.compile(r"log-(\d+)\.ndjson$")
+
+
+def _snapshot_name(seq):
+    return f"snapshot-{seq:012d}.ndjson"
+
+
+def _segment_name(first_seq):
+    return f"log-{first_seq:012d}.ndjson"
+
+
+def change_entry(change):
+    """Return the log entry (without seq) recording a PostChange."""
+    if change.kind in ("insert", "replace"):
+        return {"op": change.kind, "post": change.after}
+    if change.kind == "update":
+        # Only the changed fields are logged, not the whole post
+        return {"op": "update", "id": change.post_id, "fields": change.fields}
+    if change.kind == "update_where":
+        # One entry for the whole write; replay finds the matching posts again
+        return {"op": "update_where", "fields": change.fields, "where": change.where}
+    if change.kind == "delete":
+        return {"op": "delete", "id": change.post_id}
+    if change.kind == "update_all":
+        return {"op": "update_all", "fields": change.after}
+    return {"op": "clear"}
+
+
+class PostLog:
+    """
+    PostLog: Write-ahead log and snapshots that make the in-memory post store durable.
+
+    Every PostChange is appended to the log as one NDJSON line with a
+    sequence number. A background thread writes the pending lines and fsyncs
+    them as one group every flush_interval seconds, so a burst of writes
+    shares a single fsync. Handlers wait on flushed() before answering, so a
+    write that was acknowledged is on disk.
+
+    Every snapshot_every changes the table is written to a snapshot file, the
+    log moves on to a new segment and the segments the snapshot covers are
+    deleted. The snapshot is pinned at its sequence number under the write
+    lock and written out afterwards without blocking writers. recover() loads
+    the newest snapshot and replays only the entries after its sequence
+    number. Replay is not idempotent: an update_where entry holds filters,
+    not the posts they matched, and is evaluated again against the recovered
+    table. Recovery is therefore only correct because a snapshot holds
+    exactly the table as of its sequence number, no change more or less.
+
+    If a write or fsync fails, whatever part of the group reached the file
+    is cut off again and the group goes back to the head of the buffer, to be
+    retried every retry_interval seconds ahead of later lines, so the log
+    never has a hole. Until a retry succeeds the log is failed: waiting for
+    a flush raises the error, so no write is acknowledged as durable.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 0.005, snapshot_every: int = 100000, retry_interval: float = 0.5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.retry_interval = retry_interval
+        # The OSError of the last failed flush, until a retry succeeds
+        self.failure = None
+        self.seq = 0
+        self.store = None
+        self._synced_seq = 0
+        self._since_snapshot = 0
+        self._snapshotting = False
+        self._snapshot_thread = None
+        self._buffer = []
+        self._waiters = []
+        self._file = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._flusher = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _files(self, pattern):
+        # (sequence number, file name) pairs, oldest first
+        matches = (pattern.match(name) for name in os.listdir(self.directory))
+        return sorted((int(match.group(1)), match.group(0)) for match in matches if match)
+
+    def recover(self):
+        """
+        Load the newest snapshot and replay the log after it.
+
+        Returns the recovered posts sorted by id, or None if the directory
+        holds no snapshot and no log yet.
+        """
+        snapshots = self._files(SNAPSHOT_PATTERN)
+        segments = self._files(SEGMENT_PATTERN)
+        if not snapshots and not segments:
+            return None
+        records = []
+        snapshot_seq = 0
+        if snapshots:
+            snapshot_seq, name = snapshots[-1]
+            with open(self._path(name), "rb") as file:
+                # Snapshot lines always carry every field, in id order
+                records = [PostRecord(**_loads(line)) for line in file]
+        # Replayed into a PostStore, so a filtered update finds its posts through the indexes
+        posts = PostStore.from_sorted(records)
+        self.seq = snapshot_seq
+        for index, (first_seq, name) in enumerate(segments):
+            last_segment = index == len(segments) - 1
+            if not last_segment and segments[index + 1][0] <= snapshot_seq + 1:
+                continue
+            self._replay(name, posts, snapshot_seq, last_segment)
+        self._synced_seq = self.seq
+        return list(posts)
+
+    def _replay(self, name, posts, snapshot_seq, last_segment):
+        with open(self._path(name), "rb+") as file:
+            offset = 0
+            for line in file:
+                try:
+                    entry = _loads(line)
+                except ValueError:
+                    if not last_segment:
+                        raise
+                    # A crash cut the final write short; drop the partial line
+                    file.truncate(offset)
+                    return
+                offset += len(line)
+                if entry["seq"] <= snapshot_seq:
+                    continue
+                self.seq = entry["seq"]
+                operation = entry["op"]
+                if operation in ("insert", "replace"):
+                    post = entry["post"]
+                    if post["id"] in posts:
+                        posts.replace(post["id"], post)
+                    else:
+                        posts.insert(post)
+                elif operation == "update":
+                    if entry["id"] in posts:
+                        posts.update(entry["id"], entry["fields"])
+                elif operation == "update_where":
+                    posts.update_where(entry["fields"], **entry["where"])
+                elif operation == "delete":
+                    if entry["id"] in posts:
+                        posts.delete(entry["id"])
+                elif operation == "update_all":
+                    posts.update_all(entry["fields"])
+                elif operation == "clear":
+                    posts.clear()
+
+    def start(self, store):
+        """Begin logging the writes of store (an ObservedPostStore) from the current sequence number."""
+        self.store = store
+        self._file = self._open_segment(self.seq + 1)
+        store.add_listener(self.append)
+        self._flusher = threading.Thread(target=self._flush_loop, name="post-log", daemon=True)
+        self._flusher.start()
+
+    def append(self, change):
+        """PostChange listener; runs under the store's write lock, so sequence numbers follow write order."""
+        entry = change_entry(change)
+        with self._condition:
+            self.seq += 1
+            self._buffer.append(encode_json({"seq": self.seq, **entry}) + b"\n")
+            self._since_snapshot += 1
+            if self._since_snapshot >= self.snapshot_every and not self._snapshotting:
+                self._snapshotting = True
+                self._snapshot_thread = threading.Thread(target=self.snapshot, name="post-snapshot", daemon=True)
+                self._snapshot_thread.start()
+            self._condition.notify()
+
+    def flushed(self):
+        """Return a Future that completes once every change logged so far is on disk."""
+        future = Future()
+        with self._condition:
+            if self.failure is not None:
+                future.set_exception(self.failure)
+            elif self._synced_seq >= self.seq:
+                future.set_result(self._synced_seq)
+            else:
+                self._waiters.append((self.seq, future))
+        return future
+
+    async def wait_flushed(self):
+        await asyncio.wrap_future(self.flushed())
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._buffer and not self._closed:
+                    self._condition.wait()
+                if self._closed and not self._buffer:
+                    return
+            # Let concurrent writes join this group before paying for the fsync
+            if self.flush_interval and self.failure is None:
+                time.sleep(self.flush_interval)
+            with self._condition:
+                lines, self._buffer = self._buffer, []
+                seq = self.seq
+            unsynced, error = self._write(lines)
+            with self._condition:
+                # Waiters that came in during the write may be covered by it too
+                waiters = [future for wanted, future in self._waiters if wanted <= seq]
+                self._waiters = [(wanted, future) for wanted, future in self._waiters if wanted > seq]
+            if error is not None:
+                with self._condition:
+                    # Retried ahead of anything logged since, so the log stays in sequence order
+                    self._buffer[:0] = unsynced
+                    self.failure = error
+                for waiter in waiters:
+                    waiter.set_exception(error)
+                with self._condition:
+                    if self._closed:
+                        return
+                    self._condition.wait(self.retry_interval)
+                continue
+            with self._condition:
+                self._synced_seq = seq
+                self.failure = None
+            for waiter in waiters:
+                waiter.set_result(seq)
+
+    def _open_segment(self, first_seq):
+        # Unbuffered, so lines that failed to reach the file are not written later by a buffer flush
+        return open(self._path(_segment_name(first_seq)), "ab", buffering=0)
+
+    def _write(self, lines):
+        """Write lines and fsync them; return (lines not on disk, error), or ([], None) when all are."""
+        synced = 0
+        start = self._file.tell()
+        chunk = []
+        try:
+            for index, line in enumerate(lines):
+                if isinstance(line, int):
+                    # Segment switch queued by snapshot(): later lines go to a new file
+                    if not self._file.closed:
+                        self._write_chunk(chunk)
+                        self._file.close()
+                    synced = index
+                    self._file = self._open_segment(line)
+                    synced = index + 1
+                    start = self._file.tell()
+                else:
+                    chunk.append(line)
+            self._write_chunk(chunk)
+        except OSError as error:
+            if not self._file.closed:
+                try:
+                    os.ftruncate(self._file.fileno(), start)
+                    self._file.seek(start)
+                except OSError:
+                    pass
+            return lines[synced:], error
+        return [], None
+
+    def _write_chunk(self, chunk):
+        data = memoryview(b"".join(chunk))
+        while data:
+            data = data[self._file.write(data):]
+        os.fsync(self._file.fileno())
+        chunk.clear()
+
+    def snapshot(self):
+        """Write the current table to a new snapshot file and drop the log it makes redundant."""
+        try:
+            with self.store.write_lock:
+                with self._condition:
+                    seq = self.seq
+                    self._since_snapshot = 0
+                    self._buffer.append(seq + 1)
+                    self._condition.notify()
+                table = self.store.snapshot()
+            with table:
+                self.write_snapshot(table, seq)
+        finally:
+            self._snapshotting = False
+
+    def write_snapshot(self, posts, seq):
+        temporary = self._path(_snapshot_name(seq) + ".tmp")
+        with open(temporary, "wb") as file:
+            for post in posts:
+                file.write(PostRecord.from_post(post).json_bytes() + b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._path(_snapshot_name(seq)))
+        self._sync_directory()
+        for old_seq, name in self._files(SNAPSHOT_PATTERN):
+            if old_seq < seq:
+                os.remove(self._path(name))
+        # A segment is covered once the segment after it starts at or before seq + 1
+        segments = self._files(SEGMENT_PATTERN)
+        for (first_seq, name), (next_seq, _) in zip(segments, segments[1:]):
+            if next_seq <= seq + 1:
+                os.remove(self._path(name))
+
+    def _sync_directory(self):
+        descriptor = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    def close(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,588 @@
+import threading
+import weakref
+from bisect import bisect_right, insort
+from heapq import merge
+from itertools import islice
+
+from post_record import PostRecord
+
+# Posts with a kept version before the history is first pruned of versions no snapshot needs
+HISTORY_PRUNE_MIN = 1024
+# Posts a multi-post write changes per hold of the table lock
+WRITE_BATCH_SIZE = 1000
+
+
+class OrderedIdSet:
+    """
+    OrderedIdSet: Post ids kept sorted, with lazy deletion.
+
+    Ids are held in a sorted list. The allocator hands out increasing ids, so
+    adding one is normally an append. Removing an id only marks it as a
+    tombstone; tombstones are skipped on reads and compacted away once they
+    outnumber the live ids. Callers only add ids that are not live yet and
+    only remove ids that are.
+    """
+
+    def __init__(self, ids=()):
+        self._ids = sorted(ids)
+        self._tombstones = set()
+
+    def __len__(self):
+        return len(self._ids) - len(self._tombstones)
+
+    def __iter__(self):
+        tombstones = self._tombstones
+        for post_id in self._ids:
+            if post_id not in tombstones:
+                yield post_id
+
+    def add(self, post_id):
+        if post_id in self._tombstones:
+            # Still sitting in its sorted slot, just bring it back to life
+            self._tombstones.discard(post_id)
+            return
+        ids = self._ids
+        if not ids or post_id > ids[-1]:
+            ids.append(post_id)
+        else:
+            insort(ids, post_id)
+
+    def discard(self, post_id):
+        self._tombstones.add(post_id)
+        if 2 * len(self._tombstones) > len(self._ids):
+            self._compact()
+
+    def clear(self):
+        self._ids = []
+        self._tombstones = set()
+
+    def last(self, keep=None):
+        # Reads never modify the set, so they are safe next to a concurrent writer
+        ids = self._ids
+        tombstones = self._tombstones
+        for index in range(len(ids) - 1, -1, -1):
+            if ids[index] not in tombstones and (keep is None or keep(ids[index])):
+                return ids[index]
+        return None
+
+    def iter_after(self, post_id=None):
+        """Yield the live ids greater than post_id (all ids if None) in order."""
+        ids = self._ids
+        tombstones = self._tombstones
+        for index in range(0 if post_id is None else bisect_right(ids, post_id), len(ids)):
+            if ids[index] not in tombstones:
+                yield ids[index]
+
+    def page(self, offset, limit, keep=None):
+        """Return up to limit live ids after skipping offset of them, optionally only those keep() accepts."""
+        if keep is None and not self._tombstones:
+            return self._ids[offset:offset + limit]
+        ids = iter(self) if keep is None else filter(keep, self)
+        return list(islice(ids, offset, offset + limit))
+
+    def page_after(self, post_id, limit, keep=None):
+        """Return up to limit live ids greater than post_id (all ids if None), optionally only those keep() accepts."""
+        ids = self._ids
+        tombstones = self._tombstones
+        page = []
+        for index in range(0 if post_id is None else bisect_right(ids, post_id), len(ids)):
+            candidate = ids[index]
+            if candidate in tombstones or (keep is not None and not keep(candidate)):
+                continue
+            page.append(candidate)
+            if len(page) == limit:
+                break
+        return page
+
+    def _compact(self):
+        tombstones = self._tombstones
+        self._ids = [post_id for post_id in self._ids if post_id not in tombstones]
+        self._tombstones = set()
+
+
+class PostTable:
+    """
+    PostTable: One version of the post table.
+
+    Posts are held in a hash index keyed by id, so lookup, update and delete
+    are O(1). Next to it an OrderedIdSet of all ids drives pagination and the
+    latest post. Posts are listed by id, which is creation order because the
+    id allocator hands out increasing ids, and keyset reads (page_after)
+    binary search straight to their starting point.
+
+    Secondary indexes map each category, and each value of the published
+    flag, to an OrderedIdSet, so filtered pages are read from the matching
+    set instead of scanning the table.
+
+    Posts are stored as compact, read-only PostRecords: a write stores a new
+    record, so a reader always sees a post either entirely before or entirely
+    after a write.
+
+    Every in-place write holds the table lock for that one post and moves the
+    write clock on. While TableSnapshots are pinned to the table, each write
+    also keeps the post it overwrites in the history, tagged with the write's
+    clock, which is what lets the snapshots go on reading the table as it was
+    when they were taken. A write to many posts (_replace_many) moves the
+    clock on once and takes the lock batch by batch; it keeps the history
+    even without pins, and snapshots taken while it runs are pinned just
+    before it, so they see all of it or none.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.order = OrderedIdSet()
+        self.by_category = {}
+        self.by_published = {True: OrderedIdSet(), False: OrderedIdSet()}
+        self.lock = threading.Lock()
+        self.clock = 0
+        # Post id -> [(clock of a write, the post before it)], oldest first
+        self.history = {}
+        self._history_limit = HISTORY_PRUNE_MIN
+        # Clock -> number of snapshots pinned at it; released from finalizers, so reentrant
+        self._pins = {}
+        self._pins_lock = threading.RLock()
+        # Clock of the multi-post write under way, if any
+        self._batch_clock = None
+
+    @classmethod
+    def from_sorted(cls, posts):
+        """Build a table in one pass from posts already sorted by id."""
+        table = cls()
+        table.records = {post["id"]: post for post in posts}
+        table.order = OrderedIdSet(table.records)
+        by_category = {}
+        by_published = {True: [], False: []}
+        for post in posts:
+            by_category.setdefault(post.get("category"), []).append(post["id"])
+            by_published[bool(post.get("published", True))].append(post["id"])
+        table.by_category = {category: OrderedIdSet(ids) for category, ids in by_category.items()}
+        table.by_published = {published: OrderedIdSet(ids) for published, ids in by_published.items()}
+        return table
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, post_id):
+        return post_id in self.records
+
+    def __iter__(self):
+        records = self.records
+        for post_id in self.order:
+            # The post may be deleted while a slow consumer is iterating
+            post = records.get(post_id)
+            if post is not None:
+                yield post
+
+    def get(self, post_id):
+        return self.records.get(post_id)
+
+    def latest(self):
+        post_id = self.order.last()
+        return None if post_id is None else self.records.get(post_id)
+
+    def page(self, offset, limit, category=None, published=None):
+        ids, keep = self._select(category, published)
+        return self._posts(ids.page(offset, limit, keep))
+
+    def page_after(self, post_id, limit, category=None, published=None):
+        """Return up to limit posts that come after post_id in listing order, or from the start if post_id is None."""
+        ids, keep = self._select(category, published)
+        return self._posts(ids.page_after(post_id, limit, keep))
+
+    def _posts(self, post_ids):
+        records = self.records
+        posts = [records.get(post_id) for post_id in post_ids]
+        return [post for post in posts if post is not None]
+
+    def _select(self, category, published):
+        # Pick the id set to walk for the given filters, plus a check for the other filter if both are set
+        if category is None and published is None:
+            return self.order, None
+        if published is None:
+            return self.by_category.get(category, OrderedIdSet()), None
+        if category is None:
+            return self.by_published[published], None
+        by_category = self.by_category.get(category, OrderedIdSet())
+        by_published = self.by_published[published]
+        records = self.records
+        # A writer on another thread may delete the post between reading its id and its record
+        if len(by_category) <= len(by_published):
+            return by_category, lambda post_id: records.get(post_id, {}).get("published", True) == published
+        return by_published, lambda post_id: records.get(post_id, {}).get("category") == category
+
+    def _pin(self):
+        """Register a snapshot at the current clock, or just before a multi-post write under way, and return the clock."""
+        with self.lock, self._pins_lock:
+            clock = self.clock if self._batch_clock is None else self._batch_clock - 1
+            self._pins[clock] = self._pins.get(clock, 0) + 1
+            return clock
+
+    def _unpin(self, clock):
+        with self._pins_lock:
+            count = self._pins.pop(clock) - 1
+            if count:
+                self._pins[clock] = count
+
+    def _remember(self, post_id):
+        # Called with the lock held, before the post is written
+        self.clock += 1
+        if self._pins:
+            self.history.setdefault(post_id, []).append((self.clock, self.records.get(post_id)))
+            if len(self.history) > self._history_limit:
+                self._prune()
+        elif self.history:
+            self.history = {}
+
+    def _prune(self):
+        # Drop the versions every pinned snapshot is already past
+        with self._pins_lock:
+            oldest = min(self._pins, default=self.clock)
+        history = {}
+        for post_id, versions in self.history.items():
+            kept = [version for version in versions if version[0] > oldest]
+            if kept:
+                history[post_id] = kept
+        self.history = history
+        self._history_limit = max(HISTORY_PRUNE_MIN, 2 * len(history))
+
+    def _insert(self, post):
+        with self.lock:
+            self._remember(post["id"])
+            self.records[post["id"]] = post
+            self.order.add(post["id"])
+            self._index(post)
+
+    def _replace(self, previous, post):
+        with self.lock:
+            self._remember(post["id"])
+            self._store(previous, post)
+
+    def _replace_many(self, pairs):
+        """Replace every (previous, post) pair as one write."""
+        with self.lock:
+            self.clock += 1
+            self._batch_clock = clock = self.clock
+        try:
+            history = self.history
+            for start in range(0, len(pairs), WRITE_BATCH_SIZE):
+                with self.lock:
+                    for previous, post in pairs[start:start + WRITE_BATCH_SIZE]:
+                        history.setdefault(post["id"], []).append((clock, previous))
+                        self._store(previous, post)
+        finally:
+            with self.lock:
+                self._batch_clock = None
+
+    def _store(self, previous, post):
+        self.records[post["id"]] = post
+        if previous.get("category") != post.get("category") or previous.get("published", True) != post.get("published", True):
+            self._unindex(previous)
+            self._index(post)
+
+    def _delete(self, post_id):
+        with self.lock:
+            post = self.records[post_id]
+            self._remember(post_id)
+            del self.records[post_id]
+            self.order.discard(post_id)
+            self._unindex(post)
+        return post
+
+    def _index(self, post):
+        category = post.get("category")
+        ids = self.by_category.get(category)
+        if ids is None:
+            ids = self.by_category[category] = OrderedIdSet()
+        ids.add(post["id"])
+        self.by_published[bool(post.get("published", True))].add(post["id"])
+
+    def _unindex(self, post):
+        category = post.get("category")
+        ids = self.by_category[category]
+        ids.discard(post["id"])
+        if not ids:
+            del self.by_category[category]
+        self.by_published[bool(post.get("published", True))].discard(post["id"])
+
+
+def matches(post, category=None, published=None):
+    """Return whether post passes the category and published filters (None for no filter)."""
+    return (category is None or post.get("category") == category) and (published is None or post.get("published", True) == published)
+
+
+class TableSnapshot:
+    """
+    TableSnapshot: A PostTable as it was when the snapshot was taken.
+
+    Taking a snapshot pins the table's write clock, and from then on the
+    table keeps the version of every post it overwrites. A post written since
+    the pin is read from its oldest version newer than the pin, any other
+    post from the live table. Listings walk the live id sets, skipping the
+    written posts, and merge back in the written posts that matched at the
+    pin: posts inserted later never show up, and posts deleted or moved to
+    another category later still do. Until the first write after the pin,
+    reads go straight to the live table.
+
+    Each read holds the table lock, which writes only take for one post at a
+    time, so a writer on another thread never tears it. The pin is released
+    when the with block exits, or when the snapshot is garbage collected.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.clock = table._pin()
+        self._release = weakref.finalize(self, table._unpin, self.clock)
+        self._changes_clock = None
+        self._changes = None
+        self._changed_ids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._release()
+
+    def __len__(self):
+        return self._read(self._len)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __contains__(self, post_id):
+        return self.get(post_id) is not None
+
+    def __iter__(self):
+        # Batched, so no single read holds writers off for long
+        after_id = None
+        while True:
+            batch = self.page_after(after_id, 1000)
+            if not batch:
+                return
+            yield from batch
+            after_id = batch[-1]["id"]
+
+    def get(self, post_id):
+        return self._read(self._get, post_id)
+
+    def latest(self):
+        return self._read(self._latest)
+
+    def page(self, offset, limit, category=None, published=None):
+        return self._read(self._page, offset, limit, category, published)
+
+    def page_after(self, post_id, limit, category=None, published=None):
+        """Return up to limit posts that come after post_id in listing order, or from the start if post_id is None."""
+        return self._read(self._page_after, post_id, limit, category, published)
+
+    def _read(self, read, *args):
+        table = self.table
+        with table.lock:
+            return read(table.clock, *args)
+
+    def _changed(self, clock):
+        """Return the posts written since the pin, as they were at the pin (None if absent), and the sorted ids of those present."""
+        # A multi-post write adds versions batch by batch without moving the clock on
+        if self._changes_clock != clock or self.table._batch_clock is not None:
+            pinned = self.clock
+            changes = {}
+            for post_id, versions in self.table.history.items():
+                for written, post in versions:
+                    if written > pinned:
+                        changes[post_id] = post
+                        break
+            self._changes = changes
+            self._changed_ids = sorted(post_id for post_id, post in changes.items() if post is not None)
+            self._changes_clock = clock
+        return self._changes, self._changed_ids
+
+    def _len(self, clock):
+        table = self.table
+        if clock == self.clock:
+            return len(table)
+        changes, changed_ids = self._changed(clock)
+        records = table.records
+        return len(records) - sum(1 for post_id in changes if post_id in records) + len(changed_ids)
+
+    def _get(self, clock, post_id):
+        table = self.table
+        if clock != self.clock:
+            for written, post in table.history.get(post_id, ()):
+                if written > self.clock:
+                    return post
+        return table.records.get(post_id)
+
+    def _latest(self, clock):
+        table = self.table
+        if clock == self.clock:
+            return table.latest()
+        changes, changed_ids = self._changed(clock)
+        post_id = table.order.last(keep=lambda post_id: post_id not in changes)
+        if changed_ids and (post_id is None or changed_ids[-1] > post_id):
+            return changes[changed_ids[-1]]
+        return None if post_id is None else table.records[post_id]
+
+    def _page(self, clock, offset, limit, category, published):
+        if clock == self.clock:
+            return self.table.page(offset, limit, category=category, published=published)
+        return self._posts(clock, islice(self._ids(clock, None, category, published), offset, offset + limit))
+
+    def _page_after(self, clock, post_id, limit, category, published):
+        if clock == self.clock:
+            return self.table.page_after(post_id, limit, category=category, published=published)
+        return self._posts(clock, islice(self._ids(clock, post_id, category, published), limit))
+
+    def _ids(self, clock, after_id, category, published):
+        # Unchanged ids from the live sets, merged with the written posts that matched at the pin
+        changes, changed_ids = self._changed(clock)
+        ids, keep = self.table._select(category, published)
+        live = (post_id for post_id in ids.iter_after(after_id) if post_id not in changes and (keep is None or keep(post_id)))
+        start = 0 if after_id is None else bisect_right(changed_ids, after_id)
+        pinned = (changed_ids[index] for index in range(start, len(changed_ids)) if matches(changes[changed_ids[index]], category, published))
+        return merge(live, pinned)
+
+    def _posts(self, clock, post_ids):
+        changes, _ = self._changed(clock)
+        records = self.table.records
+        return [changes[post_id] if post_id in changes else records[post_id] for post_id in post_ids]
+
+
+class PostStore:
+    """
+    PostStore: In-memory table of LinkedIn posts with copy-on-write versions.
+
+    The current PostTable is published through a single reference. Writes to
+    one post store a new PostRecord in the current table, and update_where
+    stores new records for just the posts it changes, found through the
+    secondary indexes. Writes to every post (update_all, clear) build a
+    complete new table to the side and swap it in with one assignment, so
+    they never block readers or expose a half-applied update. Readers that
+    took a TableSnapshot with snapshot() keep reading the table as it was,
+    unchanged by any later write, update_where included, for as long as they
+    hold it.
+    """
+
+    def __init__(self, posts=()):
+        self._table = PostTable()
+        for post in posts:
+            self.insert(post)
+
+    @classmethod
+    def from_sorted(cls, posts):
+        """Build a store in one pass from PostRecords already sorted by id, as recovery does."""
+        store = cls()
+        store._table = PostTable.from_sorted(posts)
+        return store
+
+    def snapshot(self):
+        """Pin the current table for a consistent series of reads; use it as a context manager or close() it."""
+        return TableSnapshot(self._table)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, post_id):
+        return post_id in self._table
+
+    def __iter__(self):
+        return iter(self._table)
+
+    def get(self, post_id):
+        return self._table.get(post_id)
+
+    def latest(self):
+        return self._table.latest()
+
+    def page(self, offset, limit, category=None, published=None):
+        return self._table.page(offset, limit, category=category, published=published)
+
+    def page_after(self, post_id, limit, category=None, published=None):
+        """Return up to limit posts that come after post_id in listing order, or from the start if post_id is None."""
+        return self._table.page_after(post_id, limit, category=category, published=published)
+
+    def insert(self, post):
+        table = self._table
+        if post["id"] in table.records:
+            raise KeyError(f"Post with ID {post['id']} already exists")
+        table._insert(PostRecord.from_post(post))
+        return post
+
+    def insert_many(self, posts):
+        table = self._table
+        duplicates = [post["id"] for post in posts if post["id"] in table.records]
+        if duplicates:
+            raise KeyError(f"Posts with IDs {duplicates} already exist")
+        for post in posts:
+            table._insert(PostRecord.from_post(post))
+        return posts
+
+    def replace(self, post_id, post):
+        table = self._table
+        previous = table.records.get(post_id)
+        if previous is None:
+            raise KeyError(f"Post with ID {post_id} does not exist")
+        table._replace(previous, PostRecord.from_post(post))
+        return post
+
+    def replace_many(self, posts):
+        """Replace every post whose id exists and return, per post, whether it was found."""
+        found = []
+        for post in posts:
+            exists = post["id"] in self._table.records
+            if exists:
+                self.replace(post["id"], post)
+            found.append(exists)
+        return found
+
+    def update(self, post_id, fields):
+        """Change only the given fields of a post and return the new record."""
+        table = self._table
+        previous = table.records.get(post_id)
+        if previous is None:
+            raise KeyError(f"Post with ID {post_id} does not exist")
+        post = previous.replace(fields)
+        # Indexes are only touched when category or published changed
+        table._replace(previous, post)
+        return post
+
+    def update_where(self, fields, category=None, published=None):
+        """Change the given fields of every post matching the filters; return the number matched and the posts that changed."""
+        table = self._table
+        ids, keep = table._select(category, published)
+        matched = ids.page(0, len(ids), keep)
+        records = table.records
+        pairs = []
+        for post_id in matched:
+            previous = records[post_id]
+            if any(previous.get(name) != value for name, value in fields.items()):
+                pairs.append((previous, previous.replace(fields)))
+        # Only the changed posts and their index entries are written, as one write
+        if pairs:
+            table._replace_many(pairs)
+        return len(matched), [post for _, post in pairs]
+
+    def update_all(self, fields):
+        # Build the updated version to the side, then publish it in one step
+        table = PostTable.from_sorted([post.replace(fields) for post in self._table])
+        self._table = table
+        return list(table)
+
+    def delete(self, post_id):
+        return self._table._delete(post_id)
+
+    def delete_many(self, post_ids):
+        """Delete every post whose id exists and return, per id, whether it was found."""
+        table = self._table
+        found = []
+        for post_id in post_ids:
+            exists = post_id in table.records
+            if exists:
+                table._delete(post_id)
+            found.append(exists)
+        return found
+
+    def clear(self):
+        self._table = PostTable()
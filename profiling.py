@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from metrics import request_phases
+
+slow_request_log = logging.getLogger("slow_requests")
+
+
+class SamplingProfiler:
+    """
+    SamplingProfiler: Wall-clock stack sampler for all threads of the process.
+
+    While running, a background thread snapshots every other thread's Python
+    stack each interval and counts identical stacks. Stacks are reported in
+    the collapsed format ("thread;file:function;... count") read by
+    flamegraph.pl and speedscope. Nothing runs and nothing is recorded while
+    the profiler is stopped.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval: float = None):
+        with self._lock:
+            if self._thread is not None:
+                return False
+            if interval:
+                self.interval = interval
+            self._stacks = Counter()
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return False
+        self._stop.set()
+        thread.join()
+        return True
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self._stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+
+    def _collapse(self, thread_name, frame):
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def collapsed(self):
+        """Return the recorded stacks in collapsed format, most frequent first."""
+        stacks = list(self._stacks.items())
+        stacks.sort(key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+class SlowRequestMiddleware:
+    """
+    SlowRequestMiddleware: ASGI middleware capturing requests slower than a threshold.
+
+    For every request over threshold seconds it records the route, method,
+    path and query parameters, status code, store size and the time spent in
+    each named phase, keeps the most recent records for the admin endpoint
+    and logs them as JSON to the "slow_requests" logger. With no threshold
+    the request passes straight through.
+    """
+
+    def __init__(self, app, threshold: float = None, store_size=None, recent: deque = None):
+        self.app = app
+        self.threshold = threshold
+        self.store_size = store_size
+        self.recent = deque(maxlen=100) if recent is None else recent
+
+    async def __call__(self, scope, receive, send):
+        if self.threshold is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        phases = {}
+        token = request_phases.set(phases)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_phases.reset(token)
+            if elapsed >= self.threshold:
+                self._record(scope, status_code, elapsed, phases)
+
+    def _record(self, scope, status_code, elapsed, phases):
+        route = scope.get("route")
+        record = {
+            "time": time.time(),
+            "method": scope["method"],
+            "route": getattr(route, "path", "<unmatched>"),
+            "path": scope["path"],
+            "path_params": {key: str(value) for key, value in scope.get("path_params", {}).items()},
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "status": status_code,
+            "duration_ms": round(elapsed * 1000, 3),
+            "store_size": self.store_size() if self.store_size else None,
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+        }
+        self.recent.append(record)
+        slow_request_log.warning(json.dumps(record))
@@ -0,0 +1,149 @@
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from fastapi import HTTPException, Request, status
+
+from metrics import registry
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+SELECT_BUCKET = "SELECT tokens, updated FROM rate_buckets WHERE key = ?"
+UPSERT_BUCKET = "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated"
+
+
+def parse_limit(value: str):
+    """Parse "<requests>/<seconds>" into (capacity, refill per second)."""
+    requests, seconds = value.split("/")
+    requests, seconds = int(requests), float(seconds)
+    if requests < 1 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit: {value}")
+    return requests, requests / seconds
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    """Return (tokens left after taking one, seconds to wait if none was left)."""
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryTokenBuckets:
+    """
+    MemoryTokenBuckets: Token buckets kept in process memory.
+
+    Each key holds (tokens, last refill time). Buckets are kept in LRU order
+    and the least recently used is dropped past maxsize, so one flood of new
+    client IPs cannot grow the table without bound. A dropped bucket simply
+    starts full again.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """Take one token from key's bucket; return 0 on success or the seconds until a token is available."""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, wait = _refill(tokens, updated, capacity, rate, now)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteTokenBuckets:
+    """
+    SQLiteTokenBuckets: Token buckets in a SQLite file shared by every worker on the host.
+
+    Each take is one read and one upsert inside BEGIN IMMEDIATE, so workers
+    never both spend the same token. Stands in for a shared store such as
+    Redis with the same bucket arithmetic.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connection().execute(SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, rate, now):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(SELECT_BUCKET, (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, wait = _refill(tokens, updated, capacity, rate, now)
+            connection.execute(UPSERT_BUCKET, (key, tokens, now))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return wait
+
+
+class RateLimiter:
+    """
+    RateLimiter: Per-route token-bucket limits keyed by client IP and JWT userID.
+
+    Routes are grouped (auth, read, write, bulk) and every group has its own
+    "<requests>/<seconds>" limit: a bucket holds up to <requests> tokens and
+    refills at <requests>/<seconds> tokens per second. A request spends one
+    token from its client IP's bucket and, once authenticated, one from its
+    user's bucket; if either is empty it is answered 429 with Retry-After.
+    limit(group) returns the FastAPI dependency to list after jwtBearer, so
+    rejected requests never reach body validation or the store.
+    """
+
+    def __init__(self, buckets, limits: dict, enabled: bool = True, executor=None, clock=time.time):
+        self.buckets = buckets
+        self.limits = {group: parse_limit(value) for group, value in limits.items()}
+        self.enabled = enabled
+        # Set for buckets that block on I/O, like AsyncPostStore
+        self.executor = executor
+        # Wall clock, since buckets shared by several processes must agree on the time
+        self.clock = clock
+        self.rejected = 0
+
+    def limit(self, group: str):
+        if group not in self.limits:
+            raise KeyError(f"No rate limit configured for {group}")
+
+        async def check_rate_limit(request: Request):
+            if not self.enabled:
+                return
+            capacity, rate = self.limits[group]
+            keys = [f"{group}:ip:{request.client.host if request.client else 'unknown'}"]
+            payload = getattr(request.state, "jwt_payload", None)
+            if payload:
+                keys.append(f"{group}:user:{payload.get('userID')}")
+            wait = max([await self._take(key, capacity, rate) for key in keys])
+            if wait > 0:
+                self.rejected += 1
+                registry.add("rate_limited_total", (("group", group),))
+                raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests. Try again later.", headers={"Retry-After": str(math.ceil(wait))})
+
+        return check_rate_limit
+
+    async def _take(self, key, capacity, rate):
+        now = self.clock()
+        if self.executor is None:
+            return self.buckets.take(key, capacity, rate, now)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(self.buckets.take, key, capacity, rate, now))
@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi import Request, Response, status
+
+from metrics import registry
+from post_record import encode_json
+from single_flight import SingleFlight
+
+
+class ResponseCache:
+    """
+    ResponseCache: Encoded JSON bodies of read endpoints, validated by strong ETags.
+
+    Each entry is keyed by endpoint and query and carries the ETag it was
+    built for. An entry is served only while its ETag is still the current
+    one, and the PostChange listener drops entries the moment a write makes
+    them stale: a write to one post drops that post's entries plus the
+    entries that depend on the whole table (listings, latest), while
+    update_all and clear drop everything. No TTLs are involved.
+
+    Async misses for the same key and ETag that overlap in time share one
+    build and one encoding through a SingleFlight, even with caching off.
+    """
+
+    def __init__(self, store, maxsize: int = 1024, enabled: bool = True, coalesce: bool = True):
+        self.store = store
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.single_flight = SingleFlight(enabled=coalesce)
+        # Distinguishes ETags issued by this process from those of an earlier run
+        self.epoch = os.urandom(4).hex()
+        self._entries = OrderedDict()
+        self._post_keys = {}
+        self._table_keys = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def table_etag(self):
+        return f'"{self.epoch}-g{self.store.generation}"'
+
+    def post_etag(self, post_id):
+        return f'"{self.epoch}-p{post_id}-v{self.store.version(post_id)}"'
+
+    def if_match_versions(self, request: Request, post_id=None):
+        """
+        Return the versions an If-Match precondition accepts, for a write to post_id or, without it, to every post.
+
+        None means there is no precondition (no If-Match, or "*"). Otherwise
+        the set holds the post versions (table generations without post_id)
+        named by strong ETags this process issued for the same resource; it is
+        empty when none of the tags is one, so the write must fail.
+        """
+        value = request.headers.get("if-match")
+        if value is None:
+            return None
+        tags = [tag.strip() for tag in value.split(",")]
+        if "*" in tags:
+            return None
+        prefix = f'"{self.epoch}-g' if post_id is None else f'"{self.epoch}-p{post_id}-v'
+        versions = set()
+        for tag in tags:
+            version = tag[len(prefix):-1]
+            if tag.startswith(prefix) and tag.endswith('"') and version.isdigit():
+                versions.add(int(version))
+        return versions
+
+    async def respond_async(self, request: Request, key, etag: str, build, post_id=None):
+        """
+        Answer a read with the JSON body built by the coroutine function build() and an ETag.
+
+        Returns 304 when the client's If-None-Match already holds etag, the
+        cached body when one was built for etag, and otherwise awaits build(),
+        which may raise HTTPException, and caches its encoded result. post_id
+        ties the entry to one post; without it the entry depends on the table.
+        """
+        response = self._lookup(request, key, etag)
+        if response is None:
+            # The ETag carries the store generation, so joined builds are never older than the request
+            body = await self.single_flight.run((key, etag), lambda: self._build_body_async(key, etag, build, post_id), label=key[0])
+            response = Response(content=body, media_type="application/json", headers={"ETag": etag})
+        return response
+
+    def _lookup(self, request, key, etag):
+        headers = {"ETag": etag}
+        if not self.enabled:
+            return None
+        client_tags = _parse_if_none_match(request.headers.get("if-none-match"))
+        if etag in client_tags or "*" in client_tags:
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == etag:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return Response(content=entry[1], media_type="application/json", headers=headers)
+            self.misses += 1
+        return None
+
+    async def _build_body_async(self, key, etag, build, post_id):
+        return self._encode(key, etag, await build(), post_id)
+
+    def _encode(self, key, etag, content, post_id):
+        with registry.phase("encode"):
+            body = encode_json(content)
+        if self.enabled:
+            self._put(key, etag, body, post_id)
+        return body
+
+    def _put(self, key, etag, body, post_id):
+        with self._lock:
+            self._entries[key] = (etag, body, post_id)
+            self._entries.move_to_end(key)
+            if post_id is None:
+                self._table_keys.add(key)
+            else:
+                self._post_keys.setdefault(post_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, (_, _, old_post_id) = self._entries.popitem(last=False)
+                self._forget(old_key, old_post_id)
+
+    def _forget(self, key, post_id):
+        if post_id is None:
+            self._table_keys.discard(key)
+            return
+        keys = self._post_keys.get(post_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._post_keys[post_id]
+
+    def apply(self, change):
+        """PostChange listener dropping the entries a write made stale."""
+        with self._lock:
+            if change.post_id is None:
+                self._entries.clear()
+                self._post_keys.clear()
+                self._table_keys.clear()
+                return
+            for key in self._post_keys.pop(change.post_id, ()):
+                self._entries.pop(key, None)
+            for key in self._table_keys:
+                self._entries.pop(key, None)
+            self._table_keys.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified, **self.single_flight.stats()}
+
+
+def _parse_if_none_match(value):
+    if not value:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in value.split(",")}
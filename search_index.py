@@ -0,0 +1,236 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from operator import itemgetter
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Query words, each optionally followed by * for prefix matching
+QUERY_PATTERN = re.compile(r"(\w+)(\*?)")
+# Caps how many vocabulary terms a single prefix query may expand to
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def tokenize(text: str):
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def _same_text(before, after):
+    return before.get("title") == after.get("title") and before.get("content") == after.get("content")
+
+
+class SearchIndex:
+    """
+    SearchIndex: In-process inverted index over post titles and contents.
+
+    Results are ranked with Okapi BM25, and a sorted vocabulary supports
+    prefix queries ("surf*"). The index is maintained incrementally from the
+    post store's PostChange events, so it never needs a full rebuild after
+    startup.
+
+    A term's BM25 score in a post depends only on the term's frequency in
+    the post and the post's length, so every term maps its posts into
+    buckets keyed by (term frequency, post length). A query sorts each of
+    its terms' buckets by score, which orders the postings by impact for
+    the current collection statistics, and walks them best first. Every post
+    reached is scored in full from its own term counts, and the walk stops
+    once the k-th best score reaches the most any post not reached yet could
+    score (Fagin's threshold algorithm). A query for common terms so scores
+    little more than k posts instead of every posting.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Term -> {(term frequency, post length): set of post ids}
+        self._postings = {}
+        # Term -> number of posts holding it
+        self._doc_freq = {}
+        self._vocabulary = []
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    @staticmethod
+    def _post_terms(post):
+        return Counter(tokenize(post.get("title")) + tokenize(post.get("content")))
+
+    def add(self, post):
+        with self._lock:
+            self._add(post["id"], self._post_terms(post))
+
+    def remove(self, post_id):
+        with self._lock:
+            self._remove(post_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_freq.clear()
+            self._vocabulary.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0
+
+    def rebuild(self, posts):
+        self.clear()
+        for post in posts:
+            self.add(post)
+
+    def apply(self, change):
+        """PostChange listener keeping the index in step with the post store."""
+        if change.kind == "insert":
+            self.add(change.after)
+        elif change.kind in ("replace", "update"):
+            # Category and published are not indexed, so writes that leave the text alone cost nothing
+            if change.before is not None and _same_text(change.before, change.after):
+                return
+            with self._lock:
+                self._remove(change.post_id)
+                self._add(change.post_id, self._post_terms(change.after))
+        elif change.kind == "update_where":
+            if "title" in change.fields or "content" in change.fields:
+                with self._lock:
+                    for post in change.after:
+                        self._remove(post["id"])
+                        self._add(post["id"], self._post_terms(post))
+        elif change.kind == "delete":
+            self.remove(change.post_id)
+        elif change.kind == "update_all":
+            self._set_all(self._post_terms(change.after))
+        elif change.kind == "clear":
+            self.clear()
+
+    def _add(self, post_id, terms):
+        if post_id in self._doc_terms:
+            self._remove(post_id)
+        length = sum(terms.values())
+        postings = self._postings
+        doc_freq = self._doc_freq
+        for term, frequency in terms.items():
+            try:
+                buckets = postings[term]
+                doc_freq[term] += 1
+            except KeyError:
+                buckets = postings[term] = {}
+                doc_freq[term] = 1
+                insort(self._vocabulary, term)
+            key = (frequency, length)
+            try:
+                buckets[key].add(post_id)
+            except KeyError:
+                buckets[key] = {post_id}
+        self._doc_terms[post_id] = terms
+        self._doc_lengths[post_id] = length
+        self._total_length += length
+
+    def _remove(self, post_id):
+        terms = self._doc_terms.pop(post_id, None)
+        if terms is None:
+            return
+        length = self._doc_lengths.pop(post_id)
+        for term, frequency in terms.items():
+            buckets = self._postings[term]
+            ids = buckets[(frequency, length)]
+            ids.discard(post_id)
+            if not ids:
+                del buckets[(frequency, length)]
+            self._doc_freq[term] -= 1
+            if not self._doc_freq[term]:
+                del self._postings[term]
+                del self._doc_freq[term]
+                del self._vocabulary[bisect_left(self._vocabulary, term)]
+        self._total_length -= length
+
+    def _set_all(self, terms):
+        # Every post gets the same text, so the postings can be rebuilt in one pass
+        with self._lock:
+            post_ids = list(self._doc_terms)
+            length = sum(terms.values())
+            self._postings = {term: {(frequency, length): set(post_ids)} for term, frequency in terms.items()} if post_ids else {}
+            self._doc_freq = dict.fromkeys(self._postings, len(post_ids))
+            self._vocabulary = sorted(self._postings)
+            self._doc_terms = {post_id: terms for post_id in post_ids}
+            self._doc_lengths = dict.fromkeys(post_ids, length)
+            self._total_length = length * len(post_ids)
+
+    def _expand(self, token):
+        if not token.endswith("*"):
+            return [token] if token in self._postings else []
+        prefix = token[:-1]
+        start = bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: int = 10):
+        """Return up to limit (post id, score) pairs for query, best match first."""
+        tokens = [word + star for word, star in QUERY_PATTERN.findall(query.lower())]
+        if limit <= 0:
+            return []
+        with self._lock:
+            document_count = len(self._doc_terms)
+            if not document_count:
+                return []
+            average_length = self._total_length / document_count or 1.0
+            k1, b = self.k1, self.b
+
+            def impact(frequency, length):
+                return frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+
+            # A term matched by several query words counts once per word
+            occurrences = Counter(term for token in tokens for term in self._expand(token))
+            weights = []
+            streams = []
+            for term, count in occurrences.items():
+                document_frequency = self._doc_freq[term]
+                weight = count * math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                weights.append((term, weight))
+                streams.append(sorted(((weight * impact(frequency, length), ids) for (frequency, length), ids in self._postings[term].items()), key=itemgetter(0), reverse=True))
+            if not streams:
+                return []
+            doc_terms = self._doc_terms
+            doc_lengths = self._doc_lengths
+            # Per term: the score of the bucket being walked, which bounds every post the walk has not reached
+            bounds = [buckets[0][0] for buckets in streams]
+            positions = [0] * len(streams)
+            walks = [iter(buckets[0][1]) for buckets in streams]
+            top = []
+            seen = set()
+            while any(bounds):
+                for stream, buckets in enumerate(streams):
+                    post_id = next(walks[stream], None)
+                    while post_id is None and bounds[stream]:
+                        positions[stream] += 1
+                        if positions[stream] == len(buckets):
+                            bounds[stream] = 0.0
+                        else:
+                            bounds[stream], ids = buckets[positions[stream]]
+                            walks[stream] = iter(ids)
+                            post_id = next(walks[stream], None)
+                    if post_id is None or post_id in seen:
+                        continue
+                    seen.add(post_id)
+                    counts = doc_terms[post_id]
+                    length = doc_lengths[post_id]
+                    score = 0.0
+                    for term, weight in weights:
+                        frequency = counts.get(term)
+                        if frequency:
+                            score += weight * impact(frequency, length)
+                    if len(top) < limit:
+                        heapq.heappush(top, (score, post_id))
+                    elif score > top[0][0]:
+                        heapq.heapreplace(top, (score, post_id))
+                if len(top) == limit and top[0][0] >= sum(bounds):
+                    break
+        return [(post_id, score) for score, post_id in sorted(top, reverse=True)]
@@ -0,0 +1,431 @@
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+from post_events import ObservedPostStore
+from post_log import change_entry
+from post_record import PostRecord, encode_json
+from user_registry import UserRecord, UserRegistry
+
+try:
+    import orjson
+except ImportError:  # Optional: refreshes just parse more slowly without it
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+MAGIC = b"LIPOSTS1"
+# magic, generation, end of the committed entries, next post id, superseded flag,
+# end of the snapshot entries and the generation the snapshot was taken at
+HEADER = struct.Struct("<8sQQQQQQ")
+# Every entry is a 4-byte length followed by that many bytes of JSON
+ENTRY_LENGTH = struct.Struct("<I")
+
+
+def _frame(entries):
+    return b"".join(ENTRY_LENGTH.pack(len(data)) + data for data in entries)
+
+
+class SharedPostFile:
+    """
+    SharedPostFile: Memory-mapped post file shared by the worker processes of one host.
+
+    The file starts with a header and holds length-prefixed JSON entries:
+    a snapshot of every post and user, then the log of writes after it.
+    The header carries a generation counter bumped by every committed write.
+    Each worker keeps its own in-memory replica (a PostStore and a
+    UserRegistry) and refreshes it by comparing generations and applying
+    only the entries after the offset it has read up to, so reads are served
+    from local memory and scale with the number of workers.
+
+    One process at a time owns mutations: writing() takes an exclusive flock
+    on a lock file next to the data, catches the replica up, lets the write
+    run and appends its entries before releasing the lock. Once the log
+    outgrows the snapshot (and compact_min_bytes), the writer rewrites the
+    file as a fresh snapshot and marks the old one superseded; workers still
+    reading it finish it and move over to the new file.
+    """
+
+    def __init__(self, path: str, seed_posts=(), initial_size: int = 1 << 20, compact_min_bytes: int = 64 << 20):
+        self.path = path
+        self.initial_size = initial_size
+        self.compact_min_bytes = compact_min_bytes
+        self.posts = None
+        self.users = None
+        # Number of committed writes applied to the replica, as in the header
+        self.generation = 0
+        self.compactions = 0
+        self.write_lock = threading.RLock()
+        self._offset = HEADER.size
+        self._pending = []
+        # Nesting of writing() in the thread holding write_lock; replays count as writing
+        self._depth = 0
+        self._replaying = False
+        self._fd = None
+        self._map = None
+        self._refresher = None
+        self._stop = threading.Event()
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                seeds = sorted(seed_posts, key=lambda post: post["id"])
+                entries = [encode_json({"op": "insert", "post": PostRecord.from_post(post)}) for post in seeds]
+                self._create(entries, 0, seeds[-1]["id"] + 1 if seeds else 1)
+            self._open()
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def attach(self, posts, users):
+        """Load the file into the replica posts (a SharedPostStore) and users (a SharedUserRegistry) and log their writes from now on."""
+        self.posts = posts
+        self.users = users
+        posts.add_listener(self._log_change)
+        self._refresh()
+
+    def _header(self):
+        return HEADER.unpack_from(self._map, 0)
+
+    def _create(self, entries, generation, next_id):
+        body = _frame(entries)
+        end = HEADER.size + len(body)
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(MAGIC, generation, end, next_id, 0, end, generation))
+            file.write(body)
+            file.truncate(max(self.initial_size, end))
+        os.replace(temporary, self.path)
+
+    def _open(self):
+        self._close_file()
+        self._fd = os.open(self.path, os.O_RDWR)
+        self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        if self._header()[0] != MAGIC:
+            raise ValueError(f"{self.path} is not a shared post file")
+
+    def _remap(self):
+        self._map.close()
+        self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+
+    def _close_file(self):
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = self._fd = None
+
+    def stale(self):
+        """Return whether other processes committed writes since the last refresh; costs one header read."""
+        try:
+            _, generation, _, _, superseded, _, _ = self._header()
+        except ValueError:
+            # Another thread swapped in a new file while we looked; check again under the lock
+            return True
+        return generation != self.generation or bool(superseded)
+
+    def refresh(self):
+        """Apply the writes other processes committed since the last refresh; costs one header read when there are none."""
+        if self.stale():
+            self._refresh()
+
+    def _refresh(self):
+        with self.write_lock:
+            if self._depth:
+                # This thread is writing and has caught up already
+                return
+            fcntl.flock(self._lock_fd, fcntl.LOCK_SH)
+            try:
+                self._catch_up()
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        while True:
+            _, generation, end, _, superseded, _, _ = self._header()
+            if end > len(self._map):
+                self._remap()
+            self._apply(self._map[self._offset:end])
+            self._offset = end
+            self.generation = generation
+            if not superseded:
+                return
+            self._open()
+            _, _, _, _, _, snapshot_end, snapshot_generation = self._header()
+            if snapshot_generation == self.generation:
+                # The new file's snapshot holds exactly the state read so far
+                self._offset = snapshot_end
+            else:
+                # Compacted more than once since the last refresh: reload from the snapshot
+                self._apply_entries([{"op": "clear"}, {"op": "clear_users"}])
+                self._offset = HEADER.size
+
+    def _apply(self, data):
+        self._apply_entries(_loads(data[position:position + size]) for position, size in self._frames(data))
+
+    @staticmethod
+    def _frames(data):
+        position = 0
+        while position < len(data):
+            (size,) = ENTRY_LENGTH.unpack_from(data, position)
+            position += ENTRY_LENGTH.size
+            yield position, size
+            position += size
+
+    def _apply_entries(self, entries):
+        self._depth += 1
+        self._replaying = True
+        try:
+            for entry in entries:
+                self._apply_entry(entry)
+        finally:
+            self._depth -= 1
+            self._replaying = False
+
+    def _apply_entry(self, entry):
+        operation = entry["op"]
+        # The replica's own write methods pass straight through writing() and are not logged again
+        if operation == "insert":
+            self.posts.insert(PostRecord.from_post(entry["post"]))
+        elif operation == "replace":
+            post = PostRecord.from_post(entry["post"])
+            self.posts.replace(post.id, post)
+        elif operation == "update":
+            self.posts.update(entry["id"], entry["fields"])
+        elif operation == "update_where":
+            self.posts.update_where(entry["fields"], **entry["where"])
+        elif operation == "delete":
+            self.posts.delete(entry["id"])
+        elif operation == "update_all":
+            self.posts.update_all(entry["fields"])
+        elif operation == "clear":
+            self.posts.clear()
+        elif operation == "user":
+            self.users.add(UserRecord(**entry["user"]))
+        elif operation == "clear_users":
+            self.users.clear()
+
+    @contextmanager
+    def writing(self):
+        """Own mutations for the duration: writes in the block are applied to the replica and committed to the file together."""
+        with self.write_lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._catch_up()
+                self._depth = 1
+                try:
+                    yield
+                finally:
+                    self._depth = 0
+                    if self._pending:
+                        self._commit()
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _log_change(self, change):
+        """PostChange listener; records the replica's own writes, not the ones replayed from the file."""
+        if self._depth and not self._replaying:
+            self._pending.append(encode_json(change_entry(change)))
+
+    def log_user(self, user: UserRecord):
+        if self._depth and not self._replaying:
+            self._pending.append(encode_json({"op": "user", "user": user._asdict()}))
+
+    def log_clear_users(self):
+        if self._depth and not self._replaying:
+            self._pending.append(encode_json({"op": "clear_users"}))
+
+    def _commit(self):
+        entries, self._pending = self._pending, []
+        body = _frame(entries)
+        _, generation, end, next_id, _, snapshot_end, snapshot_generation = self._header()
+        new_end = end + len(body)
+        if new_end > len(self._map):
+            os.ftruncate(self._fd, max(new_end, 2 * len(self._map)))
+            self._remap()
+        self._map[end:new_end] = body
+        # The header goes last, so readers never see entries that are not fully written
+        self.generation = generation + len(entries)
+        HEADER.pack_into(self._map, 0, MAGIC, self.generation, new_end, next_id, 0, snapshot_end, snapshot_generation)
+        self._offset = new_end
+        if new_end - snapshot_end > max(snapshot_end, self.compact_min_bytes):
+            self._compact()
+
+    def _compact(self):
+        header = self._header()
+        generation, next_id = header[1], header[3]
+        entries = [encode_json({"op": "insert", "post": post}) for post in self.posts.snapshot()]
+        entries.extend(encode_json({"op": "user", "user": user._asdict()}) for user in self.users)
+        self._create(entries, generation, next_id)
+        HEADER.pack_into(self._map, 0, *header[:4], 1, *header[5:])
+        self._open()
+        self._offset = self._header()[2]
+        self.compactions += 1
+
+    def reserve_ids(self, count: int):
+        """Reserve count consecutive post ids for this process; returns the first."""
+        with self.writing():
+            header = self._header()
+            HEADER.pack_into(self._map, 0, *header[:3], header[3] + count, *header[4:])
+            return header[3]
+
+    def advance_past(self, post_id: int):
+        """Make sure ids reserved from now on, by any process, are greater than post_id."""
+        with self.writing():
+            header = self._header()
+            HEADER.pack_into(self._map, 0, *header[:3], max(header[3], post_id + 1), *header[4:])
+
+    def start_refresher(self, interval: float):
+        """Refresh every interval seconds in the background, so idle workers and change feed subscribers follow other workers' writes."""
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(interval,), name="shared-refresh", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.refresh()
+
+    def close(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        with self.write_lock:
+            self._close_file()
+            os.close(self._lock_fd)
+
+
+class SharedPostStore(ObservedPostStore):
+    """
+    SharedPostStore: ObservedPostStore whose writes go through a SharedPostFile.
+
+    Every write method runs inside SharedPostFile.writing(), so the replica
+    is caught up with the other workers first and the write reaches the file
+    before the lock is released.
+    """
+
+    def __init__(self, store, shared: SharedPostFile):
+        super().__init__(store)
+        self.shared = shared
+        self.write_lock = shared.write_lock
+
+    def insert(self, post):
+        with self.shared.writing():
+            return super().insert(post)
+
+    def insert_many(self, posts):
+        with self.shared.writing():
+            return super().insert_many(posts)
+
+    def replace(self, post_id, post):
+        with self.shared.writing():
+            return super().replace(post_id, post)
+
+    def replace_many(self, posts):
+        with self.shared.writing():
+            return super().replace_many(posts)
+
+    def update(self, post_id, fields, versions=None):
+        with self.shared.writing():
+            return super().update(post_id, fields, versions=versions)
+
+    def update_where(self, fields, category=None, published=None, generations=None):
+        with self.shared.writing():
+            return super().update_where(fields, category=category, published=published, generations=generations)
+
+    def update_all(self, fields):
+        with self.shared.writing():
+            return super().update_all(fields)
+
+    def delete(self, post_id):
+        with self.shared.writing():
+            return super().delete(post_id)
+
+    def delete_many(self, post_ids):
+        with self.shared.writing():
+            return super().delete_many(post_ids)
+
+    def clear(self):
+        with self.shared.writing():
+            return super().clear()
+
+
+class SharedUserRegistry(UserRegistry):
+    """SharedUserRegistry: UserRegistry replica whose signups go through a SharedPostFile."""
+
+    def __init__(self, shared: SharedPostFile):
+        super().__init__()
+        self.shared = shared
+
+    def add(self, user: UserRecord):
+        with self.shared.writing():
+            super().add(user)
+            self.shared.log_user(self.get(user.email))
+        return user
+
+    def clear(self):
+        with self.shared.writing():
+            super().clear()
+            self.shared.log_clear_users()
+
+
+class SharedSequenceAllocator:
+    """
+    SharedSequenceAllocator: Post ids from the counter in a SharedPostFile header.
+
+    Like FileSequenceAllocator, each process reserves a block of block_size
+    ids per lock round trip, so ids are unique across processes and
+    increasing within each process.
+    """
+
+    def __init__(self, shared: SharedPostFile, block_size: int = 100):
+        self.shared = shared
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+
+    def next_id(self):
+        with self._lock:
+            if self._next >= self._limit:
+                self._next = self.shared.reserve_ids(self.block_size)
+                self._limit = self._next + self.block_size
+            post_id = self._next
+            self._next += 1
+            return post_id
+
+    def advance_past(self, post_id: int):
+        with self._lock:
+            self.shared.advance_past(post_id)
+            if self._next <= post_id:
+                self._next = self._limit = 0
+
+
+class SharedStoreMiddleware:
+    """
+    SharedStoreMiddleware: ASGI middleware refreshing the SharedPostFile replica before every request.
+
+    A request therefore sees every write other workers committed before it
+    started, including the caller's own writes served by another worker.
+    Checking costs one header read on the event loop. Catching up takes the
+    file lock, which another process may hold for a write or a compaction,
+    so it runs on executor.
+    """
+
+    def __init__(self, app, shared: SharedPostFile, executor):
+        self.app = app
+        self.shared = shared
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and self.shared.stale():
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.shared.refresh)
+        await self.app(scope, receive, send)
@@ -0,0 +1,66 @@
+import asyncio
+
+from metrics import registry
+
+
+class SingleFlight:
+    """
+    SingleFlight: Shares one in-flight computation between concurrent identical calls.
+
+    The first call for a key (the leader) runs the computation; calls for
+    the same key arriving before it finishes (followers) wait for its result
+    instead of starting their own. Keys are only shared while the
+    computation runs, so nothing is served after it finished. An exception
+    reaches every caller alike; if the leader is cancelled, its followers
+    start over. Every call is counted as leader or
+    follower in single_flight_requests_total, under the caller's label, so
+    the dedup ratio is followers / (leaders + followers).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.leaders = 0
+        self.followers = 0
+        self._calls = {}
+
+    async def run(self, key, function, label: str = ""):
+        """Return the result of the coroutine function(), shared with concurrent calls for key; label names the endpoint in metrics."""
+        if not self.enabled:
+            return await function()
+        loop = asyncio.get_running_loop()
+        # Futures can only be awaited on their own loop
+        call_key = (loop, key)
+        future = self._calls.get(call_key)
+        if future is not None:
+            self.followers += 1
+            registry.add("single_flight_requests_total", (("endpoint", label), ("role", "follower")))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # The leader's client went away before it finished; compute afresh
+            return await self.run(key, function, label)
+        # The leader computes inline, so an uncontended call costs no extra task
+        future = self._calls[call_key] = loop.create_future()
+        self.leaders += 1
+        registry.add("single_flight_requests_total", (("endpoint", label), ("role", "leader")))
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            # Mark the exception as retrieved in case no follower joined
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[call_key]
+
+    def stats(self):
+        calls = self.leaders + self.followers
+        return {"leaders": self.leaders, "followers": self.followers, "in_flight": len(self._calls), "dedup_ratio": self.followers / calls if calls else 0.0}
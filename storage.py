@@ -0,0 +1,512 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, NamedTuple
+
+from decouple import config
+
+from id_allocator import make_allocator
+from post_record import PostRecord
+from post_store import PostStore
+from post_events import ObservedPostStore
+from user_registry import UserRecord, UserRegistry, normalize_email
+
+# SQL is kept in module constants so every connection reuses the same text
+# and sqlite3's per-connection statement cache serves the prepared statement.
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        category TEXT,
+        published INTEGER NOT NULL DEFAULT 1
+    )""",
+    "CREATE INDEX IF NOT EXISTS posts_category_id ON posts (category, id)",
+    "CREATE INDEX IF NOT EXISTS posts_published_id ON posts (published, id)",
+    """CREATE TABLE IF NOT EXISTS users (
+        email TEXT NOT NULL,
+        fullname TEXT,
+        password TEXT
+    )""",
+    "DROP INDEX IF EXISTS users_email",
+    "CREATE UNIQUE INDEX IF NOT EXISTS users_email_unique ON users (email)",
+    "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+POST_COLUMNS = "title, content, category, published, id"
+SELECT_POST = f"SELECT {POST_COLUMNS} FROM posts WHERE id = ?"
+SELECT_ANY_POST = "SELECT 1 FROM posts LIMIT 1"
+SELECT_POST_EXISTS = "SELECT 1 FROM posts WHERE id = ?"
+COUNT_POSTS = "SELECT COUNT(*) FROM posts"
+SELECT_ALL_POSTS = f"SELECT {POST_COLUMNS} FROM posts ORDER BY id"
+SELECT_LATEST_POST = f"SELECT {POST_COLUMNS} FROM posts ORDER BY id DESC LIMIT 1"
+SELECT_POST_PAGE = f"SELECT {POST_COLUMNS} FROM posts {{where}} ORDER BY id LIMIT ? OFFSET ?"
+SELECT_POSTS_AFTER = f"SELECT {POST_COLUMNS} FROM posts WHERE id > ? {{filters}} ORDER BY id LIMIT ?"
+INSERT_POST = "INSERT INTO posts (title, content, category, published, id) VALUES (:title, :content, :category, :published, :id)"
+REPLACE_POST = "UPDATE posts SET title = :title, content = :content, category = :category, published = :published WHERE id = :id"
+# Only the changed columns are set; one statement text per set of columns, so at most 15 of them
+UPDATE_POST_FIELDS = f"UPDATE posts SET {{assignments}} WHERE id = :id RETURNING {POST_COLUMNS}"
+UPDATE_POSTS_WHERE = f"UPDATE posts SET {{assignments}} WHERE {{conditions}} RETURNING {POST_COLUMNS}"
+COUNT_POSTS_WHERE = "SELECT COUNT(*) FROM posts {where}"
+UPDATABLE_COLUMNS = ("title", "content", "category", "published")
+UPDATE_ALL_POSTS = "UPDATE posts SET title = :title, content = :content, category = :category, published = :published"
+DELETE_POST = "DELETE FROM posts WHERE id = ?"
+DELETE_ALL_POSTS = "DELETE FROM posts"
+INSERT_USER = "INSERT INTO users (email, fullname, password) VALUES (?, ?, ?)"
+SELECT_USER = "SELECT fullname, email, password FROM users WHERE email = ?"
+SELECT_ALL_USERS = "SELECT fullname, email, password FROM users ORDER BY rowid"
+COUNT_USERS = "SELECT COUNT(*) FROM users"
+DELETE_ALL_USERS = "DELETE FROM users"
+SELECT_SEQUENCE = "SELECT value FROM sequences WHERE name = ?"
+UPSERT_SEQUENCE = "INSERT INTO sequences (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value"
+
+
+class ConnectionManager:
+    """
+    ConnectionManager: Hands every thread its own SQLite connection.
+
+    sqlite3 connections must not be shared between threads, so each thread of
+    FastAPI's threadpool lazily opens one connection and keeps it. Connections
+    run in autocommit mode with WAL journaling, which lets readers in any
+    process proceed while a single writer commits.
+
+    Snapshots take a connection from a small pool instead, because a snapshot
+    can outlive the thread that opened it (a streamed response is iterated
+    from whichever threadpool thread is free).
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._idle = []
+        with self.transaction() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=256)
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._open()
+        return connection
+
+    def transaction(self):
+        return _Transaction(self.connection())
+
+    def snapshot(self):
+        return _Snapshot(self)
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._open()
+
+    def release(self, connection):
+        with self._lock:
+            if connection in self._connections:
+                self._idle.append(connection)
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+            self._idle.clear()
+        self._local = threading.local()
+
+
+class _Transaction:
+    """Context manager running a block inside BEGIN IMMEDIATE / COMMIT."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class _Snapshot:
+    """Context manager holding a read transaction open on a pooled connection.
+
+    In WAL mode every read inside the transaction sees the database as of its
+    first read, whatever other connections commit in the meantime. That first
+    read happens on entry, so the snapshot is taken when the block starts.
+    """
+
+    def __init__(self, connections):
+        self.connections = connections
+        self.connection = None
+
+    def __enter__(self):
+        self.connection = self.connections.acquire()
+        self.connection.execute("BEGIN")
+        self.connection.execute(SELECT_ANY_POST).fetchall()
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.connection.execute("COMMIT")
+        finally:
+            self.connections.release(self.connection)
+        return False
+
+
+# SQLite integers are signed 64-bit; sqlite3 raises OverflowError for Python ints outside that range
+SQLITE_MIN_INTEGER = -2 ** 63
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+
+def _storable(post_id):
+    # An id SQLite cannot hold cannot name a stored post either
+    return SQLITE_MIN_INTEGER <= post_id <= SQLITE_MAX_INTEGER
+
+
+def _clamp(value):
+    return max(SQLITE_MIN_INTEGER, min(value, SQLITE_MAX_INTEGER))
+
+
+def _filter_clauses(category, published):
+    # Only four distinct statement texts come out of this, so they stay in the statement cache
+    clauses = []
+    params = []
+    if category is not None:
+        clauses.append("category = ?")
+        params.append(category)
+    if published is not None:
+        clauses.append("published = ?")
+        params.append(int(published))
+    return clauses, params
+
+
+def _row_to_post(row):
+    if row is None:
+        return None
+    title, content, category, published, post_id = row
+    return PostRecord(title, content, category, bool(published), post_id)
+
+
+def _returned_post(cursor):
+    # Fetch every row, so the UPDATE ... RETURNING statement runs to completion and commits
+    rows = cursor.fetchall()
+    return _row_to_post(rows[0]) if rows else None
+
+
+def _post_params(post):
+    return {
+        "title": post["title"],
+        "content": post["content"],
+        "category": post.get("category"),
+        "published": int(post.get("published", True)),
+        "id": post.get("id"),
+    }
+
+
+def _update_columns(fields):
+    unknown = set(fields) - set(UPDATABLE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Cannot update fields {sorted(unknown)}")
+    return [column for column in UPDATABLE_COLUMNS if column in fields]
+
+
+def _update_statement(fields):
+    return UPDATE_POST_FIELDS.format(assignments=", ".join(f"{column} = :{column}" for column in _update_columns(fields)))
+
+
+def _field_params(post_id, fields):
+    params = dict(fields, id=post_id)
+    if "published" in params:
+        params["published"] = int(params["published"])
+    return params
+
+
+class SQLitePostStore:
+    """
+    SQLitePostStore: PostStore backed by a SQLite table.
+
+    Mirrors the PostStore interface so main.py does not care which engine is
+    in use. Posts are listed in id order, which matches insertion order as
+    long as ids come from an increasing allocator.
+    """
+
+    def __init__(self, connections: ConnectionManager, connection=None):
+        self.connections = connections
+        # Set on the read-only views handed out by snapshot()
+        self._connection = connection
+
+    def _execute(self, sql, params=()):
+        return (self._connection or self.connections.connection()).execute(sql, params)
+
+    @contextmanager
+    def snapshot(self):
+        """Yield a read-only view of the posts as of one point in time."""
+        with self.connections.snapshot() as connection:
+            yield SQLitePostStore(self.connections, connection)
+
+    def __len__(self):
+        return self._execute(COUNT_POSTS).fetchone()[0]
+
+    def __bool__(self):
+        return self._execute(SELECT_ANY_POST).fetchone() is not None
+
+    def __contains__(self, post_id):
+        if not _storable(post_id):
+            return False
+        return self._execute(SELECT_POST_EXISTS, (post_id,)).fetchone() is not None
+
+    def __iter__(self):
+        for row in self._execute(SELECT_ALL_POSTS):
+            yield _row_to_post(row)
+
+    def get(self, post_id):
+        if not _storable(post_id):
+            return None
+        return _row_to_post(self._execute(SELECT_POST, (post_id,)).fetchone())
+
+    def insert(self, post):
+        try:
+            self._execute(INSERT_POST, _post_params(post))
+        except sqlite3.IntegrityError:
+            raise KeyError(f"Post with ID {post['id']} already exists")
+        return post
+
+    def insert_many(self, posts):
+        try:
+            with self.connections.transaction() as connection:
+                connection.executemany(INSERT_POST, [_post_params(post) for post in posts])
+        except sqlite3.IntegrityError:
+            raise KeyError("Some of the posts already exist")
+        return posts
+
+    def replace(self, post_id, post):
+        params = _post_params(post)
+        params["id"] = post_id
+        if not _storable(post_id) or self._execute(REPLACE_POST, params).rowcount == 0:
+            raise KeyError(f"Post with ID {post_id} does not exist")
+        return post
+
+    def replace_many(self, posts):
+        """Replace every post whose id exists and return, per post, whether it was found."""
+        with self.connections.transaction() as connection:
+            return [_storable(post["id"]) and connection.execute(REPLACE_POST, _post_params(post)).rowcount > 0 for post in posts]
+
+    def update(self, post_id, fields):
+        """Change only the given fields of a post and return the new post."""
+        post = None if not _storable(post_id) else _returned_post(self._execute(_update_statement(fields), _field_params(post_id, fields)))
+        if post is None:
+            raise KeyError(f"Post with ID {post_id} does not exist")
+        return post
+
+    def update_where(self, fields, category=None, published=None):
+        """Change the given fields of every post matching the filters; return the number matched and the posts that changed."""
+        columns = _update_columns(fields)
+        values = [int(fields[column]) if column == "published" else fields[column] for column in columns]
+        clauses, params = _filter_clauses(category, published)
+        # Rows already holding every value are matched but left alone
+        changed = "(" + " OR ".join(f"{column} IS NOT ?" for column in columns) + ")"
+        sql = UPDATE_POSTS_WHERE.format(assignments=", ".join(f"{column} = ?" for column in columns), conditions=" AND ".join([*clauses, changed]))
+        with self.connections.transaction() as connection:
+            matched = connection.execute(COUNT_POSTS_WHERE.format(where="WHERE " + " AND ".join(clauses) if clauses else ""), params).fetchone()[0]
+            posts = [_row_to_post(row) for row in connection.execute(sql, (*values, *params, *values))]
+        # RETURNING hands rows back in no particular order
+        return matched, sorted(posts, key=lambda post: post.id)
+
+    def update_all(self, fields):
+        with self.connections.transaction() as connection:
+            connection.execute(UPDATE_ALL_POSTS, _post_params(fields))
+            return [_row_to_post(row) for row in connection.execute(SELECT_ALL_POSTS)]
+
+    def delete(self, post_id):
+        if not _storable(post_id):
+            raise KeyError(f"Post with ID {post_id} does not exist")
+        with self.connections.transaction() as connection:
+            post = _row_to_post(connection.execute(SELECT_POST, (post_id,)).fetchone())
+            if post is None:
+                raise KeyError(f"Post with ID {post_id} does not exist")
+            connection.execute(DELETE_POST, (post_id,))
+        return post
+
+    def delete_many(self, post_ids):
+        """Delete every post whose id exists and return, per id, whether it was found."""
+        with self.connections.transaction() as connection:
+            return [_storable(post_id) and connection.execute(DELETE_POST, (post_id,)).rowcount > 0 for post_id in post_ids]
+
+    def clear(self):
+        self._execute(DELETE_ALL_POSTS)
+
+    def latest(self):
+        return _row_to_post(self._execute(SELECT_LATEST_POST).fetchone())
+
+    def page(self, offset, limit, category=None, published=None):
+        clauses, params = _filter_clauses(category, published)
+        sql = SELECT_POST_PAGE.format(where="WHERE " + " AND ".join(clauses) if clauses else "")
+        return [_row_to_post(row) for row in self._execute(sql, (*params, _clamp(limit), _clamp(offset)))]
+
+    def page_after(self, post_id, limit, category=None, published=None):
+        """Return up to limit posts that come after post_id in listing order, or from the start if post_id is None."""
+        after_id = -1 if post_id is None else _clamp(post_id)
+        clauses, params = _filter_clauses(category, published)
+        sql = SELECT_POSTS_AFTER.format(filters="".join(" AND " + clause for clause in clauses))
+        return [_row_to_post(row) for row in self._execute(sql, (after_id, *params, _clamp(limit)))]
+
+
+class SQLiteUserStore:
+    """
+    SQLiteUserStore: Signed-up users kept in a SQLite table.
+
+    Same interface as UserRegistry. The unique index on the normalized email
+    keeps signups unique across threads and worker processes.
+    """
+
+    def __init__(self, connections: ConnectionManager):
+        self.connections = connections
+
+    def _execute(self, sql, params=()):
+        return self.connections.connection().execute(sql, params)
+
+    def __len__(self):
+        return self._execute(COUNT_USERS).fetchone()[0]
+
+    def __iter__(self):
+        for row in self._execute(SELECT_ALL_USERS):
+            yield UserRecord(*row)
+
+    def add(self, user: UserRecord):
+        try:
+            self._execute(INSERT_USER, (normalize_email(user.email), user.fullname, user.password))
+        except sqlite3.IntegrityError:
+            raise KeyError(f"User with email {user.email} already exists")
+        return user
+
+    def get(self, email: str):
+        row = self._execute(SELECT_USER, (normalize_email(email),)).fetchone()
+        return UserRecord(*row) if row else None
+
+    def clear(self):
+        self._execute(DELETE_ALL_USERS)
+
+
+class SQLiteSequenceAllocator:
+    """
+    SQLiteSequenceAllocator: Integer id sequence stored next to the posts.
+
+    Blocks of block_size ids are reserved in a write transaction, so every
+    process sharing the database draws unique ids.
+    """
+
+    def __init__(self, connections: ConnectionManager, name: str = "posts", block_size: int = 100):
+        self.connections = connections
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+
+    def next_id(self):
+        with self._lock:
+            if self._next >= self._limit:
+                self._limit = self._update(lambda current: current + self.block_size)
+                self._next = self._limit - self.block_size
+            post_id = self._next
+            self._next += 1
+            return post_id
+
+    def advance_past(self, post_id: int):
+        """Make sure ids handed out from now on, by any process, are greater than post_id."""
+        with self._lock:
+            self._update(lambda current: max(current, post_id + 1))
+            if self._next <= post_id:
+                self._next = self._limit = 0
+
+    def _update(self, update):
+        with self.connections.transaction() as connection:
+            row = connection.execute(SELECT_SEQUENCE, (self.name,)).fetchone()
+            new_value = update(row[0] if row else 1)
+            connection.execute(UPSERT_SEQUENCE, (self.name, new_value))
+            return new_value
+
+
+class Storage(NamedTuple):
+    backend: str
+    posts: Any
+    users: Any
+    post_ids: Any
+    post_log: Any = None
+    shared: Any = None
+
+
+def open_storage(backend: str = None, seed_posts=()):
+    """
+    Open the storage engine selected by the STORAGE_BACKEND setting.
+
+    - "memory" (default): posts and users live in process memory and are lost
+      on restart. seed_posts are loaded into the empty table. With POST_LOG_DIR
+      set, posts are made durable by a PostLog there and recovered from it.
+    - "sqlite": posts and users live in the SQLite database at SQLITE_PATH,
+      which several worker processes can share.
+    - "shared": every worker process serves reads from its own in-memory
+      replica, kept up to date from the memory-mapped SharedPostFile at
+      SHARED_STORE_PATH that the workers write through in turn.
+
+    Either way the post store is wrapped in an ObservedPostStore, so in-process
+    indexes and caches can follow every write.
+    """
+    backend = backend or config("STORAGE_BACKEND", default="memory")
+    if backend == "memory":
+        log_dir = config("POST_LOG_DIR", default="")
+        post_log = None
+        if log_dir:
+            # Optional engines are imported only when configured, to keep startup short
+            from post_log import PostLog
+            post_log = PostLog(log_dir, flush_interval=config("POST_LOG_FLUSH_MS", default=5, cast=float) / 1000, snapshot_every=config("POST_SNAPSHOT_EVERY", default=100000, cast=int))
+            recovered = post_log.recover()
+            if recovered is None:
+                # First start: persist the seed posts as the initial snapshot
+                recovered = [PostRecord.from_post(post) for post in sorted(seed_posts, key=lambda post: post["id"])]
+                post_log.write_snapshot(recovered, 0)
+            posts = PostStore.from_sorted(recovered)
+        else:
+            posts = PostStore(seed_posts)
+        post_ids = make_allocator()
+        latest = posts.latest()
+        if latest:
+            post_ids.advance_past(latest["id"])
+        observed = ObservedPostStore(posts)
+        if post_log is not None:
+            post_log.start(observed)
+        return Storage(backend, observed, UserRegistry(), post_ids, post_log)
+    if backend == "sqlite":
+        connections = ConnectionManager(config("SQLITE_PATH", default="posts.db"))
+        allocator_kind = config("ID_ALLOCATOR", default=None)
+        post_ids = make_allocator(allocator_kind) if allocator_kind else SQLiteSequenceAllocator(connections)
+        posts = SQLitePostStore(connections)
+        latest = posts.latest()
+        if latest:
+            post_ids.advance_past(latest["id"])
+        return Storage(backend, ObservedPostStore(posts), SQLiteUserStore(connections), post_ids)
+    if backend == "shared":
+        from shared_store import SharedPostFile, SharedPostStore, SharedSequenceAllocator, SharedUserRegistry
+        shared = SharedPostFile(config("SHARED_STORE_PATH", default="posts.shared"), seed_posts, compact_min_bytes=config("SHARED_COMPACT_MIN_MB", default=64, cast=int) << 20)
+        posts = SharedPostStore(PostStore(), shared)
+        users = SharedUserRegistry(shared)
+        shared.attach(posts, users)
+        refresh_ms = config("SHARED_REFRESH_MS", default=50, cast=float)
+        if refresh_ms:
+            shared.start_refresher(refresh_ms / 1000)
+        return Storage(backend, posts, users, SharedSequenceAllocator(shared), shared=shared)
+    raise ValueError(f"Unknown storage backend: {backend}")
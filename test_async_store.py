@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from async_store import AsyncIdAllocator, AsyncPostStore, AsyncUserStore
+from id_allocator import SequenceAllocator
+from post_events import ObservedPostStore
+from post_store import PostStore
+from storage import ConnectionManager, SQLitePostStore, SQLiteUserStore
+from user_registry import UserRecord, UserRegistry
+from post_factory import make_post
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+def exercise_store(posts):
+    async def scenario():
+        assert not await posts.any()
+        await posts.insert(make_post(1))
+        await posts.insert_many([make_post(2), make_post(3)])
+        assert await posts.count() == 3
+        assert await posts.exists(2)
+        assert (await posts.get(2))["id"] == 2
+        await posts.replace(2, make_post(2, title="Updated"))
+        assert (await posts.get(2))["title"] == "Updated"
+        assert [post["id"] for post in await posts.page(1, 2)] == [2, 3]
+        assert [post["id"] for post in await posts.page_after(1, 1)] == [2]
+        assert (await posts.latest())["id"] == 3
+        assert await posts.delete_many([3, 4]) == [True, False]
+        async with posts.snapshot() as snapshot:
+            await posts.update_where({"title": "Patched"})
+            await posts.delete(1)
+            assert [post["title"] for post in await snapshot.page(0, 10)] == ["Post", "Updated"]
+            await posts.update_all({"title": "New", "content": "New", "category": "New", "published": True})
+            assert [post["title"] for post in await snapshot.page(0, 10)] == ["Post", "Updated"]
+        assert [post["title"] for post in await posts.page(0, 10)] == ["New"]
+        await posts.clear()
+        assert await posts.count() == 0
+    asyncio.run(scenario())
+
+def test_memory_store_runs_single_writes_inline_and_bulk_writes_on_workers():
+    store = ObservedPostStore(PostStore())
+    threads = {}
+    store.add_listener(lambda change: threads.setdefault(change.kind, threading.current_thread()))
+    exercise_store(AsyncPostStore(store))
+    loop_thread = threading.current_thread()
+    assert threads["insert"] is threads["replace"] is loop_thread
+    # delete_many, update_where, update_all and clear scale with the batch or the table
+    assert loop_thread not in {threads[kind] for kind in ("delete", "update_where", "update_all", "clear")}
+
+def test_single_post_write_waits_off_the_loop_for_a_bulk_write():
+    store = ObservedPostStore(PostStore([make_post(1)]))
+    entered, release = threading.Event(), threading.Event()
+    def hold(change):
+        # Keeps the write lock held on the worker thread running update_where
+        if change.kind == "update_where":
+            entered.set()
+            release.wait(5)
+    store.add_listener(hold)
+    posts = AsyncPostStore(store)
+    async def scenario():
+        update = asyncio.ensure_future(posts.update_where({"title": "Patched"}))
+        while not entered.is_set():
+            await asyncio.sleep(0.001)
+        insert = asyncio.ensure_future(posts.insert(make_post(2)))
+        # The loop keeps running while the insert waits for the lock
+        await asyncio.sleep(0.05)
+        assert not insert.done()
+        release.set()
+        assert await update == (1, [make_post(1, title="Patched")])
+        await insert
+        assert [post["title"] for post in await posts.page(0, 10)] == ["Patched", "Post"]
+    asyncio.run(scenario())
+
+def test_writes_run_on_write_executor(executor):
+    store = ObservedPostStore(PostStore())
+    threads = []
+    store.add_listener(lambda change: threads.append(threading.current_thread()))
+    posts = AsyncPostStore(store, write_executor=executor)
+    post_ids = AsyncIdAllocator(SequenceAllocator(), write_executor=executor)
+    async def scenario():
+        await posts.insert(make_post(await post_ids.next_id()))
+        assert await post_ids.next_ids(2) == [2, 3]
+        # Reads stay on the loop
+        assert (await posts.get(1))["id"] == 1
+    asyncio.run(scenario())
+    assert threads and threading.current_thread() not in threads
+
+def test_sqlite_store_runs_on_executor(tmp_path, executor):
+    connections = ConnectionManager(str(tmp_path / "posts.db"))
+    exercise_store(AsyncPostStore(ObservedPostStore(SQLitePostStore(connections)), executor))
+    connections.close()
+
+def test_engine_errors_reach_the_caller(tmp_path, executor):
+    connections = ConnectionManager(str(tmp_path / "posts.db"))
+    posts = AsyncPostStore(SQLitePostStore(connections), executor)
+    with pytest.raises(KeyError):
+        asyncio.run(posts.delete(1))
+    connections.close()
+
+def test_user_store_and_id_allocator(tmp_path, executor):
+    connections = ConnectionManager(str(tmp_path / "posts.db"))
+    async def scenario(users, post_ids):
+        await users.add(UserRecord("Test User", "test@example.com", "hash"))
+        assert (await users.get("test@example.com")).password == "hash"
+        assert await post_ids.next_ids(3) == [1, 2, 3]
+        assert await post_ids.next_id() == 4
+    asyncio.run(scenario(AsyncUserStore(UserRegistry()), AsyncIdAllocator(SequenceAllocator())))
+    asyncio.run(scenario(AsyncUserStore(SQLiteUserStore(connections), executor), AsyncIdAllocator(SequenceAllocator(), executor)))
+    connections.close()
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from change_feed import ChangeFeed, FeedGap
+from post_events import PostChange
+
+post = {"title": "Post", "content": "Content", "category": "Fun", "published": True, "id": 1}
+
+
+def test_events_are_numbered_and_encoded_once():
+    feed = ChangeFeed()
+    feed.publish(PostChange("insert", 1, None, post))
+    feed.publish(PostChange("delete", 1, post, None))
+    feed.publish(PostChange("update_all", None, None, {"published": False}))
+    feed.publish(PostChange("clear", None, None, None))
+    events = feed.since(0)
+    assert [event.seq for event in events] == [1, 2, 3, 4]
+    assert json.loads(events[0].data) == {"seq": 1, "op": "insert", "id": 1, "post": post}
+    assert json.loads(events[1].data) == {"seq": 2, "op": "delete", "id": 1}
+    assert json.loads(events[2].data) == {"seq": 3, "op": "update_all", "fields": {"published": False}}
+    assert json.loads(events[3].data) == {"seq": 4, "op": "clear"}
+    assert events[1].sse() == b"id: 2\nevent: delete\ndata: " + events[1].data + b"\n\n"
+    assert feed.since(3) == events[3:]
+    assert feed.since(4) == []
+    # Partial updates carry only the fields they changed
+    feed.publish(PostChange("update", 1, post, {**post, "published": False}, {"published": False}))
+    assert json.loads(feed.since(4)[0].data) == {"seq": 5, "op": "update", "id": 1, "fields": {"published": False}}
+    # A filtered update is one event however many posts it changed
+    feed.publish(PostChange("update_where", None, None, [post, post], {"title": "New"}, {"category": "Fun", "published": None}))
+    assert json.loads(feed.since(5)[0].data) == {"seq": 6, "op": "update_where", "fields": {"title": "New"}, "where": {"category": "Fun", "published": None}}
+
+
+def test_since_raises_feed_gap_once_events_are_dropped():
+    feed = ChangeFeed(size=2)
+    for post_id in range(1, 5):
+        feed.publish(PostChange("delete", post_id, None, None))
+    assert [event.seq for event in feed.since(2)] == [3, 4]
+    with pytest.raises(FeedGap) as gap:
+        feed.since(1)
+    assert gap.value.head == 4
+    # A sequence number from the future, e.g. from before a restart
+    with pytest.raises(FeedGap):
+        feed.since(5)
+
+
+def test_subscribers_are_woken_by_writes_from_other_threads():
+    feed = ChangeFeed()
+
+    async def subscribe(count):
+        received = []
+        async for events in feed.subscribe(0):
+            received.extend(event.seq for event in events)
+            if len(received) >= count:
+                return received
+
+    async def main():
+        subscribers = [asyncio.ensure_future(subscribe(3)) for _ in range(100)]
+        await asyncio.sleep(0.01)
+        writer = threading.Thread(target=lambda: [feed.publish(PostChange("delete", post_id, None, None)) for post_id in range(3)])
+        writer.start()
+        results = await asyncio.wait_for(asyncio.gather(*subscribers), 5)
+        writer.join()
+        return results
+
+    assert asyncio.run(main()) == [[1, 2, 3]] * 100
+
+
+def test_subscribe_reports_gaps_and_heartbeats():
+    feed = ChangeFeed(size=1)
+
+    async def main():
+        stream = feed.subscribe(0, heartbeat=0.01)
+        assert await stream.__anext__() == []
+        feed.publish(PostChange("delete", 1, None, None))
+        feed.publish(PostChange("delete", 2, None, None))
+        gap = await stream.__anext__()
+        assert isinstance(gap, FeedGap) and gap.head == 2
+        feed.publish(PostChange("delete", 3, None, None))
+        assert [event.seq for event in await stream.__anext__()] == [3]
+        await stream.aclose()
+
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import threading
+
+import pytest
+from id_allocator import SequenceAllocator, FileSequenceAllocator, SnowflakeAllocator, make_allocator
+
+def collect_ids_from_threads(allocator, threads=8, per_thread=500):
+    ids = []
+    lock = threading.Lock()
+    def worker():
+        local = [allocator.next_id() for _ in range(per_thread)]
+        with lock:
+            ids.extend(local)
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return ids
+
+def test_sequence_allocator_is_monotonic():
+    allocator = SequenceAllocator()
+    assert [allocator.next_id() for _ in range(3)] == [1, 2, 3]
+
+def test_sequence_allocator_advance_past():
+    allocator = SequenceAllocator()
+    allocator.advance_past(41)
+    assert allocator.next_id() == 42
+    allocator.advance_past(10)
+    assert allocator.next_id() == 43
+
+def test_sequence_allocator_is_thread_safe():
+    ids = collect_ids_from_threads(SequenceAllocator())
+    assert len(set(ids)) == len(ids)
+
+def test_file_allocators_share_one_sequence(tmp_path):
+    path = str(tmp_path / "ids.seq")
+    first = FileSequenceAllocator(path, block_size=5)
+    second = FileSequenceAllocator(path, block_size=5)
+    ids = [first.next_id(), second.next_id(), first.next_id(), second.next_id()]
+    assert len(set(ids)) == 4
+    assert ids == [1, 6, 2, 7]
+    second.advance_past(100)
+    assert first.next_id() == 3
+    assert second.next_id() == 101
+
+def test_snowflake_ids_are_unique_and_increasing():
+    allocator = SnowflakeAllocator(worker_id=7)
+    ids = [allocator.next_id() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert ids[-1] < 2 ** 63
+
+def test_snowflake_is_thread_safe():
+    ids = collect_ids_from_threads(SnowflakeAllocator(worker_id=1))
+    assert len(set(ids)) == len(ids)
+
+def test_snowflake_worker_ids_do_not_collide():
+    first = SnowflakeAllocator(worker_id=1)
+    second = SnowflakeAllocator(worker_id=2)
+    ids = [first.next_id() for _ in range(1000)] + [second.next_id() for _ in range(1000)]
+    assert len(set(ids)) == len(ids)
+
+def test_snowflake_rejects_invalid_worker_id():
+    with pytest.raises(ValueError):
+        SnowflakeAllocator(worker_id=1024)
+
+def test_snowflake_claims_distinct_worker_ids(tmp_path):
+    first = SnowflakeAllocator.claim(str(tmp_path))
+    second = SnowflakeAllocator.claim(str(tmp_path))
+    assert (first.worker_id, second.worker_id) == (0, 1)
+
+def send_worker_id(allocator, connection):
+    allocator.next_id()
+    connection.send(allocator.worker_id)
+
+def test_forked_snowflake_claims_its_own_worker_id(tmp_path):
+    allocator = SnowflakeAllocator.claim(str(tmp_path))
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    child = multiprocessing.get_context("fork").Process(target=send_worker_id, args=(allocator, sender))
+    child.start()
+    child.join()
+    assert receiver.recv() == 1
+    assert allocator.worker_id == 0
+
+def claim_and_wait(allocator, connection):
+    allocator.next_id()
+    connection.send(allocator.worker_id)
+    # Stay alive until the parent has claimed again
+    connection.recv()
+
+def test_forked_snowflake_releases_the_inherited_lock(tmp_path):
+    allocator = SnowflakeAllocator.claim(str(tmp_path))
+    parent_end, child_end = multiprocessing.Pipe()
+    child = multiprocessing.get_context("fork").Process(target=claim_and_wait, args=(allocator, child_end))
+    child.start()
+    assert parent_end.recv() == 1
+    os.close(allocator._slot_fd)
+    # Only the parent held worker id 0, so it is free again while the child runs
+    worker_id = SnowflakeAllocator.claim(str(tmp_path)).worker_id
+    parent_end.send(None)
+    child.join()
+    assert worker_id == 0
+
+def test_make_allocator_unknown_kind():
+    with pytest.raises(ValueError):
+        make_allocator("uuid")
@@ -1,5 +1,14 @@
+import asyncio
+import json
+import time
+import jwt
 from fastapi.testclient import TestClient
-from main import app, linkedin_posts
+from starlette.websockets import WebSocketDisconnect
+import pytest
+from main import app, linkedin_posts, users, response_cache, admin_users, rate_limiter, change_feed, sse_changes, encode_cursor
+from rate_limit import MemoryTokenBuckets
+from jwt_handler import JWT_SECRET, JWT_ALGORITHM
+from jwt_bearer import verified_tokens
 
 client = TestClient(app)
 
@@ -9,6 +18,7 @@ post_example3 = {"title": "Skydiving more than 20000 feet high", "content": "I w
 
 def setup_function():
     linkedin_posts.clear()
+    users.clear()
     signup_data = {"fullname": "testuser", "email": "testuser@gmail.com", "password": "hello123"}
     response = client.post("/user/signup", json=signup_data)
     assert response.status_code == 200
@@ -365,4 +375,377 @@ def test_get_latest_post_no_posts():
     assert response.status_code == 404
     assert "no posts found" in response.json()['detail'].lower()
 
+def test_get_posts_cursor_pagination():
+    valid_token = test_user_login()
+    post_ids = [client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example).json()['data']['id'] for _ in range(5)]
+    response1 = client.get("/linkedinposts?limit=2", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response1.status_code == 200
+    assert [post['id'] for post in response1.json()['data']] == post_ids[:2]
+    cursor = response1.json()['next_cursor']
+    # A delete between requests must not shift the following page
+    client.delete("/linkedinposts/" + str(post_ids[0]), headers={"Authorization": f"Bearer {valid_token}"})
+    response2 = client.get(f"/linkedinposts?after={cursor}&limit=2", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [post['id'] for post in response2.json()['data']] == post_ids[2:4]
+    response3 = client.get(f"/linkedinposts?after={response2.json()['next_cursor']}&limit=2", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response3.json() == {'data': [{**post_example, 'id': post_ids[4]}], 'next_cursor': None}
+
+def test_get_posts_cursor_pagination_invalid_input():
+    valid_token = test_user_login()
+    client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example)
+    response = client.get("/linkedinposts?after=not-a-cursor", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response.status_code == 400
+    assert response.json()['detail'] == "Invalid cursor."
+    response = client.get("/linkedinposts?limit=0", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response.status_code == 400
+    assert response.json()['detail'] == "Invalid limit. Must be integer greater than 0."
 
+def test_create_posts_bulk():
+    valid_token = test_user_login()
+    response = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_example, {"title": "Missing fields"}, post_example2])
+    assert response.status_code == 200
+    body = response.json()
+    assert body['succeeded'] == 2
+    assert body['failed'] == 1
+    assert body['results'][1] == {'status': 422, 'detail': [{'type': 'missing', 'loc': ['content'], 'msg': 'Field required'}, {'type': 'missing', 'loc': ['category'], 'msg': 'Field required'}]}
+    post_id1, post_id2 = body['results'][0]['id'], body['results'][2]['id']
+    response2 = client.get("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response2.json() == {'data': [{**post_example, 'id': post_id1}, {**post_example2, 'id': post_id2}]}
+
+def test_create_posts_bulk_ndjson():
+    valid_token = test_user_login()
+    body = "\n".join(json.dumps(post) for post in [post_example, post_example2, post_example3]) + "\n"
+    response = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}", "Content-Type": "application/x-ndjson"}, content=body)
+    assert response.status_code == 200
+    assert response.json()['succeeded'] == 3
+    assert [result['status'] for result in response.json()['results']] == [201, 201, 201]
+
+def test_create_posts_bulk_with_invalid_body():
+    valid_token = test_user_login()
+    response = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example)
+    assert response.status_code == 400
+    response = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[])
+    assert response.status_code == 400
+
+def test_update_posts_bulk():
+    valid_token = test_user_login()
+    response1 = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_example, post_example2])
+    post_id1, post_id2 = [result['id'] for result in response1.json()['results']]
+    response2 = client.put("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[{**post_example3, 'id': post_id2}, {**post_example3, 'id': 987654321}, {'id': post_id1}])
+    assert response2.status_code == 200
+    results = response2.json()['results']
+    assert results[0] == {'status': 200, 'id': post_id2}
+    assert results[1] == {'status': 404, 'id': 987654321}
+    assert results[2]['status'] == 422
+    response3 = client.get("/linkedinposts/" + str(post_id2), headers={"Authorization": f"Bearer {valid_token}"})
+    assert response3.json() == {'post_detail': {**post_example3, 'id': post_id2}}
+    response4 = client.get("/linkedinposts/" + str(post_id1), headers={"Authorization": f"Bearer {valid_token}"})
+    assert response4.json() == {'post_detail': {**post_example, 'id': post_id1}}
+
+def test_delete_posts_bulk():
+    valid_token = test_user_login()
+    response1 = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_example, post_example2, post_example3])
+    post_id1, post_id2, post_id3 = [result['id'] for result in response1.json()['results']]
+    response2 = client.request("DELETE", "/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_id1, post_id3, 987654321, "abc"])
+    assert response2.status_code == 200
+    assert response2.json()['succeeded'] == 2
+    assert [result['status'] for result in response2.json()['results']] == [200, 200, 404, 422]
+    response3 = client.get("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response3.json() == {'data': [{**post_example2, 'id': post_id2}]}
+
+def test_export_posts_as_ndjson():
+    valid_token = test_user_login()
+    response1 = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_example, post_example2, {**post_example3, 'published': False}])
+    post_ids = [result['id'] for result in response1.json()['results']]
+    response2 = client.get("/linkedinposts/export", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response2.status_code == 200
+    assert response2.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in response2.text.splitlines()] == post_ids
+    response3 = client.get("/linkedinposts/export?category=Lifestyle", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [json.loads(line) for line in response3.text.splitlines()] == [{**post_example, 'id': post_ids[0]}]
+    response4 = client.get("/linkedinposts/export?published=false", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [json.loads(line)['id'] for line in response4.text.splitlines()] == [post_ids[2]]
+
+def test_export_posts_streams_in_batches():
+    valid_token = test_user_login()
+    client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_example] * 2500)
+    response = client.get("/linkedinposts/export", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 2500
+
+def test_request_with_invalid_token_is_rejected():
+    response = client.get("/linkedinposts", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 403
+    assert response.json()['detail'] == "Invalid or Expired Token!"
+
+def test_request_with_expired_token_is_rejected():
+    expired_token = jwt.encode({"userID": "testuser@gmail.com", "expiry": time.time() - 1}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    response = client.get("/linkedinposts", headers={"Authorization": f"Bearer {expired_token}"})
+    assert response.status_code == 403
+
+def test_repeated_requests_hit_the_verified_token_cache():
+    valid_token = test_user_login()
+    client.get("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"})
+    hits = verified_tokens.stats()['hits']
+    client.get("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"})
+    assert verified_tokens.stats()['hits'] == hits + 1
+    metrics = client.get("/metrics").text
+    assert "# HELP token_cache_hits_total" in metrics
+    assert f"token_cache_hits_total {verified_tokens.stats()['hits']}\n" in metrics
+    assert f"token_cache_size {verified_tokens.stats()['size']}\n" in metrics
+
+def test_user_login_with_second_user():
+    signup_data = {"fullname": "otheruser", "email": "otheruser@gmail.com", "password": "other123"}
+    assert client.post("/user/signup", json=signup_data).status_code == 200
+    response = client.post("/user/login", json={"email": "OtherUser@gmail.com", "password": "other123"})
+    assert response.status_code == 200
+    assert 'access_token' in response.json()
+
+def test_user_login_with_wrong_password():
+    response = client.post("/user/login", json={"email": "testuser@gmail.com", "password": "wrong"})
+    assert response.json() == {"error": "Invalid login details!"}
+    response = client.post("/user/login", json={"email": "nobody@gmail.com", "password": "hello123"})
+    assert response.json() == {"error": "Invalid login details!"}
+
+def test_user_signup_with_existing_email():
+    signup_data = {"fullname": "testuser", "email": "TestUser@gmail.com", "password": "other"}
+    response = client.post("/user/signup", json=signup_data)
+    assert response.status_code == 409
+    assert response.json()['detail'] == "A user with this email already exists."
+
+def test_user_passwords_are_stored_hashed():
+    user = users.get("testuser@gmail.com")
+    assert user.password != "hello123"
+    assert user.password.startswith("scrypt$")
+
+def test_search_posts():
+    valid_token = test_user_login()
+    response1 = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_example, post_example2, post_example3])
+    post_id1, post_id2, post_id3 = [result['id'] for result in response1.json()['results']]
+    response2 = client.get("/linkedinposts/search?q=surf*", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response2.status_code == 200
+    assert response2.json() == {'data': [{**post_example2, 'id': post_id2}]}
+    client.put("/linkedinposts/" + str(post_id2), headers={"Authorization": f"Bearer {valid_token}"}, json=post_example)
+    response3 = client.get("/linkedinposts/search?q=surfing", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response3.status_code == 404
+    response4 = client.get("/linkedinposts/search?q=vacation", headers={"Authorization": f"Bearer {valid_token}"})
+    assert sorted(post['id'] for post in response4.json()['data']) == [post_id1, post_id2]
+    client.delete("/linkedinposts/" + str(post_id1), headers={"Authorization": f"Bearer {valid_token}"})
+    response5 = client.get("/linkedinposts/search?q=vacation", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [post['id'] for post in response5.json()['data']] == [post_id2]
+
+def test_search_posts_with_empty_query():
+    valid_token = test_user_login()
+    response = client.get("/linkedinposts/search?q=%20", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response.status_code == 400
+
+def test_get_all_posts_filtered_by_category_and_published():
+    valid_token = test_user_login()
+    response1 = client.post("/linkedinposts/bulk", headers={"Authorization": f"Bearer {valid_token}"}, json=[post_example, post_example2, {**post_example, 'published': False}])
+    post_id1, post_id2, post_id3 = [result['id'] for result in response1.json()['results']]
+    response2 = client.get("/linkedinposts?category=Lifestyle", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [post['id'] for post in response2.json()['data']] == [post_id1, post_id3]
+    response3 = client.get("/linkedinposts?category=Lifestyle&published=true", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [post['id'] for post in response3.json()['data']] == [post_id1]
+    response4 = client.get("/linkedinposts?published=false&limit=1", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response4.json() == {'data': [{**post_example, 'published': False, 'id': post_id3}], 'next_cursor': None}
+    client.put("/linkedinposts/" + str(post_id2), headers={"Authorization": f"Bearer {valid_token}"}, json=post_example)
+    response5 = client.get("/linkedinposts?category=Lifestyle&published=true", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [post['id'] for post in response5.json()['data']] == [post_id1, post_id2]
+    response6 = client.get("/linkedinposts?category=Fun", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response6.status_code == 404
+
+@pytest.mark.skipif(not response_cache.enabled, reason="response cache is off for this storage backend")
+def test_get_post_by_id_answers_not_modified_until_post_changes():
+    valid_token = test_user_login()
+    post_id = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example).json()['data']['id']
+    other_id = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example2).json()['data']['id']
+    response1 = client.get("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"})
+    etag = response1.headers['etag']
+    response2 = client.get("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}", "If-None-Match": etag})
+    assert response2.status_code == 304
+    # Writes to other posts leave this post's tag alone
+    client.put("/linkedinposts/" + str(other_id), headers={"Authorization": f"Bearer {valid_token}"}, json=post_example3)
+    response3 = client.get("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}", "If-None-Match": etag})
+    assert response3.status_code == 304
+    client.put("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"}, json=post_example3)
+    response4 = client.get("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}", "If-None-Match": etag})
+    assert response4.status_code == 200
+    assert response4.headers['etag'] != etag
+    assert response4.json() == {'post_detail': {**post_example3, 'id': post_id}}
+
+@pytest.mark.skipif(not response_cache.enabled, reason="response cache is off for this storage backend")
+def test_list_and_latest_etags_change_on_any_write():
+    valid_token = test_user_login()
+    client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example)
+    response1 = client.get("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"})
+    response2 = client.get("/linkedinposts/latest", headers={"Authorization": f"Bearer {valid_token}"})
+    for url, etag in [("/linkedinposts", response1.headers['etag']), ("/linkedinposts/latest", response2.headers['etag'])]:
+        assert client.get(url, headers={"Authorization": f"Bearer {valid_token}", "If-None-Match": etag}).status_code == 304
+    post_id2 = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example2).json()['data']['id']
+    response3 = client.get("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}", "If-None-Match": response1.headers['etag']})
+    assert response3.status_code == 200
+    assert len(response3.json()['data']) == 2
+    response4 = client.get("/linkedinposts/latest", headers={"Authorization": f"Bearer {valid_token}", "If-None-Match": response2.headers['etag']})
+    assert response4.json()['post_detail']['id'] == post_id2
+
+def test_patch_post_changes_only_the_given_fields():
+    valid_token = test_user_login()
+    post_id = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example).json()['data']['id']
+    response1 = client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"}, json={"published": False})
+    assert response1.status_code == 200
+    assert response1.json() == {'message': 'Post with ID ' + str(post_id) + ' successfully updated', 'post_details': {**post_example, 'published': False, 'id': post_id}}
+    # Values the post already holds are no write at all
+    generation = linkedin_posts.generation
+    response2 = client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"}, json={"title": post_example['title'], "published": False})
+    assert response2.status_code == 200
+    assert linkedin_posts.generation == generation
+    assert client.get("/linkedinposts/search?q=vacation", headers={"Authorization": f"Bearer {valid_token}"}).json()['data'] == [{**post_example, 'published': False, 'id': post_id}]
+    response3 = client.patch("/linkedinposts/" + str(post_id + 1000), headers={"Authorization": f"Bearer {valid_token}"}, json={"published": False})
+    assert response3.status_code == 404
+    assert client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"}, json={}).status_code == 422
+    assert client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"}, json={"title": None}).status_code == 422
+
+def test_patch_post_with_if_match():
+    valid_token = test_user_login()
+    post_id = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example).json()['data']['id']
+    etag = client.get("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"}).headers['etag']
+    response1 = client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}", "If-Match": etag}, json={"category": "Fun"})
+    assert response1.status_code == 200
+    # The tag is stale now, so a second writer holding it is turned away
+    response2 = client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}", "If-Match": etag}, json={"category": "Travel"})
+    assert response2.status_code == 412
+    for tag in ("W/" + etag, '"not-a-tag"'):
+        assert client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}", "If-Match": tag}, json={"category": "Travel"}).status_code == 412
+    assert client.get("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}"}).json() == {'post_detail': {**post_example, 'category': 'Fun', 'id': post_id}}
+    assert client.patch("/linkedinposts/" + str(post_id), headers={"Authorization": f"Bearer {valid_token}", "If-Match": "*"}, json={"category": "Travel"}).status_code == 200
+
+def test_patch_posts_matching_filters():
+    valid_token = test_user_login()
+    post_id1 = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example).json()['data']['id']
+    post_id2 = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json={**post_example, "published": False}).json()['data']['id']
+    post_id3 = client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example3).json()['data']['id']
+    etag = client.get("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}).headers['etag']
+    response1 = client.patch("/linkedinposts?category=Lifestyle", headers={"Authorization": f"Bearer {valid_token}", "If-Match": etag}, json={"published": False})
+    assert response1.status_code == 200
+    assert response1.json() == {'message': 'Matching posts successfully updated', 'matched': 2, 'updated': 1, 'Updated Posts': [{**post_example, 'published': False, 'id': post_id1}]}
+    response2 = client.patch("/linkedinposts?category=Lifestyle", headers={"Authorization": f"Bearer {valid_token}", "If-Match": etag}, json={"published": True})
+    assert response2.status_code == 412
+    response3 = client.patch("/linkedinposts?published=false", headers={"Authorization": f"Bearer {valid_token}"}, json={"category": "Fun"})
+    assert response3.json()['updated'] == 2
+    response4 = client.get("/linkedinposts?category=Fun", headers={"Authorization": f"Bearer {valid_token}"})
+    assert [post['id'] for post in response4.json()['data']] == [post_id1, post_id2, post_id3]
+
+def test_ids_and_positions_beyond_64_bits():
+    valid_token = test_user_login()
+    headers = {"Authorization": f"Bearer {valid_token}"}
+    client.post("/linkedinposts", headers=headers, json=post_example)
+    huge = "99999999999999999999"
+    assert client.get("/linkedinposts/" + huge, headers=headers).status_code == 404
+    assert client.put("/linkedinposts/" + huge, headers=headers, json=post_example).status_code == 404
+    assert client.patch("/linkedinposts/" + huge, headers=headers, json={"published": False}).status_code == 404
+    assert client.delete("/linkedinposts/" + huge, headers=headers).status_code == 404
+    assert client.get("/linkedinposts?page=" + huge, headers=headers).status_code == 404
+    assert len(client.get("/linkedinposts?limit=" + huge, headers=headers).json()['data']) == 1
+    assert client.get("/linkedinposts?after=" + encode_cursor(huge), headers=headers).status_code == 404
+    assert client.put("/linkedinposts/bulk", headers=headers, json=[{**post_example, "id": int(huge)}]).json()['failed'] == 1
+    assert client.request("DELETE", "/linkedinposts/bulk", headers=headers, json=[int(huge)]).json()['failed'] == 1
+
+def test_metrics_endpoint_reports_routes_and_phases():
+    valid_token = test_user_login()
+    client.post("/linkedinposts", headers={"Authorization": f"Bearer {valid_token}"}, json=post_example)
+    client.get("/linkedinposts/1", headers={"Authorization": f"Bearer {valid_token}"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="POST",route="/linkedinposts",status="201"}' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/linkedinposts/{id}"}' in response.text
+    assert 'phase_duration_seconds_count{phase="auth"}' in response.text
+    assert 'phase_duration_seconds_count{phase="store"}' in response.text
+
+def test_admin_endpoints_require_an_admin_user():
+    valid_token = test_user_login()
+    response = client.get("/admin/slow-requests", headers={"Authorization": f"Bearer {valid_token}"})
+    assert response.status_code == 403
+    assert response.json() == {"detail": "Admin access required."}
+
+def test_admin_can_run_the_profiler():
+    valid_token = test_user_login()
+    headers = {"Authorization": f"Bearer {valid_token}"}
+    admin_users.add("testuser@gmail.com")
+    try:
+        assert client.post("/admin/profiler/start?interval_ms=0", headers=headers).status_code == 400
+        response = client.post("/admin/profiler/start?interval_ms=1", headers=headers)
+        assert response.json() == {"running": True}
+        time.sleep(0.05)
+        response = client.post("/admin/profiler/stop", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "MainThread;" in response.text
+        assert client.get("/admin/slow-requests", headers=headers).json()["data"] == []
+    finally:
+        admin_users.discard("testuser@gmail.com")
+
+def test_rate_limit_rejects_requests_over_the_limit():
+    valid_token = test_user_login()
+    headers = {"Authorization": f"Bearer {valid_token}"}
+    buckets, limits = rate_limiter.buckets, dict(rate_limiter.limits)
+    rate_limiter.buckets = MemoryTokenBuckets()
+    rate_limiter.limits["write"] = (2, 0.01)
+    rate_limiter.enabled = True
+    try:
+        assert client.post("/linkedinposts", json=post_example, headers=headers).status_code == 201
+        assert client.post("/linkedinposts", json=post_example2, headers=headers).status_code == 201
+        # Rejected before the body is validated
+        response = client.post("/linkedinposts", json={"title": "no content"}, headers=headers)
+        assert response.status_code == 429
+        assert response.json() == {"detail": "Too many requests. Try again later."}
+        assert response.headers["retry-after"] == "100"
+        # Other route groups have their own buckets
+        assert client.get("/linkedinposts", headers=headers).status_code == 200
+        assert 'rate_limited_total{group="write"}' in client.get("/metrics").text
+    finally:
+        rate_limiter.buckets, rate_limiter.limits = buckets, limits
+        rate_limiter.enabled = False
+
+def test_change_feed_over_websocket():
+    valid_token = test_user_login()
+    headers = {"Authorization": f"Bearer {valid_token}"}
+    with client.websocket_connect(f"/linkedinposts/changes?token={valid_token}") as websocket:
+        post_id = client.post("/linkedinposts", json=post_example, headers=headers).json()["data"]["id"]
+        client.delete(f"/linkedinposts/{post_id}", headers=headers)
+        created = websocket.receive_json()
+        assert created["op"] == "insert"
+        assert created["post"] == {**post_example, "id": post_id}
+        deleted = websocket.receive_json()
+        assert deleted == {"seq": created["seq"] + 1, "op": "delete", "id": post_id}
+    # Resume after the insert
+    with client.websocket_connect(f"/linkedinposts/changes?since={created['seq']}", headers=headers) as websocket:
+        assert websocket.receive_json() == deleted
+
+def test_change_feed_rejects_bad_positions_and_tokens():
+    valid_token = test_user_login()
+    headers = {"Authorization": f"Bearer {valid_token}"}
+    response = client.get("/linkedinposts/changes?since=-1", headers=headers)
+    assert response.status_code == 400
+    response = client.get("/linkedinposts/changes?since=999999999", headers=headers)
+    assert response.status_code == 410
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/linkedinposts/changes?token=invalid") as websocket:
+            websocket.receive_json()
+
+def test_change_feed_server_sent_events():
+    valid_token = test_user_login()
+    headers = {"Authorization": f"Bearer {valid_token}"}
+    since = change_feed.seq
+    post_id = client.post("/linkedinposts", json=post_example, headers=headers).json()["data"]["id"]
+
+    async def first_chunks():
+        stream = sse_changes(since)
+        chunks = [await stream.__anext__(), await stream.__anext__()]
+        await stream.aclose()
+        return chunks
+
+    retry, frame = asyncio.run(first_chunks())
+    assert retry == b"retry: 3000\n\n"
+    assert frame.startswith(b"id: %d\nevent: insert\ndata: " % (since + 1))
+    assert json.loads(frame.split(b"data: ", 1)[1]) == {"seq": since + 1, "op": "insert", "id": post_id, "post": {**post_example, "id": post_id}}
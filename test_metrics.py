@@ -0,0 +1,49 @@
+import threading
+
+from metrics import MetricsRegistry
+
+def test_counters_and_histograms_render_as_prometheus_text():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.add("http_requests_total", (("method", "GET"), ("route", "/linkedinposts"), ("status", "200")))
+    registry.add("http_requests_total", (("method", "GET"), ("route", "/linkedinposts"), ("status", "200")))
+    registry.observe("http_request_duration_seconds", (("method", "GET"), ("route", "/linkedinposts")), 0.05)
+    registry.observe("http_request_duration_seconds", (("method", "GET"), ("route", "/linkedinposts")), 0.5)
+    registry.observe("http_request_duration_seconds", (("method", "GET"), ("route", "/linkedinposts")), 2.0)
+    text = registry.render()
+    assert "# TYPE http_requests_total counter" in text
+    assert 'http_requests_total{method="GET",route="/linkedinposts",status="200"} 2' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/linkedinposts",le="0.1"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/linkedinposts",le="1"} 2' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/linkedinposts",le="+Inf"} 3' in text
+    assert 'http_request_duration_seconds_sum{method="GET",route="/linkedinposts"} 2.55' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/linkedinposts"} 3' in text
+
+def test_threads_record_into_separate_shards_that_add_up():
+    registry = MetricsRegistry()
+    def worker():
+        for _ in range(1000):
+            registry.add("http_requests_total", (("status", "200"),))
+            with registry.phase("store"):
+                pass
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counters, histograms = registry.collect()
+    assert counters[("http_requests_total", (("status", "200"),))] == 4000
+    assert sum(histograms[("phase_duration_seconds", (("phase", "store"),))][:-1]) == 4000
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.add("http_requests_total", (("route", 'say "hi"\n'),))
+    assert 'route="say \\"hi\\"\\n"' in registry.render()
+
+def test_collectors_are_read_at_scrape_time():
+    registry = MetricsRegistry()
+    sizes = [1]
+    registry.add_collector(lambda: {("token_cache_size", ()): sizes[-1]})
+    assert "token_cache_size 1\n" in registry.render()
+    sizes.append(3)
+    registry.clear()
+    assert "token_cache_size 3\n" in registry.render()
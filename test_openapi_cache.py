@@ -0,0 +1,68 @@
+import io
+import json
+
+from fastapi import Depends, FastAPI
+
+from openapi_cache import cache_openapi, source_key
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/items")
+    def list_items():
+        return []
+
+    return app
+
+
+def test_schema_is_written_once_and_reused(tmp_path):
+    path = str(tmp_path / "openapi.json")
+    first = make_app()
+    cache_openapi(first, path)
+    schema = first.openapi()
+    assert "/items" in schema["paths"]
+    with open(path) as file:
+        assert json.load(file) == {"key": source_key(first), "schema": schema}
+
+    second = make_app()
+    cache_openapi(second, path)
+    with open(path, "w") as file:
+        json.dump({"key": source_key(second), "schema": {"cached": True}}, file)
+    assert second.openapi() == {"cached": True}
+    # Built once per process
+    assert second.openapi() is second.openapi()
+
+
+def test_stale_or_broken_cache_is_rebuilt(tmp_path):
+    path = str(tmp_path / "openapi.json")
+    with open(path, "w") as file:
+        json.dump({"key": "from other sources", "schema": {"cached": True}}, file)
+    app = make_app()
+    cache_openapi(app, path)
+    assert "/items" in app.openapi()["paths"]
+
+    with open(path, "w") as file:
+        file.write("{not json")
+    app = make_app()
+    cache_openapi(app, path)
+    assert "/items" in app.openapi()["paths"]
+
+
+def test_key_covers_the_modules_of_route_dependencies(monkeypatch):
+    import bulk
+    app = FastAPI()
+
+    @app.post("/items")
+    def create_items(items: list = Depends(bulk.read_bulk_items)):
+        return items
+
+    key = source_key(app)
+    real_open = open
+    def edited_open(path, *args, **kwargs):
+        file = real_open(path, *args, **kwargs)
+        if path == bulk.__file__:
+            return io.BytesIO(file.read() + b"# edited\n")
+        return file
+    monkeypatch.setattr("builtins.open", edited_open)
+    assert source_key(app) != key
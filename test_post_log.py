@@ -0,0 +1,150 @@
+import os
+import time
+
+import pytest
+
+from post_events import ObservedPostStore
+from post_log import PostLog
+from post_record import PostRecord
+from post_store import PostStore
+from post_factory import make_post
+
+def open_log(directory, **options):
+    log = PostLog(str(directory), flush_interval=0, **options)
+    posts = log.recover()
+    store = ObservedPostStore(PostStore.from_sorted(posts or []))
+    log.start(store)
+    return log, store
+
+def test_recover_empty_directory(tmp_path):
+    assert PostLog(str(tmp_path)).recover() is None
+
+def test_log_replays_every_kind_of_write(tmp_path):
+    log, store = open_log(tmp_path)
+    for post_id in range(1, 5):
+        store.insert(make_post(post_id))
+    store.replace(2, make_post(2, title="Updated"))
+    store.delete(3)
+    log.flushed().result(timeout=5)
+    log.close()
+    log, store = open_log(tmp_path)
+    assert list(store) == [make_post(1), make_post(2, title="Updated"), make_post(4)]
+    store.update_all({"title": "New"})
+    store.insert(make_post(5))
+    store.update(5, {"content": "Changed"})
+    log.close()
+    log, store = open_log(tmp_path)
+    assert [post["title"] for post in store] == ["New", "New", "New", "Post"]
+    assert store.get(5) == {**make_post(5), "content": "Changed"}
+    store.clear()
+    log.close()
+    assert open_log(tmp_path)[0].recover() == []
+
+def test_snapshot_truncates_log_and_recovers(tmp_path):
+    log, store = open_log(tmp_path, snapshot_every=1000)
+    for post_id in range(1, 6):
+        store.insert(make_post(post_id))
+    log.snapshot()
+    store.delete(1)
+    store.insert(make_post(6))
+    log.flushed().result(timeout=5)
+    log.close()
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("snapshot")) == ["snapshot-000000000005.ndjson"]
+    log, store = open_log(tmp_path)
+    assert [post["id"] for post in store] == [2, 3, 4, 5, 6]
+    assert log.seq == 7
+    log.close()
+
+def test_periodic_snapshot_drops_covered_segments(tmp_path):
+    log, store = open_log(tmp_path, snapshot_every=3)
+    for post_id in range(1, 11):
+        store.insert(make_post(post_id))
+        log.flushed().result(timeout=5)
+    log.close()
+    segments = [name for name in os.listdir(tmp_path) if name.startswith("log-")]
+    assert len(segments) <= 3
+    log, store = open_log(tmp_path)
+    assert [post["id"] for post in store] == list(range(1, 11))
+    log.close()
+
+def test_torn_final_line_is_dropped(tmp_path):
+    log, store = open_log(tmp_path)
+    store.insert(make_post(1))
+    store.insert(make_post(2))
+    log.close()
+    segment = [name for name in os.listdir(tmp_path) if name.startswith("log-")][0]
+    with open(tmp_path / segment, "ab") as file:
+        file.write(b'{"seq":3,"op":"ins')
+    log, store = open_log(tmp_path)
+    assert [post["id"] for post in store] == [1, 2]
+    store.insert(make_post(3))
+    log.close()
+    assert [post.id for post in PostLog(str(tmp_path)).recover()] == [1, 2, 3]
+
+def test_failed_flush_is_retried_and_rejects_writes_until_then(tmp_path, monkeypatch):
+    log, store = open_log(tmp_path)
+    log.retry_interval = 0.01
+    store.insert(make_post(1))
+    log.flushed().result(timeout=5)
+    fsync = os.fsync
+    def failing_fsync(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    store.insert(make_post(2))
+    with pytest.raises(OSError):
+        log.flushed().result(timeout=5)
+    store.insert(make_post(3))
+    with pytest.raises(OSError):
+        log.flushed().result(timeout=5)
+    monkeypatch.setattr(os, "fsync", fsync)
+    for _ in range(500):
+        if log.failure is None:
+            break
+        time.sleep(0.01)
+    assert log.flushed().result(timeout=5) == 3
+    store.insert(make_post(4))
+    log.close()
+    # Every write is in the log exactly once and in order
+    segment = [name for name in os.listdir(tmp_path) if name.startswith("log-")][0]
+    with open(tmp_path / segment, "rb") as file:
+        assert [line[:8] for line in file.read().splitlines()] == [b'{"seq":1', b'{"seq":2', b'{"seq":3', b'{"seq":4']
+    assert [post.id for post in PostLog(str(tmp_path)).recover()] == [1, 2, 3, 4]
+
+def test_waiter_arriving_during_a_write_is_released_by_it(tmp_path):
+    log, store = open_log(tmp_path)
+    write = log._write
+    late = []
+    def slow_write(lines):
+        # The write already holds the change this waiter asks about
+        late.append(log.flushed())
+        return write(lines)
+    log._write = slow_write
+    store.insert(make_post(1))
+    assert log.flushed().result(timeout=5) == 1
+    assert late[0].result(timeout=5) == 1
+    log.close()
+
+def test_snapshot_file_holds_records(tmp_path):
+    log = PostLog(str(tmp_path))
+    log.write_snapshot([PostRecord.from_post(make_post(1))], 0)
+    assert log.recover() == [make_post(1)]
+
+def test_partial_update_logs_only_the_changed_fields(tmp_path):
+    log, store = open_log(tmp_path)
+    store.insert(make_post(1))
+    store.update(1, {"title": "Post", "published": False})
+    log.close()
+    segment = [name for name in os.listdir(tmp_path) if name.startswith("log-")][0]
+    with open(tmp_path / segment, "rb") as file:
+        assert file.read().splitlines()[-1] == b'{"seq":2,"op":"update","id":1,"fields":{"published":false}}'
+
+def test_filtered_update_is_one_entry_and_replays(tmp_path):
+    log, store = open_log(tmp_path)
+    store.insert_many([make_post(1), make_post(2), {**make_post(3), "category": "Work"}])
+    assert store.update_where({"title": "Fun"}, category="Fun") == (2, [make_post(1, title="Fun"), make_post(2, title="Fun")])
+    log.close()
+    segment = [name for name in os.listdir(tmp_path) if name.startswith("log-")][0]
+    with open(tmp_path / segment, "rb") as file:
+        lines = file.read().splitlines()
+    assert lines[-1] == b'{"seq":4,"op":"update_where","fields":{"title":"Fun"},"where":{"category":"Fun","published":null}}'
+    assert [post["title"] for post in PostLog(str(tmp_path)).recover()] == ["Fun", "Fun", "Post"]
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+import post_record
+from post_record import CategoryCodes, PostJSONResponse, PostRecord, encode_json
+from post_factory import make_post
+
+def test_record_reads_like_a_post_dict():
+    record = PostRecord.from_post(make_post(1))
+    assert record == make_post(1)
+    assert record["title"] == "Post"
+    assert record.get("category") == "Fun"
+    assert record.get("missing", "default") == "default"
+    assert dict(record) == make_post(1)
+    with pytest.raises(KeyError):
+        record["missing"]
+    with pytest.raises(TypeError):
+        record["title"] = "Changed"
+
+def test_missing_fields_get_defaults():
+    record = PostRecord.from_post({"title": "Post", "content": "Content", "id": 1})
+    assert record.category is None
+    assert record.published is True
+
+def test_replace_returns_a_new_record():
+    record = PostRecord.from_post(make_post(1))
+    updated = record.replace({"title": "New", "published": False})
+    assert updated == {**make_post(1), "title": "New", "published": False}
+    assert record["title"] == "Post"
+
+def test_records_do_not_carry_a_dict():
+    record = PostRecord.from_post(make_post(1))
+    assert not hasattr(record, "__dict__")
+
+def test_category_codes_are_interned():
+    codes = CategoryCodes()
+    assert codes.code("Fun") == codes.code("".join(["F", "un"])) == 0
+    assert codes.code("Work") == 1
+    assert codes.name(1) == "Work"
+    assert len(codes) == 2
+
+def test_json_matches_the_dict_encoding():
+    record = PostRecord.from_post(make_post(1, title='Quote " and ünïcode', category=None))
+    assert json.loads(record.json()) == dict(record)
+    content = {"data": [record, make_post(2)], "next_cursor": None}
+    assert json.loads(encode_json(content)) == {"data": [dict(record), make_post(2)], "next_cursor": None}
+
+def test_encoded_json_is_cached_with_fast_json(monkeypatch):
+    monkeypatch.setattr(post_record, "FAST_JSON", True)
+    record = PostRecord.from_post(make_post(1))
+    first = record.json_bytes()
+    assert record.json_bytes() is first
+    assert record.replace({"title": "New"}).json_bytes() != first
+    body = encode_json({"succeeded": 1, "failed": 0, "results": [{"status": 201, "id": 1}], "data": [record]})
+    assert json.loads(body) == {"succeeded": 1, "failed": 0, "results": [{"status": 201, "id": 1}], "data": [make_post(1)]}
+
+def test_encoded_json_is_not_kept_by_default(monkeypatch):
+    monkeypatch.setattr(post_record, "FAST_JSON", False)
+    record = PostRecord.from_post(make_post(1))
+    assert record.json_bytes() is not record.json_bytes()
+
+def test_post_json_response_renders_records():
+    response = PostJSONResponse({"data": [PostRecord.from_post(make_post(1))]})
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {"data": [make_post(1)]}
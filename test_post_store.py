@@ -0,0 +1,185 @@
+import pytest
+import post_store
+from post_store import PostStore
+from post_factory import make_post
+
+def test_get_insert_and_len():
+    store = PostStore([make_post(1), make_post(2)])
+    assert len(store) == 2
+    assert store.get(2)["id"] == 2
+    assert store.get(3) is None
+    assert 1 in store
+
+def test_insert_duplicate_id_raises():
+    store = PostStore([make_post(1)])
+    with pytest.raises(KeyError):
+        store.insert(make_post(1))
+
+def test_delete_keeps_insertion_order():
+    store = PostStore([make_post(i) for i in range(1, 6)])
+    store.delete(2)
+    store.delete(4)
+    assert [post["id"] for post in store] == [1, 3, 5]
+    assert [post["id"] for post in store.page(1, 2)] == [3, 5]
+    assert store.page(3, 2) == []
+
+def test_latest_skips_deleted_posts():
+    store = PostStore([make_post(1), make_post(2), make_post(3)])
+    store.delete(3)
+    assert store.latest()["id"] == 2
+    store.delete(2)
+    store.delete(1)
+    assert store.latest() is None
+
+def test_replace_keeps_position():
+    store = PostStore([make_post(1), make_post(2), make_post(3)])
+    store.replace(2, make_post(2, title="Updated"))
+    assert [post["title"] for post in store.page(0, 3)] == ["Post", "Updated", "Post"]
+    with pytest.raises(KeyError):
+        store.replace(9, make_post(9))
+
+def test_reinserting_deleted_id_is_listed_once():
+    store = PostStore([make_post(1), make_post(2)])
+    store.delete(1)
+    store.insert(make_post(1))
+    assert [post["id"] for post in store] == [1, 2]
+
+def test_compaction_after_many_deletes():
+    store = PostStore([make_post(i) for i in range(10)])
+    for post_id in range(8):
+        store.delete(post_id)
+    assert [post["id"] for post in store.page(0, 10)] == [8, 9]
+    assert len(store._table.order._ids) < 10
+
+def test_page_after_seeks_past_cursor():
+    store = PostStore([make_post(i) for i in range(1, 8)])
+    store.delete(4)
+    assert [post["id"] for post in store.page_after(None, 3)] == [1, 2, 3]
+    assert [post["id"] for post in store.page_after(3, 3)] == [5, 6, 7]
+    assert [post["id"] for post in store.page_after(4, 2)] == [5, 6]
+    assert store.page_after(7, 3) == []
+
+def test_posts_are_listed_by_id():
+    store = PostStore([make_post(5), make_post(2), make_post(9)])
+    assert [post["id"] for post in store] == [2, 5, 9]
+    assert [post["id"] for post in store.page_after(2, 5)] == [5, 9]
+    assert store.latest()["id"] == 9
+
+def test_filtered_pages_use_secondary_indexes():
+    store = PostStore([make_post(i, category="Fun" if i % 2 else "Work", published=i % 3 != 0) for i in range(1, 13)])
+    assert [post["id"] for post in store.page(0, 10, category="Work")] == [2, 4, 6, 8, 10, 12]
+    assert [post["id"] for post in store.page(1, 2, published=False)] == [6, 9]
+    assert [post["id"] for post in store.page(0, 10, category="Work", published=False)] == [6, 12]
+    assert [post["id"] for post in store.page_after(4, 2, category="Work")] == [6, 8]
+    assert store.page(0, 10, category="Travel") == []
+
+def test_secondary_indexes_follow_writes():
+    store = PostStore([make_post(1), make_post(2, category="Work"), make_post(3)])
+    store.replace(1, make_post(1, category="Work", published=False))
+    assert [post["id"] for post in store.page(0, 10, category="Work")] == [1, 2]
+    assert [post["id"] for post in store.page(0, 10, published=False)] == [1]
+    store.delete(2)
+    assert [post["id"] for post in store.page(0, 10, category="Work")] == [1]
+    store.update_all({"title": "T", "content": "C", "category": "All", "published": True})
+    assert store.page(0, 10, category="Work") == []
+    assert [post["id"] for post in store.page(0, 10, category="All", published=True)] == [1, 3]
+    store.clear()
+    assert store.page(0, 10, category="All") == []
+
+def test_update_changes_only_the_given_fields():
+    store = PostStore([make_post(1), make_post(2, category="Work"), make_post(3)])
+    updated = store.update(1, {"category": "Work"})
+    assert updated == make_post(1, category="Work")
+    assert store.get(1) is updated
+    assert [post["id"] for post in store.page(0, 10, category="Work")] == [1, 2]
+    assert [post["id"] for post in store.page(0, 10, category="Fun")] == [3]
+    assert store.update_where({"published": False}, category="Fun") == (1, [make_post(3, published=False)])
+    assert store.update_where({"published": False}, category="Fun") == (1, [])
+    assert [post["id"] for post in store.page(0, 10, published=False)] == [3]
+    with pytest.raises(KeyError):
+        store.update(9, {"title": "Missing"})
+
+def test_snapshot_is_unaffected_by_update_all_and_clear():
+    store = PostStore([make_post(i) for i in range(1, 4)])
+    with store.snapshot() as snapshot:
+        store.update_all({"title": "New", "content": "New", "category": "New", "published": False})
+        assert [post["title"] for post in snapshot] == ["Post", "Post", "Post"]
+        assert [post["id"] for post in snapshot.page(0, 10, category="New")] == []
+        store.clear()
+        assert len(snapshot) == 3
+        assert snapshot.latest()["id"] == 3
+    assert len(store) == 0
+
+def test_snapshot_is_unaffected_by_writes_to_single_posts():
+    store = PostStore([make_post(i, category="Fun" if i % 2 else "Work") for i in range(1, 8)])
+    with store.snapshot() as snapshot:
+        store.insert(make_post(8))
+        store.insert_many([make_post(9), make_post(0)])
+        store.replace(2, make_post(2, title="Replaced", category="Fun"))
+        store.replace_many([make_post(3, title="Replaced")])
+        store.update(4, {"published": False})
+        store.update(5, {"category": "Work"})
+        store.delete(6)
+        store.delete_many([7, 1])
+        assert [post["id"] for post in snapshot] == [1, 2, 3, 4, 5, 6, 7]
+        assert [post["title"] for post in snapshot] == ["Post"] * 7
+        assert len(snapshot) == 7
+        assert snapshot.latest()["id"] == 7
+        assert snapshot.get(6)["id"] == 6 and snapshot.get(8) is None and 0 not in snapshot
+        assert [post["id"] for post in snapshot.page(1, 2, category="Work")] == [4, 6]
+        assert [post["id"] for post in snapshot.page_after(2, 10, category="Fun")] == [3, 5, 7]
+        assert snapshot.page(0, 10, published=False) == []
+        assert [post["id"] for post in snapshot.page_after(5, 10, category="Fun", published=True)] == [7]
+        store.update_where({"title": "Patched"}, category="Work")
+        store.clear()
+        assert [post["id"] for post in snapshot.page_after(3, 2)] == [4, 5]
+    assert [post["id"] for post in store] == []
+
+def test_update_where_writes_only_changed_posts_as_one_write(monkeypatch):
+    store = PostStore([make_post(i, category="Fun" if i % 2 else "Work") for i in range(1, 11)])
+    table = store._table
+    clock = table.clock
+    assert store.update_where({"published": True}, category="Work") == (5, [])
+    assert table.clock == clock
+    # A snapshot taken between two batches of the write sees none of it
+    monkeypatch.setattr(post_store, "WRITE_BATCH_SIZE", 2)
+    lock = table.lock
+    views = []
+    class Hook:
+        def __enter__(self):
+            lock.acquire()
+        def __exit__(self, *exc):
+            lock.release()
+            if table._batch_clock is not None and not views:
+                views.append(None)
+                views[0] = store.snapshot()
+    table.lock = Hook()
+    matched, updated = store.update_where({"category": "Moved"}, category="Work")
+    assert (matched, [post["id"] for post in updated]) == (5, [2, 4, 6, 8, 10])
+    assert store._table is table
+    with views[0] as snapshot:
+        assert [post["id"] for post in snapshot.page(0, 10, category="Work")] == [2, 4, 6, 8, 10]
+        assert snapshot.page(0, 10, category="Moved") == []
+    assert [post["id"] for post in store.page(0, 10, category="Moved")] == [2, 4, 6, 8, 10]
+    assert store.page(0, 10, category="Work") == []
+
+def test_history_is_dropped_once_snapshots_are_released():
+    store = PostStore([make_post(1), make_post(2)])
+    with store.snapshot():
+        store.delete(1)
+        with store.snapshot() as second:
+            store.delete(2)
+            assert [post["id"] for post in second] == [2]
+        assert store._table.history
+    store.insert(make_post(3))
+    assert store._table.history == {}
+    snapshot = store.snapshot()
+    del snapshot
+    assert store._table._pins == {}
+
+def test_writes_never_modify_stored_posts():
+    original = make_post(1)
+    store = PostStore([original])
+    store.update_all({"title": "New"})
+    assert original["title"] != "New"
+    assert store.get(1)["title"] == "New"
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import deque
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import registry
+from profiling import SamplingProfiler, SlowRequestMiddleware
+
+def busy_loop_for_profiler(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_profiler_records_collapsed_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop_for_profiler, args=(stop,), name="busy-worker")
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001)
+    assert profiler.start()
+    assert not profiler.start()
+    time.sleep(0.1)
+    assert profiler.stop()
+    stop.set()
+    worker.join()
+    assert not profiler.running
+    assert profiler.samples > 0
+    lines = profiler.collapsed().splitlines()
+    assert any(line.startswith("busy-worker;") and "test_profiling.py:busy_loop_for_profiler" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+def make_app(threshold, recent):
+    app = FastAPI()
+    app.add_middleware(SlowRequestMiddleware, threshold=threshold, store_size=lambda: 42, recent=recent)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        with registry.phase("store"):
+            time.sleep(0.02)
+        return {"id": item_id}
+
+    return app
+
+def test_slow_requests_are_captured_with_phases():
+    recent = deque(maxlen=10)
+    client = TestClient(make_app(0.01, recent))
+    assert client.get("/items/7?verbose=1").status_code == 200
+    [record] = recent
+    assert record["route"] == "/items/{item_id}"
+    assert record["path_params"] == {"item_id": "7"}
+    assert record["query"] == "verbose=1"
+    assert record["status"] == 200
+    assert record["store_size"] == 42
+    assert record["duration_ms"] >= 20
+    assert record["phases_ms"]["store"] >= 20
+
+def test_fast_requests_and_disabled_capture_record_nothing():
+    recent = deque(maxlen=10)
+    TestClient(make_app(10.0, recent)).get("/items/1")
+    TestClient(make_app(None, recent)).get("/items/1")
+    assert not recent
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from rate_limit import MemoryTokenBuckets, RateLimiter, SQLiteTokenBuckets, parse_limit
+
+
+def make_request(host="10.0.0.1", payload=None):
+    state = SimpleNamespace(jwt_payload=payload) if payload else SimpleNamespace()
+    return SimpleNamespace(client=SimpleNamespace(host=host), state=state)
+
+
+def test_parse_limit():
+    assert parse_limit("120/60") == (120, 2.0)
+    for value in ("0/60", "10/0", "10", "ten/60"):
+        with pytest.raises(ValueError):
+            parse_limit(value)
+
+
+def test_memory_buckets_refill_over_time():
+    buckets = MemoryTokenBuckets()
+    assert [buckets.take("key", 2, 1.0, now=0.0) for _ in range(2)] == [0.0, 0.0]
+    assert buckets.take("key", 2, 1.0, now=0.0) == 1.0
+    assert buckets.take("key", 2, 1.0, now=0.5) == 0.5
+    assert buckets.take("key", 2, 1.0, now=1.0) == 0.0
+    # Idle time never fills a bucket past its capacity
+    assert [buckets.take("key", 2, 1.0, now=100.0) for _ in range(3)] == [0.0, 0.0, 1.0]
+
+
+def test_memory_buckets_drop_the_least_recently_used():
+    buckets = MemoryTokenBuckets(maxsize=2)
+    buckets.take("a", 1, 1.0, now=0.0)
+    buckets.take("b", 1, 1.0, now=0.0)
+    buckets.take("a", 1, 1.0, now=0.0)
+    buckets.take("c", 1, 1.0, now=0.0)
+    assert list(buckets._buckets) == ["a", "c"]
+
+
+def test_sqlite_buckets_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    first, second = SQLiteTokenBuckets(path), SQLiteTokenBuckets(path)
+    assert first.take("key", 2, 1.0, now=0.0) == 0.0
+    assert second.take("key", 2, 1.0, now=0.0) == 0.0
+    assert first.take("key", 2, 1.0, now=0.0) == 1.0
+    assert second.take("key", 2, 1.0, now=1.0) == 0.0
+
+
+def test_rate_limiter_limits_ip_and_user_separately():
+    now = [0.0]
+    limiter = RateLimiter(MemoryTokenBuckets(), {"read": "1/10"}, clock=lambda: now[0])
+    check = limiter.limit("read")
+    asyncio.run(check(make_request(payload={"userID": "a@example.com"})))
+    # Same user from another address: the user's bucket is empty
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(check(make_request(host="10.0.0.2", payload={"userID": "a@example.com"})))
+    assert error.value.status_code == 429
+    assert error.value.headers == {"Retry-After": "10"}
+    asyncio.run(check(make_request(host="10.0.0.3", payload={"userID": "b@example.com"})))
+    now[0] = 10.0
+    asyncio.run(check(make_request(payload={"userID": "a@example.com"})))
+    assert limiter.rejected == 1
+
+
+def test_disabled_rate_limiter_lets_everything_through():
+    limiter = RateLimiter(MemoryTokenBuckets(), {"read": "1/10"}, enabled=False)
+    check = limiter.limit("read")
+    for _ in range(5):
+        asyncio.run(check(make_request()))
+    with pytest.raises(KeyError):
+        limiter.limit("write")
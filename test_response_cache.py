@@ -0,0 +1,108 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from post_events import ObservedPostStore, PreconditionFailed
+from post_store import PostStore
+from response_cache import ResponseCache
+from post_factory import make_post
+
+def request(if_none_match=None, if_match=None):
+    headers = {"if-none-match": if_none_match, "if-match": if_match}
+    return SimpleNamespace(headers={name: value for name, value in headers.items() if value})
+
+def respond(cache, request, key, etag, build, post_id=None):
+    # Handlers only use respond_async, so the tests go through it too
+    async def build_async():
+        return build()
+    return asyncio.run(cache.respond_async(request, key, etag, build_async, post_id=post_id))
+
+def cached_store():
+    store = ObservedPostStore(PostStore([make_post(1), make_post(2)]))
+    cache = ResponseCache(store)
+    store.add_listener(cache.apply)
+    return store, cache
+
+def test_cached_body_is_reused_until_invalidated():
+    store, cache = cached_store()
+    builds = []
+    def build():
+        builds.append(1)
+        return {"data": list(store)}
+    first = respond(cache, request(), ("posts",), cache.table_etag(), build)
+    second = respond(cache, request(), ("posts",), cache.table_etag(), build)
+    assert first.body == second.body
+    assert len(builds) == 1
+    store.delete(2)
+    respond(cache, request(), ("posts",), cache.table_etag(), build)
+    assert len(builds) == 2
+
+def test_post_write_only_drops_that_posts_entries():
+    store, cache = cached_store()
+    respond(cache, request(), ("post", 1), cache.post_etag(1), lambda: store.get(1), post_id=1)
+    respond(cache, request(), ("post", 2), cache.post_etag(2), lambda: store.get(2), post_id=2)
+    respond(cache, request(), ("latest",), cache.table_etag(), lambda: store.latest())
+    store.replace(2, make_post(2, title="Updated"))
+    assert cache.stats()["size"] == 1
+    assert respond(cache, request(cache.post_etag(1)), ("post", 1), cache.post_etag(1), lambda: None, post_id=1).status_code == 304
+
+def test_update_all_changes_every_post_etag():
+    store, cache = cached_store()
+    etag = cache.post_etag(1)
+    store.update_all({"title": "T", "content": "C", "category": "Fun", "published": True})
+    assert cache.post_etag(1) != etag
+    assert cache.stats()["size"] == 0
+
+def test_cache_is_bounded():
+    store, cache = cached_store()
+    cache.maxsize = 2
+    for page in range(5):
+        respond(cache, request(), ("posts", page), cache.table_etag(), lambda: {"page": page})
+    assert cache.stats()["size"] == 2
+
+def test_concurrent_async_misses_share_one_build():
+    store = ObservedPostStore(PostStore([make_post(1)]))
+    cache = ResponseCache(store, enabled=False)
+    store.add_listener(cache.apply)
+    builds = []
+    async def build():
+        builds.append(1)
+        posts = list(store)
+        await asyncio.sleep(0.01)
+        return {"data": posts}
+    async def main():
+        first = asyncio.gather(*(cache.respond_async(request(), ("posts",), cache.table_etag(), build) for _ in range(10)))
+        await asyncio.sleep(0.001)
+        # A write moves the ETag on, so later requests never join the older build
+        store.delete(1)
+        second = cache.respond_async(request(), ("posts",), cache.table_etag(), build)
+        return await first, await second
+    first, second = asyncio.run(main())
+    assert len(builds) == 2
+    assert len({response.body for response in first}) == 1
+    assert second.body != first[0].body
+    assert cache.stats()["followers"] == 9
+
+def test_if_match_preconditions_follow_post_and_table_versions():
+    store, cache = cached_store()
+    post_tag = cache.post_etag(1)
+    table_tag = cache.table_etag()
+    assert cache.if_match_versions(request()) is None
+    assert cache.if_match_versions(request(if_match="*"), 1) is None
+    # Weak tags, other posts' tags and other processes' tags never match
+    assert cache.if_match_versions(request(if_match=f"W/{post_tag}, {cache.post_etag(2)}, \"x-p1-v0\""), 1) == set()
+    versions = cache.if_match_versions(request(if_match=post_tag), 1)
+    generations = cache.if_match_versions(request(if_match=table_tag))
+    store.update(1, {"title": "Changed"}, versions=versions)
+    with pytest.raises(PreconditionFailed):
+        store.update(1, {"title": "Again"}, versions=versions)
+    with pytest.raises(PreconditionFailed):
+        store.update_where({"published": False}, generations=generations)
+    # A write that changes nothing keeps every version
+    post_tag = cache.post_etag(1)
+    store.update(1, {"title": "Changed"})
+    assert cache.post_etag(1) == post_tag
+    matched, updated = store.update_where({"title": "Changed"}, generations=cache.if_match_versions(request(if_match=cache.table_etag())))
+    assert (matched, [post["id"] for post in updated]) == (2, [2])
+    assert store.get(1)["title"] == "Changed"
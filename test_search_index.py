@@ -0,0 +1,102 @@
+import math
+import random
+
+import pytest
+
+from post_events import ObservedPostStore
+from post_store import PostStore
+from search_index import SearchIndex, tokenize
+from post_factory import make_post
+
+def indexed_store():
+    store = ObservedPostStore(PostStore())
+    index = SearchIndex()
+    store.add_listener(index.apply)
+    return store, index
+
+def ids(results):
+    return [post_id for post_id, score in results]
+
+def test_tokenize():
+    assert tokenize("I'm Surfing, for the 1st time!") == ["i", "m", "surfing", "for", "the", "1st", "time"]
+
+def test_bm25_ranks_more_relevant_posts_first():
+    store, index = indexed_store()
+    store.insert(make_post(1, "Beach day", "A long day with lots of words about nothing much at all"))
+    store.insert(make_post(2, "Beach beach", "Beach volleyball"))
+    store.insert(make_post(3, "Mountains", "Hiking trip"))
+    assert ids(index.search("beach")) == [2, 1]
+    assert index.search("desert") == []
+
+def test_prefix_search():
+    store, index = indexed_store()
+    store.insert(make_post(1, "Surfing lesson", "wild"))
+    store.insert(make_post(2, "Surfboard repair", "calm"))
+    store.insert(make_post(3, "Skiing", "cold"))
+    assert sorted(ids(index.search("surf*"))) == [1, 2]
+    assert index.search("surf") == []
+
+def test_index_follows_store_writes():
+    store, index = indexed_store()
+    store.insert(make_post(1, "Beach", "sun"))
+    store.insert(make_post(2, "Beach", "sand"))
+    store.replace(1, make_post(1, "Mountain", "snow"))
+    assert ids(index.search("beach")) == [2]
+    assert ids(index.search("snow")) == [1]
+    store.delete(2)
+    assert index.search("beach") == []
+    store.update_all({"title": "Same", "content": "text", "category": "Fun", "published": True})
+    assert sorted(ids(index.search("same"))) == [1]
+    assert index.search("snow") == []
+    store.insert_many([make_post(5, "Lake", "boat"), make_post(6, "Lake", "fish")])
+    store.delete_many([5])
+    assert ids(index.search("lake")) == [6]
+    store.clear()
+    assert len(index) == 0
+    assert index.search("lake") == []
+
+def test_index_skips_writes_that_leave_the_text_alone():
+    store, index = indexed_store()
+    store.insert(make_post(1, "Beach", "sun"))
+    terms = index._doc_terms[1]
+    store.update(1, {"category": "Travel", "published": False})
+    store.replace(1, {**make_post(1, "Beach", "sun"), "category": "Work"})
+    assert index._doc_terms[1] is terms
+    store.update(1, {"content": "snow"})
+    assert ids(index.search("snow")) == [1]
+    assert index.search("sun") == []
+    store.insert(make_post(2, "Lake", "boat"))
+    terms = index._doc_terms[1]
+    store.update_where({"published": True})
+    assert index._doc_terms[1] is terms
+    store.update_where({"content": "fish"}, category="Fun")
+    assert ids(index.search("fish")) == [2]
+    assert ids(index.search("snow")) == [1]
+
+def exhaustive_scores(index, terms, limit):
+    document_count = len(index)
+    average_length = index._total_length / document_count
+    scores = {}
+    for term in terms:
+        document_frequency = index._doc_freq[term]
+        idf = math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+        for post_id, counts in index._doc_terms.items():
+            frequency = counts.get(term)
+            if frequency:
+                norm = index.k1 * (1 - index.b + index.b * index._doc_lengths[post_id] / average_length)
+                scores[post_id] = scores.get(post_id, 0.0) + idf * frequency * (index.k1 + 1) / (frequency + norm)
+    return sorted(scores.values(), reverse=True)[:limit]
+
+def test_pruned_search_matches_exhaustive_scoring():
+    rng = random.Random(7)
+    words = [f"w{number}" for number in range(40)]
+    store, index = indexed_store()
+    for post_id in range(1, 1001):
+        store.insert(make_post(post_id, " ".join(rng.choices(words[:5], k=2)), " ".join(rng.choices(words, k=rng.randint(1, 12)))))
+    for post_id in rng.sample(range(1, 1001), 200):
+        store.delete(post_id)
+    for _ in range(100):
+        query = rng.choices(words, k=rng.randint(1, 3))
+        limit = rng.choice([1, 5, 20])
+        scores = [score for _, score in index.search(" ".join(query), limit)]
+        assert scores == pytest.approx(exhaustive_scores(index, query, limit))
@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from post_factory import make_post
+from post_store import PostStore
+from shared_store import SharedPostFile, SharedPostStore, SharedSequenceAllocator, SharedStoreMiddleware, SharedUserRegistry
+from user_registry import UserRecord
+
+seed_posts = [{"title": "New Job Post", "content": "I got a new job", "category": None, "published": True, "id": 1}]
+
+
+def open_worker(path, **options):
+    shared = SharedPostFile(path, seed_posts, **options)
+    posts = SharedPostStore(PostStore(), shared)
+    users = SharedUserRegistry(shared)
+    shared.attach(posts, users)
+    return shared, posts, users
+
+
+def test_workers_see_each_others_writes_after_refresh(tmp_path):
+    path = str(tmp_path / "posts.shared")
+    first, first_posts, first_users = open_worker(path)
+    second, second_posts, second_users = open_worker(path)
+    assert [post["id"] for post in second_posts] == [1]
+
+    first_posts.insert(make_post(2))
+    first_posts.replace(1, make_post(1, "Edited"))
+    first_users.add(UserRecord("Test User", " User@Example.com", "hash"))
+    first_posts.update(2, {"category": "Work"})
+    assert 2 not in second_posts
+    second.refresh()
+    assert second.generation == first.generation == 4
+    assert second_posts.get(1)["title"] == "Edited"
+    assert second_posts.get(2) == {**make_post(2), "category": "Work"}
+    assert second_users.get("user@example.com").fullname == "Test User"
+
+    # A write catches the writer up first, so nothing is lost or applied twice
+    second_posts.delete(2)
+    first_posts.update_all({"published": False})
+    second.refresh()
+    assert [dict(post) for post in second_posts] == [dict(post) for post in first_posts] == [{**make_post(1, "Edited"), "published": False}]
+    first_posts.update_where({"category": "Work"}, published=False)
+    second.refresh()
+    assert second_posts.get(1)["category"] == "Work"
+    with pytest.raises(KeyError):
+        second_users.add(UserRecord("Again", "user@example.com", "hash"))
+    first.close()
+    second.close()
+
+
+def test_middleware_catches_up_on_the_executor_only_when_stale(tmp_path):
+    path = str(tmp_path / "posts.shared")
+    first, first_posts, _ = open_worker(path)
+    second, second_posts, _ = open_worker(path)
+    threads = []
+    second_posts.add_listener(lambda change: threads.append(threading.current_thread()))
+    async def app(scope, receive, send):
+        pass
+    executor = ThreadPoolExecutor(1)
+    middleware = SharedStoreMiddleware(app, shared=second, executor=executor)
+    assert not second.stale()
+    first_posts.insert(make_post(2))
+    assert second.stale()
+    asyncio.run(middleware({"type": "http"}, None, None))
+    assert not second.stale()
+    assert 2 in second_posts
+    assert len(threads) == 1 and threads[0] is not threading.current_thread()
+    executor.shutdown()
+    first.close()
+    second.close()
+
+
+def test_listeners_follow_replayed_writes(tmp_path):
+    path = str(tmp_path / "posts.shared")
+    first, first_posts, _ = open_worker(path)
+    second, second_posts, _ = open_worker(path)
+    changes = []
+    second_posts.add_listener(changes.append)
+    first_posts.insert(make_post(2))
+    first_posts.clear()
+    second.refresh()
+    assert [change.kind for change in changes] == ["insert", "clear"]
+    # The seed post counts too
+    assert second_posts.generation == 3
+    first.close()
+    second.close()
+
+
+def test_compaction_moves_workers_to_the_new_file(tmp_path):
+    path = str(tmp_path / "posts.shared")
+    first, first_posts, _ = open_worker(path, initial_size=4096, compact_min_bytes=0)
+    second, second_posts, _ = open_worker(path, initial_size=4096, compact_min_bytes=0)
+    for post_id in range(2, 40):
+        first_posts.insert(make_post(post_id))
+        if post_id % 2:
+            first_posts.delete(post_id - 1)
+        # Following every compaction at first, then missing several in a row
+        if post_id < 20:
+            second.refresh()
+            assert [dict(post) for post in second_posts] == [dict(post) for post in first_posts]
+    assert first.compactions > 2
+    second.refresh()
+    assert [dict(post) for post in second_posts] == [dict(post) for post in first_posts]
+    # A worker started after compaction loads the snapshot plus the log after it
+    third, third_posts, _ = open_worker(path)
+    assert [dict(post) for post in third_posts] == [dict(post) for post in first_posts]
+    for shared in (first, second, third):
+        shared.close()
+
+
+def test_sequence_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "posts.shared")
+    first, _, _ = open_worker(path)
+    second, _, _ = open_worker(path)
+    first_ids = SharedSequenceAllocator(first, block_size=2)
+    second_ids = SharedSequenceAllocator(second, block_size=2)
+    ids = [first_ids.next_id(), second_ids.next_id(), first_ids.next_id(), first_ids.next_id()]
+    assert ids == [2, 4, 3, 6]
+    second_ids.advance_past(100)
+    assert first_ids.next_id() == 7
+    assert second_ids.next_id() == 101
+    first.close()
+    second.close()
+
+
+def insert_posts(path, first_id, count):
+    shared, posts, _ = open_worker(path)
+    for post_id in range(first_id, first_id + count):
+        posts.insert(make_post(post_id))
+    shared.close()
+
+
+def test_concurrent_writer_processes(tmp_path):
+    path = str(tmp_path / "posts.shared")
+    reader, reader_posts, _ = open_worker(path)
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=insert_posts, args=(path, 1000 * worker, 200)) for worker in range(1, 5)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+    reader.refresh()
+    assert len(reader_posts) == 801
+    assert reader.generation == 800
+    reader.close()
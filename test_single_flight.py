@@ -0,0 +1,78 @@
+import asyncio
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"data": len(calls)}
+
+    async def main():
+        results = await asyncio.gather(*(single_flight.run(("posts", 1), compute) for _ in range(50)))
+        # Once finished, the next call computes again
+        later = await single_flight.run(("posts", 1), compute)
+        return results, later
+
+    results, later = asyncio.run(main())
+    assert results == [{"data": 1}] * 50
+    assert all(result is results[0] for result in results)
+    assert later == {"data": 2}
+    assert single_flight.stats() == {"leaders": 2, "followers": 49, "in_flight": 0, "dedup_ratio": 49 / 51}
+
+
+def test_different_keys_do_not_share():
+    single_flight = SingleFlight()
+
+    async def compute(value):
+        await asyncio.sleep(0)
+        return value
+
+    async def main():
+        return await asyncio.gather(*(single_flight.run(("post", value), lambda value=value: compute(value)) for value in range(3)))
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert single_flight.followers == 0
+
+
+def test_exceptions_reach_every_caller_and_a_cancelled_leader_hands_over():
+    single_flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise LookupError("missing")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        failures = await asyncio.gather(*(single_flight.run("fail", fail) for _ in range(3)), return_exceptions=True)
+        leader = asyncio.ensure_future(single_flight.run("slow", slow))
+        follower = asyncio.ensure_future(single_flight.run("slow", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return failures, await follower
+
+    failures, result = asyncio.run(main())
+    assert all(isinstance(failure, LookupError) for failure in failures)
+    assert result == "done"
+
+
+def test_disabled_single_flight_runs_every_call():
+    single_flight = SingleFlight(enabled=False)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(*(single_flight.run("key", compute) for _ in range(5)))
+
+    asyncio.run(main())
+    assert len(calls) == 5
@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+from user_registry import UserRecord
+from storage import ConnectionManager, SQLitePostStore, SQLiteUserStore, SQLiteSequenceAllocator, open_storage
+from post_factory import make_post
+
+@pytest.fixture
+def connections(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "posts.db"))
+    yield manager
+    manager.close()
+
+def test_sqlite_store_crud(connections):
+    store = SQLitePostStore(connections)
+    assert not store
+    for post_id in range(1, 5):
+        store.insert(make_post(post_id))
+    assert len(store) == 4
+    assert 2 in store
+    assert store.get(2) == make_post(2)
+    store.replace(2, make_post(2, title="Updated"))
+    assert store.get(2)["title"] == "Updated"
+    assert store.delete(3)["id"] == 3
+    assert store.get(3) is None
+    assert [post["id"] for post in store] == [1, 2, 4]
+    assert store.latest()["id"] == 4
+    with pytest.raises(KeyError):
+        store.insert(make_post(1))
+    with pytest.raises(KeyError):
+        store.delete(3)
+    with pytest.raises(KeyError):
+        store.replace(3, make_post(3))
+
+def test_sqlite_store_pagination(connections):
+    store = SQLitePostStore(connections)
+    for post_id in range(1, 8):
+        store.insert(make_post(post_id))
+    assert [post["id"] for post in store.page(2, 3)] == [3, 4, 5]
+    assert [post["id"] for post in store.page_after(None, 2)] == [1, 2]
+    assert [post["id"] for post in store.page_after(5, 5)] == [6, 7]
+
+def test_sqlite_store_filtered_pagination(connections):
+    store = SQLitePostStore(connections)
+    for post_id in range(1, 7):
+        store.insert({**make_post(post_id, category="Fun" if post_id % 2 else "Work"), "published": post_id != 4})
+    assert [post["id"] for post in store.page(0, 10, category="Work")] == [2, 4, 6]
+    assert [post["id"] for post in store.page(0, 10, category="Work", published=True)] == [2, 6]
+    assert [post["id"] for post in store.page_after(2, 10, category="Work")] == [4, 6]
+    assert [post["id"] for post in store.page_after(None, 10, published=False)] == [4]
+
+def test_sqlite_store_update_all_and_clear(connections):
+    store = SQLitePostStore(connections)
+    store.insert(make_post(1))
+    store.insert(make_post(2))
+    updated = store.update_all({"title": "New", "content": "New", "category": "New", "published": False})
+    assert updated == [{"title": "New", "content": "New", "category": "New", "published": False, "id": 1}, {"title": "New", "content": "New", "category": "New", "published": False, "id": 2}]
+    store.clear()
+    assert len(store) == 0
+
+def test_sqlite_store_update_sets_only_the_given_fields(connections):
+    store = SQLitePostStore(connections)
+    store.insert(make_post(1))
+    store.insert(make_post(2))
+    assert store.update(1, {"category": "Work", "published": False}) == {**make_post(1, category="Work"), "published": False}
+    assert store.update_where({"title": "New", "published": True}, category="Fun") == (1, [make_post(2, title="New")])
+    assert store.update_where({"title": "New"}, category="Fun") == (1, [])
+    assert [post["id"] for post in store.page(0, 10, category="Work", published=False)] == [1]
+    with pytest.raises(KeyError):
+        store.update(3, {"title": "Missing"})
+    with pytest.raises(ValueError):
+        store.update(1, {"id": 5})
+
+def test_sqlite_store_treats_ids_beyond_64_bits_as_missing(connections):
+    store = SQLitePostStore(connections)
+    store.insert(make_post(1))
+    huge = 2 ** 64
+    assert huge not in store
+    assert store.get(huge) is None
+    for write in (lambda: store.replace(huge, make_post(huge)), lambda: store.update(huge, {"title": "New"}), lambda: store.delete(huge)):
+        with pytest.raises(KeyError):
+            write()
+    assert store.replace_many([make_post(huge), make_post(1)]) == [False, True]
+    assert store.delete_many([huge]) == [False]
+    assert store.page(huge, huge) == []
+    assert [post["id"] for post in store.page(0, huge)] == [1]
+    assert store.page_after(huge, 10) == []
+    assert [post["id"] for post in store.page_after(-huge, huge)] == [1]
+
+def test_sqlite_data_is_shared_between_connection_managers(tmp_path):
+    path = str(tmp_path / "posts.db")
+    writer, reader = ConnectionManager(path), ConnectionManager(path)
+    SQLitePostStore(writer).insert(make_post(1))
+    assert SQLitePostStore(reader).get(1) == make_post(1)
+    writer.close()
+    reader.close()
+
+def test_sqlite_store_from_several_threads(connections):
+    store = SQLitePostStore(connections)
+    post_ids = SQLiteSequenceAllocator(connections, block_size=10)
+    def worker():
+        for _ in range(50):
+            post_id = post_ids.next_id()
+            store.insert(make_post(post_id))
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store) == 200
+
+def test_sqlite_sequence_allocators_share_ids(connections):
+    first = SQLiteSequenceAllocator(connections, block_size=3)
+    second = SQLiteSequenceAllocator(connections, block_size=3)
+    ids = [first.next_id(), second.next_id(), first.next_id()]
+    assert ids == [1, 4, 2]
+
+def test_sqlite_user_store(connections):
+    users = SQLiteUserStore(connections)
+    users.add(UserRecord("Test User", "Test@Example.com", "hash"))
+    assert users.get("test@example.com") == UserRecord("Test User", "test@example.com", "hash")
+    assert [(user.email, user.password) for user in users] == [("test@example.com", "hash")]
+    with pytest.raises(KeyError):
+        users.add(UserRecord("Other", "test@example.com", "hash"))
+    users.clear()
+    assert list(users) == []
+
+def test_open_storage_unknown_backend():
+    with pytest.raises(ValueError):
+        open_storage("postgres")
+
+def test_sqlite_snapshot_is_unaffected_by_later_writes(connections):
+    store = SQLitePostStore(connections)
+    store.insert(make_post(1))
+    store.insert(make_post(2))
+    with store.snapshot() as snapshot:
+        assert len(snapshot) == 2
+        store.update_all({"title": "New", "content": "New", "category": "New", "published": False})
+        store.insert(make_post(3))
+        assert [post["title"] for post in snapshot] == ["Post", "Post"]
+        assert snapshot.latest()["id"] == 2
+    assert len(store) == 3
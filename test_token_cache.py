@@ -0,0 +1,35 @@
+from token_cache import VerifiedTokenCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_hit_and_miss_counters():
+    cache = VerifiedTokenCache(maxsize=10)
+    assert cache.get("token") is None
+    cache.put("token", {"userID": "a"}, expires_at=float("inf"))
+    assert cache.get("token") == {"userID": "a"}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_entries_expire_with_the_token():
+    clock = FakeClock()
+    cache = VerifiedTokenCache(maxsize=10, clock=clock)
+    cache.put("token", {"userID": "a"}, expires_at=1010.0)
+    assert cache.get("token") is not None
+    clock.now = 1011.0
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VerifiedTokenCache(maxsize=2)
+    cache.put("a", {"userID": "a"}, expires_at=float("inf"))
+    cache.put("b", {"userID": "b"}, expires_at=float("inf"))
+    cache.get("a")
+    cache.put("c", {"userID": "c"}, expires_at=float("inf"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+from user_registry import DUMMY_PASSWORD_HASH, PASSWORD_HASH_COST, UserRecord, UserRegistry, hash_password, verify_password
+
+def test_hash_and_verify_password():
+    password_hash = hash_password("hello123", cost=10)
+    assert verify_password("hello123", password_hash)
+    assert not verify_password("hello124", password_hash)
+    assert not verify_password("hello123", "plaintext")
+
+def test_dummy_hash_costs_a_full_verification_and_never_matches():
+    assert DUMMY_PASSWORD_HASH.split("$")[:2] == ["scrypt", str(PASSWORD_HASH_COST)]
+    assert len(DUMMY_PASSWORD_HASH) == len(hash_password("dummy-password"))
+    assert not verify_password("dummy-password", DUMMY_PASSWORD_HASH)
+
+def test_hashes_are_salted():
+    assert hash_password("hello123", cost=10) != hash_password("hello123", cost=10)
+
+def test_registry_normalizes_email():
+    registry = UserRegistry()
+    registry.add(UserRecord("Test", " Test@Example.com ", "hash"))
+    assert registry.get("test@example.com").email == "test@example.com"
+    with pytest.raises(KeyError):
+        registry.add(UserRecord("Other", "TEST@example.com", "hash"))
+
+def test_concurrent_signups_for_one_email():
+    registry = UserRegistry()
+    outcomes = []
+    def signup():
+        try:
+            registry.add(UserRecord("Test", "test@example.com", "hash"))
+            outcomes.append(True)
+        except KeyError:
+            outcomes.append(False)
+    threads = [threading.Thread(target=signup) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outcomes.count(True) == 1
+    assert len(registry) == 1
@@ -0,0 +1,103 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple
+
+from decouple import config
+
+# scrypt cost parameter as a power of two; each step doubles the time per hash
+PASSWORD_HASH_COST = config("PASSWORD_HASH_COST", default=14, cast=int)
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELISM = 1
+SALT_BYTES = 16
+
+# Hashing runs on its own small pool so slow KDF calls never block the event loop
+password_hashers = ThreadPoolExecutor(max_workers=config("PASSWORD_HASH_WORKERS", default=4, cast=int), thread_name_prefix="password-hash")
+
+
+class UserRecord(NamedTuple):
+    fullname: Any
+    email: Any
+    password: Any
+
+
+def normalize_email(email: str):
+    return email.strip().lower()
+
+
+def _scrypt(password: str, salt: bytes, cost: int, block_size: int, parallelism: int):
+    n = 1 << cost
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=block_size, p=parallelism, maxmem=256 * n * block_size)
+
+
+def hash_password(password: str, cost: int = None):
+    """Return a salted scrypt hash of password as "scrypt$cost$r$p$salt$hash"."""
+    cost = PASSWORD_HASH_COST if cost is None else cost
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, cost, SCRYPT_BLOCK_SIZE, SCRYPT_PARALLELISM)
+    return "$".join(["scrypt", str(cost), str(SCRYPT_BLOCK_SIZE), str(SCRYPT_PARALLELISM), base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+
+def verify_password(password: str, password_hash: str):
+    """Check password against a hash from hash_password in constant time."""
+    try:
+        scheme, cost, block_size, parallelism, salt, digest = password_hash.split("$")
+    except ValueError:
+        return False
+    if scheme != "scrypt":
+        return False
+    candidate = _scrypt(password, base64.b64decode(salt), int(cost), int(block_size), int(parallelism))
+    return hmac.compare_digest(candidate, base64.b64decode(digest))
+
+
+# Checked against when the email is unknown, so a miss costs as much as a wrong password.
+# Its digest is random rather than computed, since nothing can match it anyway; that keeps an
+# scrypt run out of import time.
+DUMMY_PASSWORD_HASH = "$".join(["scrypt", str(PASSWORD_HASH_COST), str(SCRYPT_BLOCK_SIZE), str(SCRYPT_PARALLELISM), base64.b64encode(os.urandom(SALT_BYTES)).decode(), base64.b64encode(os.urandom(64)).decode()])
+
+
+async def hash_password_async(password: str):
+    return await asyncio.get_running_loop().run_in_executor(password_hashers, hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str):
+    return await asyncio.get_running_loop().run_in_executor(password_hashers, verify_password, password, password_hash)
+
+
+class UserRegistry:
+    """
+    UserRegistry: In-memory table of signed-up users.
+
+    Users are indexed by normalized email, so a lookup is O(1) in the number
+    of users. add() checks and inserts under a lock, so two concurrent
+    signups for the same email cannot both succeed.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def __iter__(self):
+        return iter(list(self._users.values()))
+
+    def add(self, user: UserRecord):
+        email = normalize_email(user.email)
+        with self._lock:
+            if email in self._users:
+                raise KeyError(f"User with email {email} already exists")
+            self._users[email] = user._replace(email=email)
+        return user
+
+    def get(self, email: str):
+        return self._users.get(normalize_email(email))
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()